@@ -1,4 +1,8 @@
-import win32con
+try:
+    import win32con
+except ImportError:
+    # Без pywin32 (например, режим --headless на Linux) оконные настройки не используются
+    win32con = None
 
 # MediaPipe settings - optimized for skeleton detection only
 MEDIAPIPE_CONFIG = {
@@ -45,6 +49,46 @@ PERFORMANCE_CONFIG = {
     ]
 }
 
+# Detection profiles: static screen areas applied before inference.
+# Coordinates are (x1, y1, x2, y2) in pixels of the captured frame.
+DETECTION_PROFILES = {
+    'default': {
+        'active_region': None,  # None - весь кадр
+        'exclusion_masks': [
+            (100, 60, 450, 520),  # Панель статистики OverlayWindow
+            (460, 50, 760, 470),  # Кнопки и блок состояния движения OverlayWindow
+        ],
+    },
+    'game_1080p': {
+        'active_region': (0, 0, 1920, 1080),  # Только основной монитор
+        'exclusion_masks': [
+            (100, 60, 450, 520),
+            (460, 50, 760, 470),
+            (1620, 20, 1900, 300),  # Миникарта
+            (20, 820, 520, 1060),  # Чат
+        ],
+    },
+}
+
+# Fast classical detectors for simple classes (HSV threshold / template matching).
+# Classes listed here are handled by the plugins and excluded from YOLO inference.
+FAST_DETECTOR_CONFIG = {
+    # 'health_pack': {
+    #     'type': 'hsv',
+    #     'lower': (50, 120, 120),  # Нижняя граница HSV
+    #     'upper': (70, 255, 255),  # Верхняя граница HSV
+    #     'min_area': 30,
+    #     'interval': 0.1
+    # },
+    # 'bag': {
+    #     'type': 'template',
+    #     'template': 'templates/bag.png',  # Шаблон, вырезанный из скриншота
+    #     'scales': (0.75, 1.0, 1.25),
+    #     'threshold': 0.8,
+    #     'interval': 0.1
+    # },
+}
+
 # Video recording settings
 VIDEO_CONFIG = {
     'fps': 30,
@@ -54,8 +98,8 @@ VIDEO_CONFIG = {
 
 # Window settings
 WINDOW_CONFIG = {
-    'style': win32con.WS_EX_LAYERED | win32con.WS_EX_TRANSPARENT | win32con.WS_EX_TOPMOST,
+    'style': win32con.WS_EX_LAYERED | win32con.WS_EX_TRANSPARENT | win32con.WS_EX_TOPMOST if win32con else 0,
     'class_name': "Static",
     'window_name': "Overlay",
-    'flags': win32con.WS_POPUP | win32con.WS_VISIBLE
+    'flags': win32con.WS_POPUP | win32con.WS_VISIBLE if win32con else 0
 } 
\ No newline at end of file
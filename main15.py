@@ -1,17 +1,12 @@
 import argparse
 import cv2
 import numpy as np
-import win32api
-import win32con
-import win32gui
-import win32ui
+import json
 import time
 import contextlib
 from collections import deque
-from ctypes import windll, c_int, c_uint, c_char_p, c_void_p, c_float, c_bool, POINTER, Structure, c_long, byref
+from ctypes import c_int, c_uint, c_char_p, c_void_p, c_float, c_bool, POINTER, Structure, c_long, byref
 import math 
-import pyautogui
-import keyboard
 import os
 from datetime import datetime
 import sys
@@ -23,10 +18,32 @@ import torch  # Добавляем импорт PyTorch для проверки
 from ultralytics import YOLO
 from utils.training import YOLOTrainer
 from utils.kalman import KalmanFilter, BoxFilter  # Импортируем фильтр Калмана из модуля
-from utils.detector import YOLOPersonDetector, detect_objects, select_target, COCO_CLASSES, DEFAULT_IGNORED_CLASSES  # Импортируем детектор из модуля
-from utils.cursor_control import CursorController  # Импортируем CursorController из нового модуля
+from utils.detector import YOLOPersonDetector, COCO_CLASSES, DEFAULT_IGNORED_CLASSES  # Импортируем детектор из модуля
 from utils.performance import PerformanceCounter, PerformanceMonitor  # Импортируем модули для отслеживания производительности
-from utils.capture import capture_screen  # Импортируем функцию захвата экрана из модуля
+from utils.pipeline import Pipeline, TargetingSettings  # Конвейер захват -> детекция -> управление
+from utils.capture import VideoReplay  # Повтор записанной игры в режиме --headless
+from utils import timing  # Общие часы и точное ожидание
+from utils.scheduler import DeadlineScheduler  # Периодические задачи основного цикла по срокам
+from utils.publisher import DetectionPublisher, SharedMemoryRing, SocketStream  # Публикация детекций
+from utils.fast_detectors import create_fast_detector  # Быстрые классические детекторы
+from utils.inference_service import InferenceClient, ServiceModel  # Общий сервис инференса
+from utils.remote_inference import DEFAULT_REMOTE_PORT, RemoteInferenceClient  # Удаленный инференс по TCP
+from config.settings import DETECTION_PROFILES, FAST_DETECTOR_CONFIG
+
+# Оверлей и управление вводом требуют Win32; без него доступен только режим --headless
+try:
+    import win32api
+    import win32con
+    import win32gui
+    import win32ui
+    from ctypes import windll
+    import pyautogui
+    import keyboard
+    from utils.cursor_control import CursorController  # Импортируем CursorController из нового модуля
+    from utils.hotkeys import HotkeyDispatcher  # Горячие клавиши через хук клавиатуры
+    WIN32_AVAILABLE = True
+except ImportError:
+    WIN32_AVAILABLE = False
 
 # Полная история версий находится в README.md
 # Reign of Bots - Версия 0.038
@@ -41,8 +58,46 @@ parser.add_argument('--no-cuda', action='store_true',
                     help='Disable CUDA acceleration even if available')
 parser.add_argument('--show-boxes', action='store_true',
                     help='Start with bounding boxes visible (default: hidden)')
+parser.add_argument('--verifier-model', default=None,
+                    help='Larger YOLO model (e.g. models/yolo11s.pt) used to periodically verify yolo11n detections')
+parser.add_argument('--bag-model', default=None,
+                    help='Dedicated YOLO model for the custom "bag" class, run next to the main model')
+parser.add_argument('--profile', default='default', choices=sorted(DETECTION_PROFILES),
+                    help='Detection profile with the active region and exclusion masks (config/settings.py)')
+parser.add_argument('--inference-service', type=int, default=None, metavar='PORT',
+                    help='Use the local inference service on this port instead of loading YOLO in-process')
+parser.add_argument('--remote-inference', default=None, metavar='HOST[:PORT]',
+                    help='Offload detection to a remote inference server (python -m utils.remote_inference)')
+parser.add_argument('--remote-budget', type=float, default=150.0, metavar='MS',
+                    help='Round-trip latency budget for remote inference; slower servers fall back to local YOLO')
+parser.add_argument('--remote-encoding', default='jpeg', choices=['jpeg', 'png'],
+                    help='Frame encoding for remote inference')
+parser.add_argument('--publish-ring', default=None, metavar='NAME',
+                    help='Publish detections to a shared-memory ring with this name (utils.publisher.RingSubscriber)')
+parser.add_argument('--publish-port', type=int, default=None, metavar='PORT',
+                    help='Publish detections as a binary stream on this local TCP port (utils.publisher.StreamSubscriber)')
+parser.add_argument('--headless', action='store_true',
+                    help='Run capture/replay, detection, tracking and target selection without overlay or input control')
+parser.add_argument('--replay', default=None, metavar='PATH',
+                    help='Headless mode: read frames from a video file or an image folder instead of the screen')
+parser.add_argument('--output', default='-', metavar='PATH',
+                    help='Headless mode: write per-frame results as JSON lines to this file ("-" for stdout)')
+parser.add_argument('--max-frames', type=int, default=None, metavar='N',
+                    help='Headless mode: stop after N frames')
+parser.add_argument('--replay-realtime', action='store_true',
+                    help='Headless replay: pace frames at the recording rate instead of running on simulated time')
+parser.add_argument('--predictive', action='store_true',
+                    help='Predictive cursor control: lead the target by the pipeline latency with critically damped motion')
 args = parser.parse_args()
 
+if not args.headless and not WIN32_AVAILABLE:
+    parser.error('pywin32, pyautogui and keyboard are required for the overlay mode; use --headless on this system')
+
+# В режиме --headless результаты пишутся в stdout, поэтому остальные сообщения уходят в stderr
+RESULTS_STREAM = sys.stdout
+if args.headless and args.output == '-':
+    sys.stdout = sys.stderr
+
 # Отключение управления курсором
 DISABLE_CURSOR_CONTROL = args.no_cursor_control
 if DISABLE_CURSOR_CONTROL:
@@ -73,48 +128,78 @@ else:
     os.environ["CUDA_VISIBLE_DEVICES"] = ""
     DEVICE = "cpu"
 
-# Загружаем YOLO модель
-print("Initializing YOLO11...")
+# Путь к модели yolo11n (нужен и тренеру, когда модель работает в сервисе)
+models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+model_path = os.path.join(models_dir, "yolo11n.pt")
+
+# Подключаемся к общему сервису инференса (опционально)
 yolo_model = None
-try:
-    # Проверяем наличие папки models
-    models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
-    os.makedirs(models_dir, exist_ok=True)
-    
-    # Путь к модели yolo11n
-    model_path = os.path.join(models_dir, "yolo11n.pt")
+if args.inference_service:
+    try:
+        yolo_model = ServiceModel(InferenceClient(port=args.inference_service))
+    except Exception as e:
+        print(f"Inference service on port {args.inference_service} is unavailable: {str(e)}")
+        print("Falling back to in-process YOLO")
+
+# Загружаем YOLO модель (если сервис инференса не используется)
+if yolo_model is None:
+    print("Initializing YOLO11...")
+    try:
+        # Проверяем наличие папки models
+        os.makedirs(models_dir, exist_ok=True)
     
-    # Используем CUDA если доступно
-    device = DEVICE
-    print(f"Using device: {device}")
+        # Используем CUDA если доступно
+        device = DEVICE
+        print(f"Using device: {device}")
     
-    # Загружаем модель если она есть
-    if os.path.exists(model_path):
-        yolo_model = YOLO(model_path)
-        # Явно указываем устройство
-        yolo_model.to(device)
-    else:
-        # Если модели нет, сообщаем об ошибке
-        print("YOLO11n model not found. Please make sure yolo11n.pt is in the models directory.")
-        sys.exit(1)
+        # Загружаем модель если она есть
+        if os.path.exists(model_path):
+            yolo_model = YOLO(model_path)
+            # Явно указываем устройство
+            yolo_model.to(device)
+        else:
+            # Если модели нет, сообщаем об ошибке
+            print("YOLO11n model not found. Please make sure yolo11n.pt is in the models directory.")
+            sys.exit(1)
         
-    print(f"YOLO11 initialized successfully on {device}")
+        print(f"YOLO11 initialized successfully on {device}")
     
-except Exception as e:
-    print(f"Error initializing YOLO11: {str(e)}")
-    print("Falling back to direct initialization")
+    except Exception as e:
+        print(f"Error initializing YOLO11: {str(e)}")
+        print("Falling back to direct initialization")
+        try:
+            yolo_model = YOLO("yolo11n.pt")
+            # Пробуем установить на доступное устройство
+            yolo_model.to(DEVICE)
+            print(f"YOLO11 initialized using fallback method on {DEVICE}")
+        except Exception as e2:
+            print(f"Critical error initializing YOLO11: {str(e2)}")
+            yolo_model = None
+
+# Загружаем большую модель для второго уровня каскада детекции (опционально)
+verifier_model = None
+if args.verifier_model:
     try:
-        yolo_model = YOLO("yolo11n.pt")
-        # Пробуем установить на доступное устройство
-        yolo_model.to(DEVICE)
-        print(f"YOLO11 initialized using fallback method on {DEVICE}")
-    except Exception as e2:
-        print(f"Critical error initializing YOLO11: {str(e2)}")
-        yolo_model = None
+        verifier_model = YOLO(args.verifier_model)
+        verifier_model.to(DEVICE)
+        print(f"Verifier model {args.verifier_model} initialized on {DEVICE}")
+    except Exception as e:
+        print(f"Error initializing verifier model {args.verifier_model}: {str(e)}")
+        verifier_model = None
+
+# Загружаем отдельную модель для класса 'bag' (опционально)
+bag_model = None
+if args.bag_model:
+    try:
+        bag_model = YOLO(args.bag_model)
+        print(f"Bag model {args.bag_model} loaded")
+    except Exception as e:
+        print(f"Error loading bag model {args.bag_model}: {str(e)}")
+        bag_model = None
 
 # Константы для эмуляции мыши
 MOUSEEVENTF_MOVE = 0x0001
-user32 = windll.user32
+user32 = windll.user32 if WIN32_AVAILABLE else None
 
 class OverlayWindow:
     """
@@ -130,7 +215,17 @@ class OverlayWindow:
     для предотвращения утечек памяти.
     """
     
-    def __init__(self):
+    def __init__(self, screen_size=None):
+        """
+        Args:
+            screen_size: Размер виртуального экрана (ширина, высота); None - запросить у системы
+        """
+        # Устанавливаем размеры экрана (запрашиваются один раз)
+        if screen_size is None:
+            screen_size = (win32api.GetSystemMetrics(win32con.SM_CXVIRTUALSCREEN),
+                           win32api.GetSystemMetrics(win32con.SM_CYVIRTUALSCREEN))
+        self.screen_width, self.screen_height = screen_size
+        
         # Создаем окно
         self.hwnd = win32gui.CreateWindowEx(
             win32con.WS_EX_LAYERED | win32con.WS_EX_TRANSPARENT | win32con.WS_EX_TOPMOST,
@@ -138,15 +233,11 @@ class OverlayWindow:
             "Overlay",
             win32con.WS_POPUP | win32con.WS_VISIBLE,
             0, 0,
-            win32api.GetSystemMetrics(win32con.SM_CXVIRTUALSCREEN),
-            win32api.GetSystemMetrics(win32con.SM_CYVIRTUALSCREEN),
+            self.screen_width,
+            self.screen_height,
             0, 0, 0, None
         )
         
-        # Устанавливаем размеры экрана
-        self.screen_width = win32api.GetSystemMetrics(win32con.SM_CXVIRTUALSCREEN)
-        self.screen_height = win32api.GetSystemMetrics(win32con.SM_CYVIRTUALSCREEN)
-        
         # Создаем DC для окна
         self.hdc = win32gui.GetDC(self.hwnd)
         self.mfc_dc = win32ui.CreateDCFromHandle(self.hdc)
@@ -184,7 +275,7 @@ class OverlayWindow:
         self.crosshair_thickness = 2
         self.crosshair_dot_radius = 3  # Радиус точек на концах линий
         
-        self.last_update_time = time.time()
+        self.last_update_time = timing.now()
         self.update_interval = 1.0 / 30.0  # 30 FPS
         
                 # Удален флаг для отрисовки скелета, так как функционал не используется
@@ -207,7 +298,7 @@ class OverlayWindow:
         self.font_cache = {}
         
         # Время последней очистки кэша
-        self.last_cache_clear_time = time.time()
+        self.last_cache_clear_time = timing.now()
         self.cache_clear_interval = 30.0  # Очищать кэш каждые 30 секунд
 
     def create_pen(self, style, width, color):
@@ -351,7 +442,7 @@ class OverlayWindow:
                           вне зависимости от времени последней очистки кэша.
         """
         try:
-            current_time = time.time()
+            current_time = timing.now()
             # Проверяем, прошло ли достаточно времени для очистки кэша
             if force or current_time - self.last_cache_clear_time > self.cache_clear_interval:
                 # Сначала очищаем кэши
@@ -1045,8 +1136,12 @@ class OverlayWindow:
         except Exception as e:
             print(f"Error drawing training status: {str(e)}")
 
-    def update_info(self, cursor_pos, target_pos, distance, movement, detected_objects=None, fps=0, perf_stats=None, speed=0, direction=0, cursor_controller=None):
-        current_time = time.time()
+    def update_info(self, cursor_pos, target_pos, distance, movement, detected_objects=None, fps=0, perf_stats=None, speed=0, direction=0, cursor_controller=None,
+                    training_active=False, fine_tuning_active=False, context=None):
+        current_time = timing.now()
+        # Режимы обучения берутся из контекста кадра, если он передан
+        if context is not None:
+            training_active, fine_tuning_active = context.training_active, context.fine_tuning_active
         if current_time - self.last_update_time < self.update_interval:
             return
         self.last_update_time = current_time
@@ -1256,7 +1351,11 @@ class OverlayWindow:
                             'detection': 'Detect',
                             'drawing': 'Draw',
                             'overlay': 'Overlay',
-                            'cursor': 'Cursor'
+                            'cursor': 'Cursor',
+                            'detect_fast': 'Detect fast',
+                            'detect_verify': 'Detect verify',
+                            'detect_plugins': 'Fast plugins',
+                            'detect_remote': 'Remote'
                         }.get(name, name)
                         
                         # Выводим данные о производительности
@@ -1533,7 +1632,7 @@ class DrawingUtils:    # Удален словарь BODY_PARTS, так как 
                 2
             )
 
-def draw_objects(frame, detected_objects, target_x, target_y, cursor_controller, perf_monitor):
+def draw_objects(frame, detected_objects, target_x, target_y, cursor_controller, perf_monitor, trainer=None):
     """
     Draw detected objects and cursor on the frame.
     
@@ -1543,6 +1642,7 @@ def draw_objects(frame, detected_objects, target_x, target_y, cursor_controller,
         target_x, target_y: Coordinates of the target (if any)
         cursor_controller: The cursor controller object
         perf_monitor: Performance monitoring object
+        trainer: YOLOTrainer collecting training data (None if collection is off)
         
     Returns:
         The modified frame with drawings
@@ -1567,7 +1667,7 @@ def draw_objects(frame, detected_objects, target_x, target_y, cursor_controller,
                 text = f"{class_name}: {distance:.2f}m"
                 
                 # Добавляем текст о выбранной цели
-                if obj.get('is_target', False) and not training_active:
+                if obj.get('is_target', False) and trainer is None:
                     text += " [TARGET]"
                     # Рисуем более толстую рамку для целевого объекта
                     # Используем голубой цвет для целевого объекта
@@ -1611,7 +1711,7 @@ def draw_objects(frame, detected_objects, target_x, target_y, cursor_controller,
             cv2.circle(frame, (target_x, target_y), 5, (0, 0, 255), -1)
         
         # В режиме обучения добавляем информацию в кадр
-        if training_active:
+        if trainer is not None:
             cv2.rectangle(frame, (0, 0), (frame.shape[1], 40), (0, 0, 0), -1)
             status_text = f"TRAINING MODE: Collecting bag data, {trainer.frames_to_save} frames remaining"
             cv2.putText(frame, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
@@ -1626,168 +1726,163 @@ def draw_objects(frame, detected_objects, target_x, target_y, cursor_controller,
         perf_monitor.stop('drawing')
         return frame
 
-def process_frame(frame, cursor_controller, overlay, fps, perf_monitor):
+def create_pipeline(cursor_controller, perf_monitor, capture=None):
     """
-    Process a video frame to detect objects, select targets, and update the cursor.
+    Create the detection pipeline with the configured detector.
     
     Args:
-        frame: The input frame to process
-        cursor_controller: The cursor controller object
-        overlay: The overlay window object
-        fps: Current frames per second
+        cursor_controller: The cursor controller object (None for headless mode)
         perf_monitor: Performance monitoring object
+        capture: Frame source (None to capture the screen)
         
     Returns:
-        A tuple of (target_x, target_y, target_distance, speed, direction, detected_objects)
+        Pipeline: The pipeline owning the detector, tracker and training state
     """
-    try:
-        # Минимизируем логирование для лучшей производительности
-        #print("Starting process_frame...")
-        
-        # Сбрасываем флаг перемещения курсора в начале обработки кадра
-        cursor_controller.cursor_moved_this_frame = False
-        
-        if frame is None or frame.size == 0:
-            print("Error: Invalid frame")
-            # Обязательно вызовем handle_auto_movement с box=None
-            cursor_controller.handle_auto_movement(None, None)
-            return None, None, None, 0.0, 0.0, []
-            
-        perf_monitor.start('process')
-        
-        # Получаем размеры экрана
-        screen_width = win32api.GetSystemMetrics(win32con.SM_CXVIRTUALSCREEN)
-        screen_height = win32api.GetSystemMetrics(win32con.SM_CYVIRTUALSCREEN)
-        
-        # Инициализируем детектор при первом вызове
-        if not hasattr(process_frame, "detector"):
-            process_frame.detector = YOLOPersonDetector(model=yolo_model, conf=0.4, device=DEVICE, debug=False)
-        
-        # 1. Обнаружение объектов
-        detected_objects, results = detect_objects(frame, perf_monitor, process_frame.detector, screen_width, screen_height)
-        
-        # 2. Выбор целевого объекта
-        target_box, target_x, target_y, target_distance, speed, direction = select_target(
-            detected_objects, 
-            cursor_controller, 
-            training_active
-        )
-        
-        # 3. Обработка движения курсора
-        cursor_controller.handle_auto_movement(target_distance, target_box)
-        
-        # 4. Перемещение курсора если есть цель и еще не было перемещения в этом кадре
-        if target_box and target_x is not None and target_y is not None and not training_active and not cursor_controller.cursor_moved_this_frame:
-            perf_monitor.start('cursor')
-            cursor_x, cursor_y = cursor_controller.move_cursor(target_x, target_y)
-            perf_monitor.stop('cursor')
-        else:
-            # Используем текущую позицию курсора для отображения
-            cursor_pos = win32api.GetCursorPos()
-        
-        # 5. Отрисовка объектов на кадре
-        draw_objects(frame, detected_objects, target_x, target_y, cursor_controller, perf_monitor)
-        
-        perf_monitor.stop('process')
-        return target_x, target_y, target_distance, speed, direction, detected_objects
-        
-    except Exception as e:
-        print(f"Error in process_frame: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        perf_monitor.stop('process')
-        # Гарантируем вызов handle_auto_movement даже при ошибке
-        cursor_controller.handle_auto_movement(None, None)
-        return None, None, None, 0.0, 0.0, []
-
-# Initialize the trainer if YOLO model is available
-trainer = None
-training_active = False
-fine_tuning_active = False
-
-def initialize_trainer():
-    """Initialize the YOLOTrainer with the current YOLO model"""
-    global trainer, yolo_model
+    detector = YOLOPersonDetector(model=yolo_model, conf=0.4, device=DEVICE, debug=False,
+                                  verifier_model=verifier_model)
+    if bag_model is not None:
+        # Специализированная модель: все ее классы считаются мешками, запуск 2 раза в секунду
+        bag_classes = {class_id: 'bag' for class_id in bag_model.names}
+        detector.add_model('bag', bag_model, class_names=bag_classes, interval=0.5)
+    for class_name, plugin_config in FAST_DETECTOR_CONFIG.items():
+        try:
+            detector.add_plugin(create_fast_detector(class_name, plugin_config))
+        except Exception as e:
+            print(f"Error creating fast detector for class '{class_name}': {str(e)}")
+    if args.remote_inference:
+        remote_host, _, remote_port = args.remote_inference.partition(':')
+        detector.set_remote(RemoteInferenceClient(
+            remote_host, int(remote_port or DEFAULT_REMOTE_PORT),
+            encoding=args.remote_encoding, latency_budget=args.remote_budget / 1000.0
+        ))
+    profile = DETECTION_PROFILES[args.profile]
+    detector.set_regions(profile.get('active_region'), profile.get('exclusion_masks', ()))
     
-    if yolo_model is not None:
-        trainer = YOLOTrainer(model=yolo_model, model_path=model_path)
-        print("YOLOTrainer initialized successfully")
-        return True
-    else:
-        print("Failed to initialize YOLOTrainer: No YOLO model available")
-        return False
-        
-def toggle_training_collection():
-    """Toggle training data collection on/off"""
-    global training_active, trainer
+    publisher = None
+    if args.publish_ring or args.publish_port:
+        publisher = DetectionPublisher()
+        if args.publish_ring:
+            publisher.add_transport(SharedMemoryRing(args.publish_ring))
+        if args.publish_port:
+            publisher.add_transport(SocketStream(port=args.publish_port))
     
-    if trainer is None:
-        if not initialize_trainer():
-            print("Cannot start training collection: failed to initialize trainer")
-            return False
+    if cursor_controller is None:
+        # Режим без оверлея и управления: только выбор и сопровождение цели
+        return Pipeline(detector, capture=capture, perf_monitor=perf_monitor,
+                        publisher=publisher, targeting=TargetingSettings(), name='headless')
     
-    if training_active:
-        trainer.stop_collection()
-        training_active = False
-        print("Training data collection stopped")
-    else:
-        # Start collecting data, all objects will be labeled as class 80 (bag)
-        trainer.start_collection(frames_to_collect=100)
-        training_active = True
-        print("Training data collection for new class 'Bag' started")
-        print("All detected objects will be automatically labeled as 'bag' (class 80)")
+    def create_trainer():
+        # Прокси сервиса инференса не обучается и не сохраняется - тренеру нужна локальная модель
+        model = detector.model
+        if isinstance(model, ServiceModel):
+            if not os.path.exists(model_path):
+                print(f"Training needs a local model with --inference-service, {model_path} not found")
+                return None
+            print(f"Loading local model {model_path} for training")
+            model = YOLO(model_path)
+        return YOLOTrainer(model=model, model_path=model_path)
     
-    return training_active
-
-def start_fine_tuning():
-    """Start fine-tuning the model with collected data"""
-    global trainer, fine_tuning_active, yolo_model
+    pipeline = Pipeline(
+        detector,
+        capture=capture,
+        cursor_controller=cursor_controller,
+        perf_monitor=perf_monitor,
+        trainer_factory=create_trainer,
+        cursor_position=cursor_controller.actuator.cursor_position,
+        publisher=publisher
+    )
     
-    if trainer is None:
-        if not initialize_trainer():
-            print("Cannot start fine-tuning: failed to initialize trainer")
-            return False
+    # Отрисовка объектов на кадре после обработки
+    pipeline.add_hook(lambda frame, detected_objects, target_x, target_y: draw_objects(
+        frame, detected_objects, target_x, target_y, cursor_controller, perf_monitor,
+        pipeline.trainer if pipeline.training_active else None
+    ))
+    return pipeline
+
+def run_headless():
+    """
+    Run the perception stack without overlay or input control.
     
-    if fine_tuning_active:
-        print("Fine-tuning is already in progress")
-        return False
+    Frames come from the screen or from --replay. Each processed frame is written
+    as a JSON line to --output, and sustained throughput is reported every 5 seconds.
+    A replay runs on simulated time advanced by the recording's frame interval, so
+    time-based scheduling behaves as in real time while frames are processed as fast
+    as possible; --replay-realtime paces the replay on the real clock instead.
     
-    # Start fine-tuning in a separate thread
-    def fine_tuning_thread():
-        global fine_tuning_active, yolo_model
-        
-        fine_tuning_active = True
-        print("Starting model fine-tuning with new class 'Bag'...")
-        
-        # Используем доступное устройство для дообучения
-        success = trainer.fine_tune(epochs=5, batch_size=4, device=DEVICE)
-        
-        if success:
-            # Update the main model with the fine-tuned one
-            yolo_model = trainer.model
-            
-            # Update the detector with the new model
-            if hasattr(process_frame, "detector") and process_frame.detector:
-                process_frame.detector.model = yolo_model
-                process_frame.detector.model.to(process_frame.detector.device)
-                print("Updated detector with fine-tuned model")
-                
-                # Добавляем класс 'bag' в пользовательские классы детектора
-                if 80 not in process_frame.detector.custom_classes:
-                    process_frame.detector.custom_classes[80] = 'bag'
-                    print("Added 'bag' class to detector's custom classes")
-            
-            print("Model fine-tuning completed successfully!")
-            print("New class 'Bag' (ID 80) has been added to the model")
-        else:
-            print("Model fine-tuning failed")
-        
-        fine_tuning_active = False
+    Returns:
+        Exit code
+    """
+    perf_monitor = PerformanceMonitor()
+    capture = VideoReplay(args.replay) if args.replay else None
+    clock = None
+    if capture is not None and not args.replay_realtime:
+        clock = timing.SimulatedClock()
+        timing.set_clock(clock)
+    pipeline = create_pipeline(None, perf_monitor, capture=capture)
+    output = RESULTS_STREAM if args.output == '-' else open(args.output, 'w')
     
-    Thread(target=fine_tuning_thread, daemon=True).start()
-    return True
+    frame_count = 0
+    window_frames = 0
+    start_time = time.perf_counter()
+    window_start = start_time
+    try:
+        next_frame_time = timing.now()
+        grab_backoff = 0.001
+        while args.max_frames is None or frame_count < args.max_frames:
+            if capture is not None:
+                # Кадры записи идут с ее частотой: на моделируемых часах ожидание мгновенное
+                timing.wait_until(next_frame_time)
+                next_frame_time += 1.0 / capture.fps
+            frame = pipeline.grab()
+            if frame is None:
+                if capture is not None and capture.finished:
+                    break
+                if capture is None:
+                    # Нового кадра экрана нет: ждем с нарастающей задержкой, а не крутим цикл вхолостую
+                    # (без окна активного ожидания - точность пробуждения здесь не важна)
+                    timing.wait_until(timing.now() + grab_backoff, 0.0)
+                    grab_backoff = min(grab_backoff * 2, 0.05)
+                continue
+            grab_backoff = 0.001
+            
+            target_x, target_y, target_distance, speed, direction, detected_objects = pipeline.process(frame)
+            frame_count += 1
+            window_frames += 1
+            
+            output.write(json.dumps({
+                'frame': frame_count,
+                'time': time.time(),
+                'target': [target_x, target_y] if target_x is not None else None,
+                'distance': target_distance,
+                'objects': [{'class': obj['class'], 'box': [int(v) for v in obj['box']],
+                             'distance': obj['distance'], 'is_target': obj.get('is_target', False)}
+                            for obj in detected_objects]
+            }) + '\n')
+            
+            now = time.perf_counter()
+            if now - window_start >= 5.0:
+                stats = perf_monitor.get_stats()
+                stages = ', '.join(f"{name}: {counter.avg_time * 1000:.1f}ms" for name, counter in stats.items())
+                print(f"Headless throughput: {window_frames / (now - window_start):.1f} FPS ({stages})")
+                window_frames = 0
+                window_start = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        elapsed = time.perf_counter() - start_time
+        print(f"Processed {frame_count} frames in {elapsed:.1f}s "
+              f"({frame_count / elapsed if elapsed > 0 else 0.0:.1f} FPS sustained)")
+        if output is not RESULTS_STREAM:
+            output.close()
+        pipeline.cleanup()
+        if clock is not None:
+            timing.set_clock(None)
+    return 0
 
 def main():
+    if args.headless:
+        return run_headless()
+    
     try:
         print("Starting initialization...")
         
@@ -1797,34 +1892,36 @@ def main():
         
         # Инициализация компонентов
         print("Initializing CursorController...")
-        cursor_controller = CursorController()
+        cursor_controller = CursorController(predictive=args.predictive)
         print("CursorController initialized")
         
         print("Initializing OverlayWindow...")
-        overlay = OverlayWindow()
+        overlay = OverlayWindow(screen_size=(cursor_controller.screen_width, cursor_controller.screen_height))
         print("OverlayWindow initialized")
         
         print("Initializing PerformanceMonitor...")
         perf_monitor = PerformanceMonitor()
         print("PerformanceMonitor initialized")
         
-        # Основной цикл
+        print("Initializing Pipeline...")
+        pipeline = create_pipeline(cursor_controller, perf_monitor)
+        print("Pipeline initialized")
+        
+        # Основной цикл: периодические задачи со своими сроками и частотами
         cursor_pos = (0, 0)
         target_pos = (0, 0)
         distance = 0.0
         speed = 0.0
         direction = 0.0
+        movement = (0, 0)
+        detected_objects = []
         fps = 0.0
         frame_count = 0
-        start_time = time.time()
-        last_stats_time = time.time()
-        last_process_time = time.time()
-        process_interval = 1.0 / 60.0  # 60 Hz для process_frame
-        
-        # Добавляем счетчики для периодической очистки GDI объектов и принудительного обновления оверлея
-        last_gdi_clean_time = time.time()
+        start_time = timing.now()
+        process_interval = 1.0 / 60.0  # 60 Hz для обработки кадров
+        hotkey_interval = 1.0 / 30.0  # Разбор очереди горячих клавиш
+        stats_interval = 5.0  # Вывод статистики каждые 5 секунд
         gdi_clean_interval = 5.0  # Очистка GDI объектов каждые 5 секунд
-        last_overlay_refresh_time = time.time()
         overlay_refresh_interval = 10.0  # Принудительное обновление оверлея каждые 10 секунд
         
         print("Starting main loop...")
@@ -1847,161 +1944,165 @@ def main():
         print("0: person, 56: chair, 58: potted plant, 62: tv, 57: couch, 74: clock, 73: book")
         print("Use '\\' key to toggle ignoring people (class 0)")
         
-        while True:
-            try:
-                current_time = time.time()
-                
-                # Проверяем нажатие клавиш перед обработкой кадра
-                if keyboard.is_pressed('F1'):
-                    print("F1 pressed, exiting...")
-                    break
-                elif keyboard.is_pressed('-'):
-                    if cursor_controller.toggle_mode():
-                        print("Toggled mouse mode")
-                        time.sleep(0.1)
-                elif keyboard.is_pressed('+'):
-                    if cursor_controller.toggle_following():
-                        print("Toggled following mode")
-                        time.sleep(0.1)
-                elif keyboard.is_pressed('F5') or keyboard.is_pressed('f5'):
-                    if cursor_controller.toggle_cursor_control():
-                        enabled_status = "ENABLED" if cursor_controller.cursor_control_enabled else "DISABLED"
-                        print(f"Cursor control {enabled_status}")
-                        time.sleep(0.1)
-                elif keyboard.is_pressed('F4') or keyboard.is_pressed('f4'):
-                    # Переключаем видимость рамок
-                    overlay.draw_bounding_boxes = not overlay.draw_bounding_boxes
-                    status = "VISIBLE" if overlay.draw_bounding_boxes else "HIDDEN"
-                    print(f"Bounding boxes are now {status}")
-                    print(f"Debug: overlay.draw_bounding_boxes = {overlay.draw_bounding_boxes}")
-                    time.sleep(0.1)
-                elif keyboard.is_pressed('backspace'):
-                    if cursor_controller.toggle_attack():
-                        print("Toggled attack mode")
-                        time.sleep(0.1)
-                elif keyboard.is_pressed('\\'):
-                    # Добавляем или удаляем "person" из списка игнорируемых объектов
-                    if cursor_controller.toggle_class_ignore("person"):
-                        print("Now ignoring people")
-                    else:
-                        print("Now tracking people")
-                    time.sleep(0.1)
-                # Add these keyboard handlers
-                elif keyboard.is_pressed('f6'):
-                    if toggle_training_collection():
-                        print("Started collecting training data for new class 'Bag'")
-                        print("All detected objects will be labeled as 'bag' class (ID 80)")
-                    else:
-                        print("Stopped collecting training data")
-                    time.sleep(0.1)
-                elif keyboard.is_pressed('f7'):
-                    if start_fine_tuning():
-                        print("Started fine-tuning process with new class 'Bag'")
-                    time.sleep(0.1)
-                
-                # Обработка кадра с ограничением частоты до 60 Hz
-                if current_time - last_process_time >= process_interval:
-                    perf_monitor.start('capture')
-                    frame = capture_screen()  # Используем импортированную функцию захвата экрана
-                    perf_monitor.stop('capture')
-                    
-                    if frame is not None:
-                        target_x, target_y, target_distance, speed, direction, detected_objects = process_frame(
-                            frame, cursor_controller, overlay, fps, perf_monitor
-                        )
-                        
-                        if target_x is not None and target_y is not None:
-                            target_pos = (target_x, target_y)
-                            distance = target_distance
-                            cursor_pos = cursor_controller.move_cursor(target_pos[0], target_pos[1])
-                            movement = (int(target_pos[0] - cursor_pos[0]), int(target_pos[1] - cursor_pos[1]))
-                        else:
-                            movement = (0, 0)
-                            cursor_pos = win32api.GetCursorPos()  # Get current cursor position
-                            
-                        # Обновление оверлея
-                        perf_monitor.start('overlay')
-                        try:
-                            overlay.update_info(
-                                cursor_pos, target_pos, distance,
-                                movement, detected_objects,
-                                fps, perf_monitor.get_stats(),
-                                speed, direction, cursor_controller
-                            )
-                        except Exception as e:
-                            print(f"Error updating overlay: {str(e)}")
-                            import traceback
-                            traceback.print_exc()
-                        finally:
-                            perf_monitor.stop('overlay')
-                        
-                        # Handle training data collection if active
-                        if training_active and trainer is not None:
-                            # Получаем текущую позицию курсора для аннотации мешка
-                            current_cursor_pos = win32api.GetCursorPos()
-                            # Передаем кадр, результаты детекции и позицию курсора
-                            trainer.process_frame(
-                                frame, 
-                                process_frame.detector.last_results,
-                                current_cursor_pos
-                            )
-                            
-                        # Обновляем время последней обработки
-                        last_process_time = current_time
-                        
-                        # Обновление FPS
-                        frame_count += 1
-                        elapsed_time = current_time - start_time
-                        if elapsed_time >= 1.0:
-                            fps = frame_count / elapsed_time
-                            frame_count = 0
-                            start_time = current_time
-                
-                # Выводим статистику каждые 5 секунд
-                if current_time - last_stats_time >= 5.0:
-                    stats = perf_monitor.get_stats()
-                    print("\nPerformance Statistics:")
-                    for name, counter in stats.items():
-                        print(f"{name}: {counter.current_time*1000:.1f}ms (avg: {counter.avg_time*1000:.1f}ms)")
-                    last_stats_time = current_time
-                
-                # Периодическая очистка GDI объектов для предотвращения утечек
-                if current_time - last_gdi_clean_time >= gdi_clean_interval:
-                    try:
-                        overlay.clean_gdi_objects(force=True)
-                        last_gdi_clean_time = current_time
-                    except Exception as e:
-                        print(f"Error during GDI cleanup: {str(e)}")
-                
-                # Принудительное обновление оверлея, чтобы избежать исчезновения
-                if current_time - last_overlay_refresh_time >= overlay_refresh_interval:
-                    try:
-                        # Принудительно обновляем оверлей с текущими данными
-                        overlay.update_info(
-                            cursor_pos, target_pos, distance,
-                            movement, detected_objects,
-                            fps, perf_monitor.get_stats(),
-                            speed, direction, cursor_controller
-                        )
-                        last_overlay_refresh_time = current_time
-                    except Exception as e:
-                        print(f"Error during overlay refresh: {str(e)}")
-                
-                # Обработка событий OpenCV
-                key = cv2.waitKey(1) & 0xFF
-                if key == 27:  # ESC
-                    print("ESC pressed, exiting...")
-                    break
-                
-                # Небольшая задержка для снижения нагрузки на CPU
-                time.sleep(0.001)
+        # Горячие клавиши: хук клавиатуры ставит команды в очередь, цикл кадров
+        # выполняет их без опроса клавиш и без пауз
+        def toggle_mouse_mode():
+            if cursor_controller.toggle_mode():
+                print("Toggled mouse mode")
+        
+        def toggle_following():
+            if cursor_controller.toggle_following():
+                print("Toggled following mode")
+        
+        def toggle_cursor_control():
+            if cursor_controller.toggle_cursor_control():
+                enabled_status = "ENABLED" if cursor_controller.cursor_control_enabled else "DISABLED"
+                print(f"Cursor control {enabled_status}")
+        
+        def toggle_bounding_boxes():
+            # Переключаем видимость рамок
+            overlay.draw_bounding_boxes = not overlay.draw_bounding_boxes
+            status = "VISIBLE" if overlay.draw_bounding_boxes else "HIDDEN"
+            print(f"Bounding boxes are now {status}")
+        
+        def toggle_attack():
+            if cursor_controller.toggle_attack():
+                print("Toggled attack mode")
+        
+        def toggle_ignore_people():
+            # Добавляем или удаляем "person" из списка игнорируемых объектов
+            if cursor_controller.toggle_class_ignore("person"):
+                print("Now ignoring people")
+            else:
+                print("Now tracking people")
+        
+        def toggle_training():
+            if pipeline.toggle_training_collection():
+                print("Started collecting training data for new class 'Bag'")
+                print("All detected objects will be labeled as 'bag' class (ID 80)")
+            else:
+                print("Stopped collecting training data")
+        
+        def start_fine_tuning():
+            if pipeline.start_fine_tuning(DEVICE):
+                print("Started fine-tuning process with new class 'Bag'")
+        
+        # CursorController уже включил таймер 1 мс (timeBeginPeriod) для всего процесса, поэтому
+        # сроки кадров выдерживаются обычным sleep; активное ожидание держало бы GIL перед каждым
+        # сроком и отнимало время у потока управления курсором
+        precise_sleep = cursor_controller.timer_period_set or sys.platform != 'win32'
+        scheduler = DeadlineScheduler(spin_window=0.0 if precise_sleep else 0.001)
+        
+        def exit_main_loop():
+            print("F1 pressed, exiting...")
+            scheduler.stop()
+        
+        hotkeys = HotkeyDispatcher(debounce=0.2)
+        hotkeys.register('f1', 'exit', exit_main_loop)
+        hotkeys.register('-', 'toggle_mode', toggle_mouse_mode)
+        hotkeys.register('+', 'toggle_following', toggle_following)
+        hotkeys.register('f5', 'toggle_cursor_control', toggle_cursor_control)
+        hotkeys.register('f4', 'toggle_bounding_boxes', toggle_bounding_boxes)
+        hotkeys.register('backspace', 'toggle_attack', toggle_attack)
+        hotkeys.register('\\', 'toggle_ignore_people', toggle_ignore_people)
+        hotkeys.register('f6', 'toggle_training', toggle_training)
+        hotkeys.register('f7', 'start_fine_tuning', start_fine_tuning)
+        
+        def process_frame():
+            """Задача кадра: захват, обработка и обновление оверлея"""
+            nonlocal cursor_pos, target_pos, distance, speed, direction, movement, detected_objects
+            nonlocal fps, frame_count, start_time
+            frame = pipeline.grab()
+            if frame is None:
+                return
+            
+            target_x, target_y, target_distance, speed, direction, detected_objects = pipeline.process(frame)
+            context = pipeline.context
+            
+            if target_x is not None and target_y is not None:
+                target_pos = (target_x, target_y)
+                distance = target_distance
+                cursor_pos = cursor_controller.move_cursor(target_pos[0], target_pos[1])
+                movement = (int(target_pos[0] - cursor_pos[0]), int(target_pos[1] - cursor_pos[1]))
+            else:
+                movement = (0, 0)
+                cursor_pos = context.cursor_position  # Позиция курсора из контекста кадра
                 
+            # Обновление оверлея
+            perf_monitor.start('overlay')
+            try:
+                overlay.update_info(
+                    cursor_pos, target_pos, distance,
+                    movement, detected_objects,
+                    fps, perf_monitor.get_stats(),
+                    speed, direction, cursor_controller,
+                    context=context
+                )
             except Exception as e:
-                print(f"Error in main loop iteration: {str(e)}")
+                print(f"Error updating overlay: {str(e)}")
                 import traceback
                 traceback.print_exc()
-                time.sleep(1)
-                
+            finally:
+                perf_monitor.stop('overlay')
+            
+            # Обновление FPS
+            frame_count += 1
+            current_time = timing.now()
+            elapsed_time = current_time - start_time
+            if elapsed_time >= 1.0:
+                fps = frame_count / elapsed_time
+                frame_count = 0
+                start_time = current_time
+        
+        def print_stats():
+            """Задача статистики: счетчики, цикл курсора и темп задач планировщика"""
+            loop_stats = cursor_controller.get_loop_stats()
+            perf_monitor.set_state('cursor_loop', f"{loop_stats['state']}, {loop_stats['rate']:.0f} Hz, "
+                                                  f"jitter {loop_stats['jitter_ms']:.2f}ms, "
+                                                  f"late {loop_stats['lateness_ms']:.2f}ms")
+            wake_stats = timing.get_clock().wake_stats()
+            perf_monitor.set_state('wake_error', f"mean {wake_stats['mean_ms']:.3f}ms, "
+                                                 f"max {wake_stats['max_ms']:.3f}ms")
+            for name, task_stats in scheduler.stats().items():
+                perf_monitor.set_state(f"task_{name}", f"{task_stats['rate']:.1f} Hz, "
+                                                       f"jitter {task_stats['jitter_ms']:.2f}ms, "
+                                                       f"late {task_stats['lateness_ms']:.2f}ms, "
+                                                       f"{task_stats['overruns']} overruns")
+            stats = perf_monitor.get_stats()
+            print("\nPerformance Statistics:")
+            for name, counter in stats.items():
+                print(f"{name}: {counter.current_time*1000:.1f}ms (avg: {counter.avg_time*1000:.1f}ms)")
+            for name, state in perf_monitor.get_states().items():
+                print(f"{name}: {state}")
+        
+        def clean_gdi():
+            """Задача периодической очистки GDI объектов для предотвращения утечек"""
+            try:
+                overlay.clean_gdi_objects(force=True)
+            except Exception as e:
+                print(f"Error during GDI cleanup: {str(e)}")
+        
+        def refresh_overlay():
+            """Задача принудительного обновления оверлея, чтобы избежать исчезновения"""
+            try:
+                overlay.update_info(
+                    cursor_pos, target_pos, distance,
+                    movement, detected_objects,
+                    fps, perf_monitor.get_stats(),
+                    speed, direction, cursor_controller,
+                    pipeline.training_active, pipeline.fine_tuning_active
+                )
+            except Exception as e:
+                print(f"Error during overlay refresh: {str(e)}")
+        
+        # Цикл спит до ближайшего срока; первые запуски служебных задач - через период
+        scheduler.add('frame', process_interval, process_frame)
+        scheduler.add('hotkeys', hotkey_interval, hotkeys.dispatch)
+        scheduler.add('stats', stats_interval, print_stats, delay=stats_interval)
+        scheduler.add('gdi', gdi_clean_interval, clean_gdi, delay=gdi_clean_interval)
+        scheduler.add('overlay_refresh', overlay_refresh_interval, refresh_overlay, delay=overlay_refresh_interval)
+        scheduler.run()
+        
     except Exception as e:
         print(f"Error in main loop: {str(e)}")
         import traceback
@@ -2020,6 +2121,9 @@ def main():
             
                 # Удалено: блок с recorder, так как VideoRecorder больше не используется
             
+        if 'hotkeys' in locals():
+            hotkeys.close()
+            
         try:
             # Очищаем ресурсы контроллера курсора
             if 'cursor_controller' in locals():
@@ -2028,10 +2132,10 @@ def main():
         except Exception as e:
             print(f"Error cleaning cursor controller: {str(e)}")
             
-        # Очищаем ресурсы MSS с использованием contextlib.suppress для корректной обработки исключений
-        if hasattr(capture_screen, "screen_capturer"):
+        # Очищаем ресурсы захвата экрана конвейера
+        if 'pipeline' in locals():
             print("Cleaning MSS screen capture resources...")
-            capture_screen.screen_capturer.cleanup()
+            pipeline.cleanup()
             
         print("Cleanup complete, exiting...")
         cv2.destroyAllWindows()
@@ -0,0 +1,21 @@
+"""
+Общие настройки тестов: корень репозитория в sys.path и моделируемые часы.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import timing  # noqa: E402
+
+
+@pytest.fixture
+def simulated_clock():
+    """Общие часы процесса заменяются моделируемыми на время теста"""
+    clock = timing.SimulatedClock(start=100.0)
+    previous = timing.set_clock(clock)
+    yield clock
+    timing.set_clock(previous)
@@ -0,0 +1,125 @@
+"""
+Тесты исполнителя ввода: объединение событий такта, пакетная отправка и поток клавиш.
+"""
+
+from utils.actuation import KeyActuator, RecordingActuator
+
+
+def test_consecutive_moves_are_coalesced():
+    actuator = RecordingActuator()
+    actuator.move_relative(3, -2)
+    actuator.move_relative(4, 1)
+    actuator.move_relative(-1, 0)
+
+    assert actuator.pending == [('move', 6, -1)]
+
+
+def test_last_set_position_wins():
+    actuator = RecordingActuator()
+    actuator.set_position(10, 20)
+    actuator.set_position(30, 40)
+
+    assert actuator.pending == [('set_position', 30, 40)]
+
+
+def test_interleaved_events_keep_order():
+    actuator = RecordingActuator()
+    actuator.move_relative(5, 5)
+    actuator.set_position(960, 540)
+    actuator.move_relative(1, 1)
+    actuator.click('left')
+
+    assert actuator.pending == [
+        ('move', 5, 5),
+        ('set_position', 960, 540),
+        ('move', 1, 1),
+        ('button', 'left', True),
+        ('button', 'left', False),
+    ]
+
+
+def test_flush_submits_one_batch():
+    actuator = RecordingActuator(position=(100, 100))
+    actuator.move_relative(10, 0)
+    actuator.move_relative(5, -20)
+    actuator.set_position(500, 400)
+    actuator.move_relative(-50, 25)
+
+    sent = actuator.flush()
+
+    assert sent == 3
+    assert actuator.pending == []
+    assert actuator.batches == 1
+    assert actuator.events == 3
+    # Все события такта записаны одним пакетом с одной временной меткой
+    assert {batch for _, batch, _ in actuator.recorded} == {0}
+    assert len({timestamp for timestamp, _, _ in actuator.recorded}) == 1
+    assert actuator.cursor_position() == (450, 425)
+
+
+def test_empty_flush_does_not_submit():
+    actuator = RecordingActuator()
+
+    assert actuator.flush() == 0
+    assert actuator.batches == 0
+    assert actuator.recorded == []
+
+
+def test_each_flush_is_a_separate_batch():
+    actuator = RecordingActuator(position=(0, 0))
+    for _ in range(3):
+        actuator.move_relative(1, 1)
+        actuator.move_relative(1, 1)
+        actuator.flush()
+
+    assert actuator.batches == 3
+    assert [batch for _, batch, _ in actuator.recorded] == [0, 1, 2]
+    assert actuator.cursor_position() == (6, 6)
+
+
+def test_position_is_clamped_to_screen():
+    actuator = RecordingActuator(screen_width=800, screen_height=600, position=(790, 10))
+    actuator.move_relative(100, -100)
+    actuator.flush()
+
+    assert actuator.cursor_position() == (799, 0)
+
+
+def test_key_actuator_sends_from_its_thread():
+    actuator = RecordingActuator()
+    keys = KeyActuator(actuator, keys=('w',))
+    keys.press('w')
+    keys.press('w')  # Повторное нажатие игнорируется
+    keys.release('w')
+    keys.close()
+
+    assert [event for _, _, event in actuator.recorded] == [('key', 'w', True), ('key', 'w', False)]
+    # Каждое событие клавиши - отдельная отправка из потока клавиш
+    assert actuator.batches == 2
+    assert not keys.is_held('w')
+
+
+def test_key_actuator_tells_injected_from_manual_presses():
+    actuator = RecordingActuator()
+    keys = KeyActuator(actuator, keys=('w',))
+    keys.press('w')
+    keys.close()
+
+    # Собственное нажатие потока клавиш не считается ручным
+    assert actuator.is_key_pressed('w') is False
+    assert not keys.is_manual('w')
+
+    actuator.press_manual('w', True)
+    assert keys.is_manual('w')
+    actuator.press_manual('w', False)
+    assert not keys.is_manual('w')
+
+
+def test_key_actuator_close_releases_held_keys():
+    actuator = RecordingActuator()
+    keys = KeyActuator(actuator, keys=('w',))
+    keys.press('w')
+    keys.close()
+
+    assert not actuator.is_key_pressed('w')
+    assert actuator.recorded[-1][2] == ('key', 'w', False)
@@ -0,0 +1,69 @@
+"""
+Тесты контроллера курсора на исполнителе-заглушке.
+"""
+
+import sys
+
+import pytest
+
+from utils.actuation import RecordingActuator
+from utils.cursor_control import CursorController
+
+
+@pytest.fixture
+def controller():
+    controller = CursorController(actuator=RecordingActuator(position=(500, 500)))
+    yield controller
+    controller.cleanup()
+
+
+def test_absolute_move_uses_live_cursor_position(controller):
+    controller.cursor_control_enabled = True
+    # Снимок кадра устарел: поток управления уже увел курсор в (500, 500)
+    controller.begin_frame(timestamp=1.0, cursor_position=(100, 100))
+
+    position = controller.move_cursor(600, 650)
+
+    assert controller.actuator.position == (600, 650)
+    assert position == (600, 650)
+    assert controller.frame_cursor_position == (100, 100)
+
+
+def test_velocity_ignores_raw_move_cursor_targets(controller):
+    # Отфильтрованный центр движется на 10 пикс за кадр (100 пикс/с), сырой центр смещен на 30 пикс
+    for frame in range(5):
+        controller.begin_frame(timestamp=1.0 + frame * 0.1, cursor_position=(500, 500))
+        controller.publish_target(600 + frame * 10, 500, box=(0, 0, 10, 10), distance=3.0)
+        controller.move_cursor(630 + frame * 10, 500)
+
+    state = controller.target_state
+    assert state.x == 640
+    assert state.vx == pytest.approx(100.0, rel=0.1)
+    assert state.vy == pytest.approx(0.0)
+
+
+def test_raw_target_keeps_previous_velocity(controller):
+    controller.begin_frame(timestamp=1.0, cursor_position=(500, 500))
+    controller.publish_target(600, 500, box=(0, 0, 10, 10), distance=3.0)
+    controller.begin_frame(timestamp=1.1, cursor_position=(500, 500))
+    controller.publish_target(610, 500)
+    velocity = controller.target_state.vx
+
+    # Кадр без отфильтрованного центра: позиция обновляется, скорость нет
+    controller.begin_frame(timestamp=1.2, cursor_position=(500, 500))
+    controller.move_cursor(700, 500)
+
+    assert controller.target_state.x == 700
+    assert controller.target_state.vx == velocity
+
+
+def test_control_loop_does_not_spin_with_precise_sleep(controller):
+    # Вне Windows (или с таймером 1 мс) такты ждут только через sleep и не держат GIL
+    if controller.timer_period_set or sys.platform != 'win32':
+        assert controller.spin_window == 0.0
+
+    explicit = CursorController(actuator=RecordingActuator(), spin_window=0.001)
+    try:
+        assert explicit.spin_window == 0.001
+    finally:
+        explicit.cleanup()
@@ -0,0 +1,146 @@
+"""
+Тесты покадрового состояния детектора (несколько DetectionState на одном детекторе) и предохранителя устройства.
+Вместо YOLO используется модель-заглушка, поэтому веса не нужны.
+"""
+
+import numpy as np
+import torch
+
+from utils.detector import DetectionState, DeviceCircuitBreaker, YOLOPersonDetector
+from utils.fast_detectors import FastDetector
+
+
+class FakeBoxes:
+    def __init__(self, data):
+        data = torch.tensor(data, dtype=torch.float32).reshape(-1, 6)
+        self.xyxy = data[:, :4]
+        self.conf = data[:, 4]
+        self.cls = data[:, 5]
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.boxes = FakeBoxes(data)
+
+
+class FakeModel:
+    """Модель-заглушка: один человек в рамке (64, 64, 128, 128) пикселей входа модели"""
+
+    names = {0: 'person'}
+
+    def to(self, device):
+        return self
+
+    def __call__(self, inputs, device=None, **options):
+        return [FakeResult([[64.0, 64.0, 128.0, 128.0, 0.9, 0.0]])]
+
+
+class CountingDetector(FastDetector):
+    """Плагин-заглушка: одна рамка, ширина которой равна номеру запуска"""
+
+    def __init__(self):
+        super().__init__('bag', interval=0.0)
+        self.runs = 0
+
+    def detect(self, small_frame, scale):
+        self.runs += 1
+        return [(0, 0, self.runs, 10, 0.9)]
+
+
+def make_detector():
+    return YOLOPersonDetector(model=FakeModel(), device='cpu')
+
+
+def test_results_keep_geometry_of_their_state():
+    detector = make_detector()
+    large_state, small_state = DetectionState(), DetectionState()
+
+    large_results = detector.detect_all_objects(np.zeros((720, 1280, 3), np.uint8), large_state)
+    small_results = detector.detect_all_objects(np.zeros((360, 640, 3), np.uint8), small_state)
+
+    # Кадр 1280 уменьшен до 640, поэтому рамка входа увеличивается вдвое; кадр 640 не масштабируется
+    assert detector.get_all_objects(large_results, large_state)[0]['box'] == (128, 128, 256, 256)
+    assert detector.get_all_objects(small_results, small_state)[0]['box'] == (64, 64, 128, 128)
+    assert detector.get_person_box(state=large_state) == (128, 128, 256, 256)
+
+
+def test_shared_input_is_cached_per_state():
+    detector = make_detector()
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    state = DetectionState()
+
+    first_input, geometry = detector._prepare_shared_input(frame, state)
+    second_input, _ = detector._prepare_shared_input(frame, state)
+    other_input, _ = detector._prepare_shared_input(frame, DetectionState())
+
+    assert second_input is first_input
+    assert other_input is not first_input
+    assert geometry == (2.0, 2.0, 0, 0)
+
+
+def test_set_regions_invalidates_shared_input():
+    detector = make_detector()
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    state = DetectionState()
+
+    first_input, _ = detector._prepare_shared_input(frame, state)
+    detector.set_regions((640, 360, 1280, 720))
+    second_input, geometry = detector._prepare_shared_input(frame, state)
+
+    # Рабочая область вырезается в том же масштабе, смещение переводит рамки в пиксели кадра
+    assert second_input is not first_input
+    assert second_input.shape[2:] == (192, 320)
+    assert geometry == (2.0, 2.0, 640, 360)
+
+
+def test_plugin_objects_are_stored_per_state():
+    detector = make_detector()
+    plugin = CountingDetector()
+    detector.add_plugin(plugin)
+    frame = np.zeros((360, 640, 3), np.uint8)
+    first_state, second_state = DetectionState(), DetectionState()
+
+    assert detector.run_plugins(frame, first_state)
+    assert detector.run_plugins(frame, second_state)
+
+    # Плагин работает на кадре ширины 320, рамки переводятся в пиксели кадра 640
+    assert [obj['box'] for obj in detector.get_extra_objects(first_state)] == [(0, 0, 2, 20)]
+    assert [obj['box'] for obj in detector.get_extra_objects(second_state)] == [(0, 0, 4, 20)]
+
+
+def test_device_breaker_probes_on_shared_clock(simulated_clock):
+    breaker = DeviceCircuitBreaker('cuda:0', failure_threshold=2, base_backoff=1.0)
+    for _ in range(2):
+        breaker.record_failure(breaker.select_device(), RuntimeError('device lost'))
+    assert breaker.select_device() == 'cpu'
+
+    # Повторная проверка основного устройства идет по общим часам
+    simulated_clock.advance(0.5)
+    assert breaker.select_device() == 'cpu'
+    simulated_clock.advance(0.5)
+    assert breaker.select_device() == 'cuda:0'
+
+    breaker.record_failure('cuda:0', RuntimeError('device lost'))
+    simulated_clock.advance(1.5)
+    assert breaker.select_device() == 'cpu'
+    simulated_clock.advance(0.5)
+    assert breaker.select_device() == 'cuda:0'
+
+
+def test_device_breaker_allows_single_probe(simulated_clock):
+    breaker = DeviceCircuitBreaker('cuda:0', failure_threshold=1, base_backoff=1.0)
+    breaker.record_failure(breaker.select_device(), RuntimeError('device lost'))
+    simulated_clock.advance(1.0)
+
+    # Основное устройство получает один конвейер, остальные ждут результата пробы на резервном
+    assert breaker.select_device() == 'cuda:0'
+    assert breaker.select_device() == 'cpu'
+    assert breaker.select_device() == 'cpu'
+
+    breaker.record_success('cuda:0')
+    assert breaker.state == DeviceCircuitBreaker.CLOSED
+    assert breaker.select_device() == 'cuda:0'
+    assert breaker.select_device() == 'cuda:0'
@@ -0,0 +1,232 @@
+"""
+Тесты сервиса инференса и удаленного инференса через loopback.
+Вместо YOLO используются модели-заглушки, поэтому веса не нужны.
+"""
+
+import socket
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+import torch
+
+from utils.inference_service import InferenceClient, InferenceServer, ServiceConnection, ServiceModel
+from utils.remote_inference import RemoteInferenceClient, RemoteInferenceServer
+
+
+class FakeBoxes:
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.boxes = FakeBoxes(data)
+
+
+class FakeModel:
+    """Модель-заглушка: одна рамка на изображение, ширина рамки равна индексу в пакете"""
+
+    names = {0: 'person', 1: 'bicycle'}
+
+    def __init__(self):
+        self.calls = []
+
+    def to(self, device):
+        return self
+
+    def __call__(self, inputs, device=None, verbose=False, **options):
+        size = inputs.shape[0] if isinstance(inputs, torch.Tensor) else len(inputs)
+        self.calls.append((size, options))
+        return [FakeResult(torch.tensor([[0.0, 0.0, float(index + 1), 10.0, 0.9, 0.0]]))
+                for index in range(size)]
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Condition not reached")
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def service():
+    model = FakeModel()
+    server = InferenceServer(model, port=0, device='cpu', batch_window=0.05, max_batch=8)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    wait_for(lambda: server.running)
+    yield server, server.server_socket.getsockname()[1]
+    server.shutdown()
+    thread.join(timeout=2.0)
+
+
+@pytest.mark.parametrize('use_shared_memory', [False, True])
+def test_image_round_trip(service, use_shared_memory):
+    server, port = service
+    client = InferenceClient(port=port, use_shared_memory=use_shared_memory)
+    try:
+        assert client.names == FakeModel.names
+        detections = client.predict([np.zeros((32, 32, 3), np.uint8), np.zeros((32, 32, 3), np.uint8)],
+                                    conf=0.4, classes=0)
+    finally:
+        client.close()
+
+    assert len(detections) == 2
+    np.testing.assert_allclose(detections[1], [[0.0, 0.0, 2.0, 10.0, 0.9, 0.0]], rtol=1e-6)
+    assert server.model.calls[-1] == (2, {'conf': 0.4, 'classes': [0]})
+
+
+def test_tensor_round_trip_through_service_model(service):
+    _, port = service
+    client = InferenceClient(port=port, use_shared_memory=False)
+    try:
+        results = ServiceModel(client)(torch.zeros((1, 3, 64, 96)), conf=0.5)
+    finally:
+        client.close()
+
+    assert len(results) == 1
+    assert results[0].orig_shape == (64, 96)
+    np.testing.assert_allclose(results[0].boxes.xyxy.numpy(), [[0.0, 0.0, 1.0, 10.0]])
+
+
+def test_concurrent_requests_are_batched(service):
+    server, port = service
+    clients = [InferenceClient(port=port, use_shared_memory=False) for _ in range(3)]
+    barrier = threading.Barrier(len(clients))
+    outputs = [None] * len(clients)
+
+    def request(index):
+        barrier.wait()
+        outputs[index] = clients[index].predict(np.zeros((16, 16, 3), np.uint8))
+
+    threads = [threading.Thread(target=request, args=(index,)) for index in range(len(clients))]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5.0)
+    finally:
+        for client in clients:
+            client.close()
+
+    # Каждый клиент получил ответ на свое изображение, а сервис выполнил меньше вызовов, чем запросов
+    assert all(output is not None and len(output) == 1 for output in outputs)
+    assert sum(size for size, _ in server.model.calls) == 3
+    assert len(server.model.calls) < 3
+
+
+class FakeDetector:
+    """Детектор-заглушка для RemoteInferenceServer: одна рамка по размеру кадра"""
+
+    def __init__(self):
+        self.frames = []
+
+    def detect_all_objects(self, frame):
+        self.frames.append(frame.shape)
+        return frame.shape
+
+    def get_all_objects(self, results):
+        height, width = results[:2]
+        return [{'box': (1, 2, width - 1, height - 2), 'confidence': 0.75, 'class_id': 0}]
+
+
+@pytest.fixture
+def remote_server():
+    server = RemoteInferenceServer(FakeDetector(), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    wait_for(lambda: server.running)
+    yield server, server.server_socket.getsockname()[1]
+    server.shutdown()
+    thread.join(timeout=2.0)
+
+
+@pytest.mark.parametrize('encoding', ['jpeg', 'png'])
+def test_remote_round_trip(remote_server, encoding):
+    server, port = remote_server
+    client = RemoteInferenceClient('127.0.0.1', port, encoding=encoding, latency_budget=1.0)
+    try:
+        assert client.can_submit()
+        assert client.submit(np.zeros((48, 64, 3), np.uint8), context='frame-1')
+        wait_for(lambda: client.latest is not None)
+        detections, context = client.poll()
+    finally:
+        client.close()
+
+    assert context == 'frame-1'
+    np.testing.assert_allclose(detections, [[1, 2, 63, 46, 0.75, 0]])
+    assert server.detector.frames[-1] == (48, 64, 3)
+    assert client.last_latency is not None
+    assert client.poll() is None
+
+
+def test_remote_client_pipelines_requests(remote_server):
+    _, port = remote_server
+    client = RemoteInferenceClient('127.0.0.1', port, max_in_flight=2, latency_budget=1.0)
+    try:
+        frame = np.zeros((16, 16, 3), np.uint8)
+        with client.lock:
+            # Пока ответы не приняты, в работе не больше max_in_flight запросов
+            client.pending = {100: (time.perf_counter(), None), 101: (time.perf_counter(), None)}
+        assert not client.can_submit()
+        with client.lock:
+            client.pending.clear()
+        assert client.submit(frame)
+        wait_for(lambda: client.latency is not None)
+        assert client.healthy
+    finally:
+        client.close()
+
+
+def test_remote_client_ignores_system_clock_steps(remote_server, monkeypatch):
+    _, port = remote_server
+    client = RemoteInferenceClient('127.0.0.1', port, max_in_flight=2, timeout=5.0, latency_budget=1.0)
+    try:
+        with client.lock:
+            client.pending = {100: (time.perf_counter(), 'in flight')}
+        # Системные часы переведены на сутки вперед: запросы в работе не истекают, задержка не меняется
+        wall_clock = time.time() + 86400.0
+        monkeypatch.setattr(time, 'time', lambda: wall_clock)
+        assert client.can_submit()
+        assert 100 in client.pending
+        assert client.latency is None
+    finally:
+        client.close()
+
+
+def test_remote_client_without_server_is_unhealthy():
+    client = RemoteInferenceClient('127.0.0.1', 1, timeout=0.2)
+
+    assert not client.connected
+    assert not client.healthy
+    assert client.get_state() == "disconnected"
+
+
+def test_connection_keeps_only_latest_shared_block():
+    sock, other = socket.socketpair()
+    connection = ServiceConnection(sock, 'test')
+    # Клиент заменяет блок большим при увеличении кадра
+    blocks = [shared_memory.SharedMemory(create=True, size=size) for size in (64, 256)]
+    try:
+        blocks[0].buf[:4] = b'old!'
+        blocks[1].buf[:4] = b'new!'
+        assert bytes(connection.shared_buffer(blocks[0].name)[:4]) == b'old!'
+        previous = connection.shared_blocks[blocks[0].name]
+        assert bytes(connection.shared_buffer(blocks[1].name)[:4]) == b'new!'
+
+        # Подключение к прежнему блоку закрыто, иначе каждая смена размера удерживала бы кадр
+        assert list(connection.shared_blocks) == [blocks[1].name]
+        assert previous.buf is None
+    finally:
+        connection.close()
+        other.close()
+        for block in blocks:
+            block.close()
+            block.unlink()
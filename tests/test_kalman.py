@@ -0,0 +1,134 @@
+"""
+Тесты банка фильтров Калмана и его работы в конвейере.
+"""
+
+import numpy as np
+import pytest
+import torch
+
+from utils.actuation import RecordingActuator
+from utils.cursor_control import CursorController
+from utils.detector import YOLOPersonDetector
+from utils.kalman import KalmanFilterBank
+from utils.pipeline import Pipeline
+
+DT = 0.125  # Двоичное число: моделируемое время не накапливает ошибку округления
+
+
+def moving_box(step, speed_x=100.0, speed_y=-50.0):
+    """Рамка 40x80, центр которой движется с постоянной скоростью (пикс/с)"""
+    x = 200 + speed_x * DT * step
+    y = 300 + speed_y * DT * step
+    return (x, y, x + 40, y + 80)
+
+
+def test_velocity_converges_for_constant_motion():
+    bank = KalmanFilterBank()
+    track_id = bank.add(moving_box(0))
+    for step in range(1, 30):
+        bank.predict(DT)
+        bank.update([track_id], [moving_box(step)])
+
+    vx, vy, vw, vh = bank.velocities([track_id])[0]
+    assert vx == pytest.approx(100.0, abs=5.0)
+    assert vy == pytest.approx(-50.0, abs=5.0)
+    assert vw == pytest.approx(0.0, abs=1.0)
+    assert bank.boxes([track_id])[0] == pytest.approx(moving_box(29), abs=2.0)
+
+
+def test_predict_extrapolates_all_rows():
+    bank = KalmanFilterBank()
+    ids = [bank.add(moving_box(0)), bank.add((600, 100, 640, 180))]
+    bank.velocity[:2, 0] = [100.0, -20.0]
+
+    bank.predict(0.5)
+
+    boxes = bank.boxes(ids)
+    assert boxes.tolist() == [[250, 300, 290, 380], [590, 100, 630, 180]]
+
+
+def test_track_matches_creates_and_drops_tracks():
+    bank = KalmanFilterBank(capacity=1)
+    first = bank.track([moving_box(0), (800, 500, 840, 580)], DT)
+    assert len(bank) == 2
+
+    # Рамки в другом порядке сопоставляются с теми же треками, новая рамка получает новый трек
+    second = bank.track([(802, 500, 842, 580), moving_box(1), (50, 50, 60, 60)], DT)
+    assert second[:2] == [first[1], first[0]]
+    assert second[2] not in first
+
+    # predict() пропуском не считается: между проходами детектора треки только продвигаются
+    for _ in range(10):
+        bank.predict(0.0)
+    assert bank.misses[:len(bank)].tolist() == [0, 0, 0]
+
+    # Трек удаляется после max_misses шагов track() без измерения
+    for _ in range(3):
+        bank.track([moving_box(1)], 0.0, max_misses=2)
+    assert list(bank.rows) == [first[0]]
+
+
+def test_remove_keeps_other_rows():
+    bank = KalmanFilterBank()
+    ids = [bank.add((index * 100, 0, index * 100 + 10, 10)) for index in range(4)]
+
+    bank.remove(ids[1])
+
+    assert len(bank) == 3
+    assert ids[1] not in bank
+    assert bank.boxes([ids[3], ids[0]]).tolist() == [[300, 0, 310, 10], [0, 0, 10, 10]]
+
+
+class FakeBoxes:
+    def __init__(self, data):
+        data = torch.tensor(data, dtype=torch.float32).reshape(-1, 6)
+        self.xyxy = data[:, :4]
+        self.conf = data[:, 4]
+        self.cls = data[:, 5]
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.boxes = FakeBoxes(data)
+
+
+class MovingPersonModel:
+    """Модель-заглушка: человек, движущийся на moving_box() с каждым запуском"""
+
+    names = {0: 'person'}
+
+    def __init__(self):
+        self.step = 0
+
+    def to(self, device):
+        return self
+
+    def __call__(self, inputs, device=None, **options):
+        box = moving_box(self.step)
+        self.step += 1
+        return [FakeResult([[*box, 0.9, 0.0]])]
+
+
+def test_pipeline_feeds_filtered_velocity_to_controller(simulated_clock):
+    detector = YOLOPersonDetector(model=MovingPersonModel(), device='cpu')
+    controller = CursorController(actuator=RecordingActuator(screen_width=640, screen_height=640))
+    pipeline = Pipeline(detector, cursor_controller=controller)
+    pipeline.detection_state.region_cascade = False
+    pipeline.detection_state.motion_compensation = False
+    frame = np.zeros((640, 640, 3), np.uint8)
+    try:
+        for _ in range(20):
+            simulated_clock.advance(DT)
+            pipeline.process(frame)
+
+        target = next(obj for obj in pipeline.last_result[5] if obj.get('is_target'))
+        assert target['velocity'] == pytest.approx((100.0, -50.0), abs=5.0)
+        state = controller.target_state
+        assert (state.vx, state.vy) == pytest.approx((100.0, -50.0), abs=5.0)
+        assert state.box == pipeline.filtered_target(pipeline.last_result[5], target['box'])[0]
+    finally:
+        pipeline.cleanup()
+        controller.cleanup()
@@ -0,0 +1,128 @@
+"""
+Тесты оценки движения камеры и поиска изменившихся областей на синтетических кадрах.
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from utils.motion import (GlobalMotionEstimator, MotionProposer, box_in_regions, box_iou, merge_regions,
+                          shift_box)
+
+WIDTH, HEIGHT = 640, 360
+
+
+@pytest.fixture(scope='module')
+def scene():
+    """Текстурированная сцена с запасом по краям для сдвигов"""
+    rng = np.random.default_rng(7)
+    noise = rng.integers(0, 256, size=(HEIGHT + 200, WIDTH + 200, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(noise, (9, 9), 0)
+
+
+def view(scene, dx=0, dy=0):
+    """Кадр камеры, содержимое которого сдвинуто на (dx, dy) пикселей"""
+    return np.ascontiguousarray(scene[100 - dy:100 - dy + HEIGHT, 100 - dx:100 - dx + WIDTH])
+
+
+@pytest.mark.parametrize('dx, dy', [(0, 0), (24, 0), (-16, 12), (40, -28)])
+def test_global_shift_is_recovered(scene, dx, dy):
+    estimator = GlobalMotionEstimator()
+    estimator.set_reference(view(scene))
+
+    shift_x, shift_y = estimator.estimate(view(scene, dx, dy))
+
+    # Точность ограничена масштабом уменьшенного кадра (640 / 160 = 4 пикселя)
+    assert shift_x == pytest.approx(dx, abs=2.0)
+    assert shift_y == pytest.approx(dy, abs=2.0)
+
+
+def test_unrelated_frame_keeps_last_estimate(scene):
+    estimator = GlobalMotionEstimator()
+    estimator.set_reference(view(scene))
+    estimator.estimate(view(scene, 20, 0))
+
+    # Другая сцена дает слабый отклик - остается прежняя оценка
+    other = np.ascontiguousarray(np.flipud(view(scene)))
+    shift = estimator.estimate(other)
+
+    assert shift == pytest.approx((20, 0), abs=2.0)
+
+
+def test_estimate_without_reference_is_zero(scene):
+    assert GlobalMotionEstimator().estimate(view(scene)) == (0.0, 0.0)
+
+
+def test_excluded_static_overlay_does_not_pin_the_shift(scene):
+    estimator = GlobalMotionEstimator()
+    overlay = (0, 0, 320, 180)
+    estimator.exclusion_masks = [overlay]
+    reference = view(scene)
+    shifted = view(scene, 32, 0)
+    # Неподвижная панель оверлея поверх обоих кадров
+    for frame in (reference, shifted):
+        frame[0:180, 0:320] = 200
+        frame[40:140, 40:280] = 30
+    estimator.set_reference(reference)
+
+    shift_x, shift_y = estimator.estimate(shifted)
+
+    assert shift_x == pytest.approx(32, abs=2.0)
+    assert shift_y == pytest.approx(0, abs=2.0)
+
+
+def test_proposer_without_changes_returns_empty(scene):
+    proposer = MotionProposer()
+    proposer.set_reference(view(scene))
+
+    assert proposer.propose(view(scene).copy()) == []
+
+
+def test_proposer_finds_changed_region(scene):
+    proposer = MotionProposer()
+    proposer.set_reference(view(scene))
+    frame = view(scene).copy()
+    cv2.rectangle(frame, (400, 200), (440, 260), (255, 255, 255), -1)
+
+    regions = proposer.propose(frame)
+
+    assert len(regions) == 1
+    assert box_in_regions((400, 200, 440, 260), regions)
+    x1, y1, x2, y2 = regions[0]
+    assert x2 - x1 >= proposer.min_region_size and y2 - y1 >= proposer.min_region_size
+
+
+def test_proposer_ignores_changes_under_masks(scene):
+    proposer = MotionProposer()
+    proposer.exclusion_masks = [(380, 180, 460, 280)]
+    proposer.set_reference(view(scene))
+    frame = view(scene).copy()
+    cv2.rectangle(frame, (400, 200), (440, 260), (255, 255, 255), -1)
+
+    assert proposer.propose(frame) == []
+
+
+def test_proposer_asks_for_full_pass_on_camera_pan(scene):
+    proposer = MotionProposer()
+    proposer.set_reference(view(scene))
+
+    # Панорамирование меняет почти весь кадр - областей слишком много
+    assert proposer.propose(view(scene, 30, 0)) is None
+
+
+def test_proposer_without_reference_asks_for_full_pass(scene):
+    assert MotionProposer().propose(view(scene)) is None
+
+
+def test_merge_regions_joins_overlaps():
+    merged = merge_regions([(0, 0, 10, 10), (5, 5, 20, 20), (30, 30, 40, 40)])
+
+    assert sorted(merged) == [(0, 0, 20, 20), (30, 30, 40, 40)]
+
+
+def test_box_helpers():
+    assert box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert box_iou((0, 0, 10, 10), (5, 0, 15, 10)) == pytest.approx(50 / 150)
+    assert box_iou((0, 0, 10, 10), (20, 20, 30, 30)) == 0.0
+    assert shift_box((10, 10, 50, 50), 5.4, -20, 100, 100) == (15, 0, 55, 30)
+    assert shift_box((80, 80, 99, 99), 30, 30, 100, 100) == (99, 99, 100, 100)
@@ -0,0 +1,87 @@
+"""
+Тесты кадрирования сообщений сервиса инференса.
+"""
+
+import socket
+import struct
+
+import numpy as np
+import pytest
+
+from utils.protocol import (MAX_HEADER_SIZE, PREFIX, array_from_buffer, array_header, recv_message,
+                            send_message)
+
+
+@pytest.fixture
+def sockets():
+    left, right = socket.socketpair()
+    yield left, right
+    left.close()
+    right.close()
+
+
+def test_header_only_message(sockets):
+    left, right = sockets
+    send_message(left, {'type': 'hello', 'id': 7})
+
+    header, payload = recv_message(right)
+
+    assert header == {'type': 'hello', 'id': 7}
+    assert payload == bytearray()
+
+
+def test_array_payload_round_trip(sockets):
+    left, right = sockets
+    detections = np.arange(18, dtype=np.float32).reshape(3, 6)
+    send_message(left, dict(array_header(detections), type='result'), detections)
+
+    header, payload = recv_message(right)
+    received = array_from_buffer(header, payload)
+
+    assert header['shape'] == [3, 6]
+    np.testing.assert_array_equal(received, detections)
+
+
+def test_several_arrays_in_one_payload(sockets):
+    left, right = sockets
+    arrays = [np.full((2, 6), 1.5, dtype=np.float32), np.zeros((0, 6), dtype=np.float32),
+              np.arange(12, dtype=np.uint8).reshape(2, 2, 3)]
+    descriptions, offset = [], 0
+    for array in arrays:
+        descriptions.append(dict(array_header(array), offset=offset))
+        offset += array.nbytes
+    send_message(left, {'arrays': descriptions}, b''.join(array.tobytes() for array in arrays))
+
+    header, payload = recv_message(right)
+
+    for description, array in zip(header['arrays'], arrays):
+        np.testing.assert_array_equal(array_from_buffer(description, payload, description['offset']), array)
+
+
+def test_back_to_back_messages_stay_framed(sockets):
+    left, right = sockets
+    for index in range(5):
+        send_message(left, {'id': index}, bytes([index]) * index)
+
+    for index in range(5):
+        header, payload = recv_message(right)
+        assert header == {'id': index}
+        assert payload == bytes([index]) * index
+
+
+def test_oversized_header_is_rejected(sockets):
+    left, right = sockets
+    left.sendall(PREFIX.pack(MAX_HEADER_SIZE + 1, 0))
+
+    with pytest.raises(ConnectionError):
+        recv_message(right)
+
+
+def test_closed_connection_raises(sockets):
+    left, right = sockets
+    # Обрыв посреди сообщения
+    left.sendall(struct.pack('!II', 10, 0) + b'{"a"')
+    left.close()
+
+    with pytest.raises(ConnectionError):
+        recv_message(right)
@@ -0,0 +1,170 @@
+"""
+Тесты планировщика по срокам на моделируемых часах.
+"""
+
+import pytest
+
+from utils import timing
+from utils.scheduler import DeadlineScheduler
+
+
+def run_for(scheduler, duration):
+    """Выполняет задачи планировщика в течение duration секунд моделируемого времени"""
+    end_time = timing.now() + duration
+    while True:
+        deadline = scheduler.next_deadline()
+        if deadline is None or deadline > end_time:
+            break
+        timing.wait_until(deadline)
+        scheduler.run_pending()
+
+
+def test_tasks_run_at_their_rates(simulated_clock):
+    scheduler = DeadlineScheduler()
+    runs = {'fast': 0, 'slow': 0}
+    # Периоды точно представимы в двоичном виде, поэтому сроки не накапливают ошибку округления
+    scheduler.add('fast', 1.0 / 64, lambda: runs.__setitem__('fast', runs['fast'] + 1))
+    scheduler.add('slow', 1.0 / 8, lambda: runs.__setitem__('slow', runs['slow'] + 1))
+
+    run_for(scheduler, 1.0)
+
+    assert runs == {'fast': 65, 'slow': 9}
+    stats = scheduler.stats()
+    assert stats['fast']['rate'] == pytest.approx(64.0)
+    assert stats['fast']['jitter_ms'] == pytest.approx(0.0, abs=1e-6)
+    assert stats['slow']['overruns'] == 0
+
+
+def test_delay_postpones_first_run(simulated_clock):
+    scheduler = DeadlineScheduler()
+    started = []
+    scheduler.add('stats', 1.0, lambda: started.append(timing.now()), delay=1.0)
+
+    run_for(scheduler, 2.5)
+
+    assert started == pytest.approx([101.0, 102.0])
+
+
+def test_overrun_skips_missed_deadlines(simulated_clock):
+    scheduler = DeadlineScheduler()
+    # Задача выполняется 0.25 с при периоде 0.1 с
+    task = scheduler.add('frame', 0.1, lambda: simulated_clock.advance(0.25))
+
+    scheduler.run_pending()
+
+    # Пропущенные сроки 100.1 и 100.2 не догоняются: следующий срок - ближайший по сетке после окончания
+    assert task.runs == 1
+    assert task.overruns == 1
+    assert task.next_deadline == pytest.approx(100.3)
+    assert task.next_deadline > timing.now()
+
+
+def test_overrun_keeps_deadline_grid(simulated_clock):
+    scheduler = DeadlineScheduler()
+    durations = iter([0.0, 0.35, 0.0, 0.0])
+    task = scheduler.add('frame', 0.1, lambda: simulated_clock.advance(next(durations, 0.0)))
+
+    run_for(scheduler, 0.45)
+
+    # Запуски: 100.0, 100.1 (длится до 100.45), затем сроки 100.5 и далее по той же сетке
+    assert task.runs == 2
+    assert task.overruns == 1
+    assert task.next_deadline == pytest.approx(100.5)
+
+
+def test_late_start_is_recorded_as_lateness(simulated_clock):
+    scheduler = DeadlineScheduler()
+    task = scheduler.add('frame', 0.1, lambda: None)
+    simulated_clock.advance(0.03)
+
+    scheduler.run_pending()
+
+    assert task.stats()['lateness_ms'] == pytest.approx(30.0)
+    assert task.overruns == 0
+
+
+def test_due_tasks_run_in_deadline_order(simulated_clock):
+    scheduler = DeadlineScheduler()
+    order = []
+    scheduler.add('later', 1.0, lambda: order.append('later'), delay=0.02)
+    scheduler.add('earlier', 1.0, lambda: order.append('earlier'), delay=0.01)
+    simulated_clock.advance(0.05)
+
+    assert scheduler.run_pending() == 2
+    assert order == ['earlier', 'later']
+
+
+def test_run_until_stop(simulated_clock):
+    scheduler = DeadlineScheduler()
+    frames = []
+
+    def process_frame():
+        frames.append(timing.now())
+        if len(frames) == 5:
+            scheduler.stop()
+
+    scheduler.add('frame', 1.0 / 60.0, process_frame)
+    scheduler.run()
+
+    assert len(frames) == 5
+    assert frames[-1] - frames[0] == pytest.approx(4.0 / 60.0)
+
+
+def test_failing_task_does_not_stop_the_loop(simulated_clock, capsys):
+    scheduler = DeadlineScheduler()
+    calls = []
+
+    def broken():
+        calls.append(timing.now())
+        raise ValueError("boom")
+
+    task = scheduler.add('broken', 0.1, broken)
+    run_for(scheduler, 0.25)
+
+    assert len(calls) == 3
+    assert task.runs == 3
+    assert "Error in scheduled task 'broken': boom" in capsys.readouterr().out
+
+
+def test_remove_task(simulated_clock):
+    scheduler = DeadlineScheduler()
+    scheduler.add('frame', 0.1, lambda: None)
+    scheduler.remove('frame')
+
+    assert scheduler.next_deadline() is None
+
+
+
+class CountingClock(timing.Clock):
+    """Монотонные часы, считающие опросы времени (активное ожидание опрашивает их тысячи раз)"""
+
+    def __init__(self):
+        super().__init__()
+        self.polls = 0
+
+    def now(self):
+        self.polls += 1
+        return super().now()
+
+
+@pytest.mark.parametrize('spin_window, spins', [(None, False), (0.002, True)])
+def test_scheduler_spins_only_with_a_window(spin_window, spins):
+    clock = CountingClock()
+    previous = timing.set_clock(clock)
+    try:
+        scheduler = DeadlineScheduler() if spin_window is None else DeadlineScheduler(spin_window)
+        runs = []
+
+        def process_frame():
+            runs.append(timing.now())
+            if len(runs) == 3:
+                scheduler.stop()
+
+        scheduler.add('frame', 0.01, process_frame, delay=0.01)
+        scheduler.run()
+    finally:
+        timing.set_clock(previous)
+
+    assert len(runs) == 3
+    # По умолчанию окна нет: ожидание срока - один sleep и несколько опросов часов
+    assert (clock.polls > 100) == spins
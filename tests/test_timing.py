@@ -0,0 +1,52 @@
+"""
+Тесты общих часов и точного ожидания.
+"""
+
+import pytest
+
+from utils import timing
+
+
+def test_simulated_wait_jumps_to_deadline(simulated_clock):
+    assert timing.wait_until(105.0) == 0.0
+    assert timing.now() == 105.0
+    # Срок в прошлом не переводит часы назад
+    timing.wait_until(101.0)
+    assert timing.now() == 105.0
+
+
+def test_simulated_sleep_and_advance(simulated_clock):
+    timing.sleep(0.5)
+    simulated_clock.advance(0.25)
+    simulated_clock.advance(-1.0)  # Время не идет назад
+
+    assert timing.now() == pytest.approx(100.75)
+    assert simulated_clock.wake_stats() == {'mean_ms': 0.0, 'max_ms': 0.0, 'count': 1}
+
+
+def test_set_clock_returns_previous():
+    clock = timing.SimulatedClock()
+    previous = timing.set_clock(clock)
+    try:
+        assert timing.get_clock() is clock
+    finally:
+        assert timing.set_clock(previous) is clock
+    assert timing.get_clock() is previous
+
+
+def test_set_clock_none_restores_real_clock():
+    previous = timing.set_clock(None)
+    try:
+        assert type(timing.get_clock()) is timing.Clock
+    finally:
+        timing.set_clock(previous)
+
+
+def test_real_wait_does_not_wake_early():
+    clock = timing.Clock(spin_window=0.001)
+    deadline = clock.now() + 0.005
+    error = clock.wait_until(deadline)
+
+    assert clock.now() >= deadline
+    assert error >= 0.0
+    assert clock.wake_stats()['count'] == 1
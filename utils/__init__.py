@@ -3,4 +3,4 @@ Utils package for screen detection and object tracking.
 """
 
 from utils.performance import PerformanceCounter, PerformanceMonitor
-from utils.capture import ScreenCapture, capture_screen 
\ No newline at end of file
+from utils.capture import ScreenCapture, VideoReplay, capture_screen 
\ No newline at end of file
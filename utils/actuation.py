@@ -0,0 +1,410 @@
+"""
+Модуль исполнения ввода (мышь и клавиатура).
+Контроллер курсора ставит события в очередь исполнителя, а flush() отправляет
+все события такта одной пакетной операцией.
+
+Win32Actuator отправляет события через SendInput, RecordingActuator только
+запоминает их с временными метками (тесты и замеры без Windows).
+
+KeyActuator нажимает и отпускает клавиши в отдельном потоке, поэтому поток
+кадров только ставит намерения в очередь и никогда не ждет ввода.
+"""
+
+import ctypes
+import queue
+import threading
+import time
+from collections import deque
+
+try:
+    import win32api
+    import win32con
+    import keyboard
+except ImportError:
+    # Без pywin32 доступен только RecordingActuator (Linux, тесты, замеры)
+    win32api = None
+    win32con = None
+    keyboard = None
+
+
+class Actuator:
+    """
+    Базовый исполнитель ввода с очередью событий.
+
+    События: ('move', dx, dy) - относительное движение мыши,
+    ('set_position', x, y) - установка позиции курсора,
+    ('button', name, pressed) - кнопка мыши, ('key', name, pressed) - клавиша.
+    Подряд идущие относительные движения объединяются в одно.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.lock = threading.Lock()
+        # Отправка идет из потока управления и потока клавиш
+        self.submit_lock = threading.Lock()
+        self.batches = 0
+        self.events = 0
+
+    # --- Постановка событий в очередь ---
+
+    def move_relative(self, dx, dy):
+        """Относительное движение мыши"""
+        with self.lock:
+            if self.pending and self.pending[-1][0] == 'move':
+                _, last_dx, last_dy = self.pending[-1]
+                self.pending[-1] = ('move', last_dx + dx, last_dy + dy)
+            else:
+                self.pending.append(('move', dx, dy))
+
+    def set_position(self, x, y):
+        """Установка позиции курсора (последняя установка в такте отменяет предыдущие)"""
+        with self.lock:
+            if self.pending and self.pending[-1][0] == 'set_position':
+                self.pending[-1] = ('set_position', x, y)
+            else:
+                self.pending.append(('set_position', x, y))
+
+    def click(self, button='left'):
+        """Нажатие и отпускание кнопки мыши"""
+        with self.lock:
+            self.pending.append(('button', button, True))
+            self.pending.append(('button', button, False))
+
+    def key_down(self, key):
+        with self.lock:
+            self.pending.append(('key', key, True))
+
+    def key_up(self, key):
+        with self.lock:
+            self.pending.append(('key', key, False))
+
+    def flush(self):
+        """
+        Отправляет накопленные события одной пакетной операцией.
+
+        Returns:
+            int: Число отправленных событий
+        """
+        with self.lock:
+            events, self.pending = self.pending, []
+        return self.send(events)
+
+    def send(self, events):
+        """
+        Отправляет события сразу, минуя очередь такта.
+
+        Returns:
+            int: Число отправленных событий
+        """
+        if not events:
+            return 0
+        with self.submit_lock:
+            self._submit(events)
+            self.batches += 1
+            self.events += len(events)
+        return len(events)
+
+    # --- Реализация в наследниках ---
+
+    def _submit(self, events):
+        raise NotImplementedError
+
+    def cursor_position(self):
+        """Текущая позиция курсора (x, y)"""
+        raise NotImplementedError
+
+    def screen_size(self):
+        """Размер виртуального экрана (ширина, высота)"""
+        raise NotImplementedError
+
+    def is_key_pressed(self, key):
+        """Нажата ли клавиша"""
+        raise NotImplementedError
+
+    def watch_key(self, key, callback):
+        """Подписывает callback(key, pressed) на нажатия и отпускания клавиши (включая собственные)"""
+        raise NotImplementedError
+
+
+# Структуры SendInput
+class _MOUSEINPUT(ctypes.Structure):
+    _fields_ = [('dx', ctypes.c_long), ('dy', ctypes.c_long), ('mouseData', ctypes.c_ulong),
+                ('dwFlags', ctypes.c_ulong), ('time', ctypes.c_ulong), ('dwExtraInfo', ctypes.c_size_t)]
+
+
+class _KEYBDINPUT(ctypes.Structure):
+    _fields_ = [('wVk', ctypes.c_ushort), ('wScan', ctypes.c_ushort), ('dwFlags', ctypes.c_ulong),
+                ('time', ctypes.c_ulong), ('dwExtraInfo', ctypes.c_size_t)]
+
+
+class _HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [('uMsg', ctypes.c_ulong), ('wParamL', ctypes.c_ushort), ('wParamH', ctypes.c_ushort)]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [('mi', _MOUSEINPUT), ('ki', _KEYBDINPUT), ('hi', _HARDWAREINPUT)]
+
+
+class _INPUT(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_ulong), ('union', _INPUTUNION)]
+
+
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+MOUSEEVENTF_MOVE = 0x0001
+MOUSE_BUTTON_FLAGS = {
+    'left': (0x0002, 0x0004),
+    'right': (0x0008, 0x0010),
+    'middle': (0x0020, 0x0040),
+}
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_SCANCODE = 0x0008
+
+
+class Win32Actuator(Actuator):
+    """
+    Исполнитель ввода Windows.
+
+    Движения, кнопки и клавиши такта отправляются одним вызовом SendInput.
+    Установка позиции выполняется через SetCursorPos, чтобы возврат курсора
+    в центр не создавал событие движения для игры.
+    """
+
+    def __init__(self):
+        super().__init__()
+        if win32api is None:
+            raise RuntimeError("Win32Actuator requires pywin32 and keyboard")
+        self.user32 = ctypes.windll.user32
+        self.scan_codes = {}
+
+    def _scan_code(self, key):
+        """Скан-код клавиши (игры с DirectInput читают скан-коды, а не виртуальные коды)"""
+        scan_code = self.scan_codes.get(key)
+        if scan_code is None:
+            scan_code = keyboard.key_to_scan_codes(key)[0]
+            self.scan_codes[key] = scan_code
+        return scan_code
+
+    def _submit(self, events):
+        inputs = []
+        for event in events:
+            kind = event[0]
+            if kind == 'set_position':
+                # SetCursorPos не входит в SendInput: сначала отправляем накопленное
+                self._send(inputs)
+                inputs = []
+                win32api.SetCursorPos((int(event[1]), int(event[2])))
+            elif kind == 'move':
+                item = _INPUT(type=INPUT_MOUSE)
+                item.union.mi = _MOUSEINPUT(int(event[1]), int(event[2]), 0, MOUSEEVENTF_MOVE, 0, 0)
+                inputs.append(item)
+            elif kind == 'button':
+                down_flag, up_flag = MOUSE_BUTTON_FLAGS[event[1]]
+                item = _INPUT(type=INPUT_MOUSE)
+                item.union.mi = _MOUSEINPUT(0, 0, 0, down_flag if event[2] else up_flag, 0, 0)
+                inputs.append(item)
+            elif kind == 'key':
+                flags = KEYEVENTF_SCANCODE | (0 if event[2] else KEYEVENTF_KEYUP)
+                item = _INPUT(type=INPUT_KEYBOARD)
+                item.union.ki = _KEYBDINPUT(0, self._scan_code(event[1]), flags, 0, 0)
+                inputs.append(item)
+        self._send(inputs)
+
+    def _send(self, inputs):
+        if not inputs:
+            return
+        array = (_INPUT * len(inputs))(*inputs)
+        self.user32.SendInput(len(inputs), array, ctypes.sizeof(_INPUT))
+
+    def cursor_position(self):
+        return win32api.GetCursorPos()
+
+    def screen_size(self):
+        return (win32api.GetSystemMetrics(win32con.SM_CXVIRTUALSCREEN),
+                win32api.GetSystemMetrics(win32con.SM_CYVIRTUALSCREEN))
+
+    def is_key_pressed(self, key):
+        return keyboard.is_pressed(key)
+
+    def watch_key(self, key, callback):
+        # Хук клавиатуры видит и события SendInput, их отделяет KeyActuator
+        keyboard.hook_key(key, lambda event: callback(key, event.event_type == keyboard.KEY_DOWN))
+
+
+class RecordingActuator(Actuator):
+    """
+    Исполнитель-заглушка: моделирует курсор и клавиши и запоминает события.
+
+    Каждое событие сохраняется с временной меткой отправки пакета, что
+    позволяет проверять логику управления и измерять частоту ввода без Windows.
+    """
+
+    def __init__(self, screen_width=1920, screen_height=1080, position=None):
+        """
+        Args:
+            screen_width, screen_height: Размер моделируемого экрана
+            position: Начальная позиция курсора (None - центр экрана)
+        """
+        super().__init__()
+        self.width = screen_width
+        self.height = screen_height
+        self.position = position or (screen_width // 2, screen_height // 2)
+        self.pressed_keys = set()
+        self.key_watchers = {}
+        # Записанные события: (время, номер пакета, событие)
+        self.recorded = []
+
+    def _submit(self, events):
+        timestamp = time.perf_counter()
+        x, y = self.position
+        for event in events:
+            kind = event[0]
+            if kind == 'move':
+                x, y = x + event[1], y + event[2]
+            elif kind == 'set_position':
+                x, y = event[1], event[2]
+            elif kind == 'key':
+                self._key_event(event[1], event[2])
+            self.recorded.append((timestamp, self.batches, event))
+        self.position = (int(max(0, min(x, self.width - 1))), int(max(0, min(y, self.height - 1))))
+
+    def _key_event(self, key, pressed):
+        if pressed:
+            self.pressed_keys.add(key)
+        else:
+            self.pressed_keys.discard(key)
+        # Как и хук Windows, подписчики видят и собственные события
+        for callback in self.key_watchers.get(key, []):
+            callback(key, pressed)
+
+    def press_manual(self, key, pressed):
+        """Моделирует нажатие или отпускание клавиши пользователем"""
+        self._key_event(key, pressed)
+
+    def cursor_position(self):
+        return self.position
+
+    def screen_size(self):
+        return (self.width, self.height)
+
+    def is_key_pressed(self, key):
+        return key in self.pressed_keys
+
+    def watch_key(self, key, callback):
+        self.key_watchers.setdefault(key, []).append(callback)
+
+    def event_rate(self, kind=None):
+        """
+        Частота записанных событий.
+
+        Args:
+            kind: Тип события ('move', 'set_position', 'button', 'key'; None - все)
+
+        Returns:
+            float: Событий в секунду между первым и последним событием
+        """
+        times = [timestamp for timestamp, _, event in self.recorded if kind is None or event[0] == kind]
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def clear(self):
+        """Очищает записанные события"""
+        self.recorded = []
+
+
+class KeyActuator:
+    """
+    Поток нажатий клавиш с очередью команд.
+
+    Поток кадров вызывает press()/release(), которые только ставят намерение
+    в очередь, а отправку выполняет отдельный поток. Ручные нажатия
+    отслеживаются по событиям хука клавиатуры: собственные события потока
+    ожидаются заранее и не считаются ручными.
+    """
+
+    # Время, в течение которого ожидается собственное событие в хуке (сек)
+    INJECTED_TIMEOUT = 0.25
+
+    def __init__(self, actuator, keys=('w',)):
+        """
+        Args:
+            actuator: Исполнитель ввода
+            keys: Клавиши, ручные нажатия которых нужно отслеживать
+        """
+        self.actuator = actuator
+        self.commands = queue.Queue()
+        self.lock = threading.Lock()
+        self.held = set()  # Клавиши, зажатые по намерению потока кадров
+        self.manual = set()  # Клавиши, зажатые пользователем
+        self.injected = {}  # (клавиша, нажата) -> времена отправки собственных событий
+        self.failed = 0
+
+        for key in keys:
+            try:
+                actuator.watch_key(key, self._on_key_event)
+            except Exception as e:
+                print(f"Error hooking key {key}: {str(e)}")
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def press(self, key):
+        """Ставит нажатие клавиши в очередь (повторное нажатие игнорируется)"""
+        if key in self.held:
+            return
+        self.held.add(key)
+        self.commands.put((key, True))
+
+    def release(self, key):
+        """Ставит отпускание клавиши в очередь (если клавиша зажата этим потоком)"""
+        if key not in self.held:
+            return
+        self.held.discard(key)
+        self.commands.put((key, False))
+
+    def is_held(self, key):
+        """Зажата ли клавиша по намерению потока кадров"""
+        return key in self.held
+
+    def is_manual(self, key):
+        """Зажата ли клавиша пользователем"""
+        return key in self.manual
+
+    def _on_key_event(self, key, pressed):
+        """Обработчик хука клавиатуры (вызывается в потоке хука)"""
+        current_time = time.perf_counter()
+        with self.lock:
+            pending = self.injected.get((key, pressed))
+            while pending and current_time - pending[0] > self.INJECTED_TIMEOUT:
+                pending.popleft()
+            if pending:
+                # Собственное событие потока клавиш
+                pending.popleft()
+                return
+            if pressed:
+                self.manual.add(key)
+            else:
+                self.manual.discard(key)
+
+    def _run(self):
+        """Поток отправки команд"""
+        while True:
+            command = self.commands.get()
+            if command is None:
+                break
+            key, pressed = command
+            with self.lock:
+                self.injected.setdefault((key, pressed), deque()).append(time.perf_counter())
+            try:
+                self.actuator.send([('key', key, pressed)])
+            except Exception as e:
+                self.failed += 1
+                print(f"Error sending key {key}: {str(e)}")
+
+    def close(self, timeout=0.5):
+        """Отпускает зажатые клавиши и останавливает поток после отправки очереди"""
+        for key in list(self.held):
+            self.release(key)
+        self.commands.put(None)
+        self.thread.join(timeout=timeout)
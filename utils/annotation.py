@@ -0,0 +1,315 @@
+"""
+Модуль пакетной офлайн-разметки записанной игры.
+Прогоняет детектор по видеофайлу или папке с кадрами и сохраняет набор данных
+в формате YOLO (images/, labels/, data.yaml) для дообучения.
+
+Декодирование идет в нескольких потоках (каждый читает свой отрезок видео),
+инференс - пакетами, запись изображений и разметки - в пуле потоков. Готовые
+кадры отмечаются в индексе прогресса, поэтому прерванный запуск продолжается
+с того же места.
+
+Запуск:
+    python -m utils.annotation recordings/session.mp4 --output datasets/session --every 5
+"""
+
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+PROGRESS_FILE = 'progress.idx'
+
+
+class FrameSource:
+    """Описание записи: видеофайл или папка с кадрами"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Путь к видеофайлу или папке с кадрами (кадры берутся в порядке имен)
+        """
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        self.images = None
+        if os.path.isdir(path):
+            self.images = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(IMAGE_EXTENSIONS))
+            self.frame_count = len(self.images)
+            self.fps = 0.0
+        else:
+            video = cv2.VideoCapture(path)
+            if not video.isOpened():
+                raise ValueError(f"Cannot open video {path}")
+            self.frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.fps = video.get(cv2.CAP_PROP_FPS) or 0.0
+            video.release()
+
+    def segments(self, count):
+        """Делит запись на count непрерывных отрезков [start, end)"""
+        size = max(1, -(-self.frame_count // max(1, count)))
+        return [(start, min(start + size, self.frame_count)) for start in range(0, self.frame_count, size)]
+
+
+class BulkAnnotator:
+    """
+    Пакетная разметка записи моделью YOLO.
+
+    Потоки декодирования читают свои отрезки записи, уменьшают кадры до
+    image_width и кладут их в общую очередь. Основной поток собирает пакеты
+    и запускает модель, а пул записи сохраняет изображения и файлы разметки.
+    """
+
+    def __init__(self, model, output_dir, batch_size=16, decode_workers=4, write_workers=4,
+                 every=1, image_width=640, conf=0.4, iou=0.7, classes=None, label_class=None,
+                 device=None):
+        """
+        Инициализирует разметчик.
+
+        Args:
+            model: Модель YOLO
+            output_dir: Папка набора данных
+            batch_size: Число кадров в пакете инференса
+            decode_workers: Число потоков декодирования
+            write_workers: Число потоков записи
+            every: Размечать каждый N-й кадр (соседние кадры видео почти одинаковы)
+            image_width: Ширина сохраняемых изображений (разметка нормирована)
+            conf: Порог уверенности
+            iou: Порог IoU для NMS
+            classes: Список ID классов модели для разметки (None - все)
+            label_class: Записывать все объекты с этим ID класса (например, 80 для 'bag')
+            device: Устройство инференса (None - выбор ultralytics)
+        """
+        self.model = model
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.decode_workers = decode_workers
+        self.write_workers = write_workers
+        self.every = max(1, every)
+        self.image_width = image_width
+        self.conf = conf
+        self.iou = iou
+        self.classes = classes
+        self.label_class = label_class
+        self.device = device
+
+        self.images_dir = os.path.join(output_dir, 'images')
+        self.labels_dir = os.path.join(output_dir, 'labels')
+        self.progress_path = os.path.join(output_dir, PROGRESS_FILE)
+        self.progress_lock = threading.Lock()
+        self.progress_file = None
+
+        self.frames = queue.Queue(maxsize=batch_size * 4)
+        self.annotated = 0
+        self.boxes_written = 0
+
+    def load_progress(self):
+        """Читает индекс прогресса: номера уже размеченных кадров"""
+        if not os.path.exists(self.progress_path):
+            return set()
+        with open(self.progress_path) as f:
+            return {int(line) for line in f if line.strip().isdigit()}
+
+    def run(self, source):
+        """
+        Размечает запись.
+
+        Args:
+            source: FrameSource
+
+        Returns:
+            int: Число размеченных кадров за этот запуск
+        """
+        os.makedirs(self.images_dir, exist_ok=True)
+        os.makedirs(self.labels_dir, exist_ok=True)
+        done = self.load_progress()
+        pending = sum(1 for index in range(0, source.frame_count, self.every) if index not in done)
+        print(f"Annotating {source.path}: {source.frame_count} frames, {pending} to process "
+              f"({len(done)} already done)")
+        if not pending:
+            self.write_dataset_config()
+            return 0
+
+        segments = source.segments(self.decode_workers)
+        for start, end in segments:
+            threading.Thread(target=self._decode_segment, args=(source, start, end, done), daemon=True).start()
+
+        self.progress_file = open(self.progress_path, 'a')
+        start_time = time.time()
+        last_report_time = start_time
+        finished_workers = 0
+        batch = []
+        with ThreadPoolExecutor(max_workers=self.write_workers) as writers:
+            while finished_workers < len(segments):
+                item = self.frames.get()
+                if item is None:
+                    finished_workers += 1
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size or (batch and finished_workers == len(segments)):
+                    self._annotate_batch(source, batch, writers)
+                    batch = []
+
+                current_time = time.time()
+                if current_time - last_report_time >= 5.0:
+                    self._report(source, current_time - start_time, pending)
+                    last_report_time = current_time
+
+        self.progress_file.close()
+        self._report(source, time.time() - start_time, pending)
+        self.write_dataset_config()
+        return self.annotated
+
+    def _decode_segment(self, source, start, end, done):
+        """Поток декодирования отрезка записи"""
+        try:
+            if source.images is not None:
+                for index in range(start, end):
+                    if index % self.every or index in done:
+                        continue
+                    frame = cv2.imread(source.images[index])
+                    if frame is not None:
+                        self.frames.put((index, self._resize(frame)))
+            else:
+                video = cv2.VideoCapture(source.path)
+                video.set(cv2.CAP_PROP_POS_FRAMES, start)
+                for index in range(start, end):
+                    # Пропускаемые кадры только извлекаются из потока, без декодирования в изображение
+                    if index % self.every or index in done:
+                        if not video.grab():
+                            break
+                        continue
+                    ok, frame = video.read()
+                    if not ok:
+                        break
+                    self.frames.put((index, self._resize(frame)))
+                video.release()
+        except Exception as e:
+            print(f"Error decoding frames {start}-{end}: {str(e)}")
+        finally:
+            self.frames.put(None)
+
+    def _resize(self, frame):
+        height, width = frame.shape[:2]
+        if width <= self.image_width:
+            return frame
+        size = (self.image_width, max(1, int(height * self.image_width / width)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def _annotate_batch(self, source, batch, writers):
+        """Запускает модель на пакете кадров и передает результаты в пул записи"""
+        images = [image for _, image in batch]
+        results = self.model.predict(images, imgsz=self.image_width, conf=self.conf, iou=self.iou,
+                                     classes=self.classes, device=self.device, verbose=False)
+        for (index, image), result in zip(batch, results):
+            boxes = result.boxes
+            labels = []
+            if boxes is not None and len(boxes):
+                class_ids = boxes.cls.int().tolist()
+                for class_id, (x_center, y_center, width, height) in zip(class_ids, boxes.xywhn.tolist()):
+                    if self.label_class is not None:
+                        class_id = self.label_class
+                    labels.append(f"{class_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}")
+            writers.submit(self._write_sample, f"{source.name}_{index:07d}", index, image, labels)
+
+    def _write_sample(self, stem, index, image, labels):
+        """Сохраняет изображение и разметку и отмечает кадр в индексе прогресса"""
+        try:
+            cv2.imwrite(os.path.join(self.images_dir, stem + '.jpg'), image)
+            with open(os.path.join(self.labels_dir, stem + '.txt'), 'w') as f:
+                f.write('\n'.join(labels) + ('\n' if labels else ''))
+            # Кадр отмечается только после записи обоих файлов
+            with self.progress_lock:
+                self.progress_file.write(f"{index}\n")
+                self.progress_file.flush()
+                self.annotated += 1
+                self.boxes_written += len(labels)
+        except Exception as e:
+            print(f"Error writing sample {stem}: {str(e)}")
+
+    def _report(self, source, elapsed, pending):
+        """Выводит скорость разметки"""
+        if elapsed <= 0:
+            return
+        rate = self.annotated / elapsed
+        message = (f"Annotated {self.annotated}/{pending} frames, {self.boxes_written} boxes, "
+                   f"{rate:.1f} frames/s")
+        if source.fps:
+            # Скорость относительно реального времени записи (с учетом пропуска кадров)
+            message += f" ({rate * self.every / source.fps:.1f}x real-time)"
+        print(message)
+
+    def write_dataset_config(self):
+        """Сохраняет data.yaml для обучения ultralytics на размеченных кадрах"""
+        names = dict(self.model.names)
+        if self.label_class is not None:
+            names.setdefault(self.label_class, 'bag')
+        with open(os.path.join(self.output_dir, 'data.yaml'), 'w') as f:
+            f.write(f"path: {os.path.abspath(self.output_dir)}\n")
+            f.write("train: images\n")
+            f.write("val: images\n")
+            f.write("names:\n")
+            for class_id in sorted(names):
+                f.write(f"  {class_id}: {names[class_id]}\n")
+
+
+def main():
+    """Запуск разметки из командной строки"""
+    parser = argparse.ArgumentParser(description='Reign of Bots - Offline bulk annotation')
+    parser.add_argument('source', help='Video file or folder with frames')
+    parser.add_argument('--output', required=True, help='Dataset folder (images/, labels/, data.yaml)')
+    parser.add_argument('--model', default='models/yolo11n.pt', help='YOLO model used for labeling')
+    parser.add_argument('--batch', type=int, default=16, help='Frames per inference batch')
+    parser.add_argument('--decode-workers', type=int, default=4, help='Parallel decode threads')
+    parser.add_argument('--write-workers', type=int, default=4, help='Parallel image/label writer threads')
+    parser.add_argument('--every', type=int, default=1, help='Annotate every N-th frame')
+    parser.add_argument('--width', type=int, default=640, help='Width of saved images and inference size')
+    parser.add_argument('--conf', type=float, default=0.4, help='Detection confidence threshold')
+    parser.add_argument('--classes', default=None,
+                        help='Comma-separated class names to label (default: all model classes)')
+    parser.add_argument('--label-class', type=int, default=None,
+                        help='Write every box with this class ID (e.g. 80 for the custom "bag" class)')
+    parser.add_argument('--no-cuda', action='store_true', help='Run inference on CPU')
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+
+    try:
+        model = YOLO(args.model)
+    except Exception as e:
+        print(f"Error loading model {args.model}: {str(e)}")
+        sys.exit(1)
+
+    classes = None
+    if args.classes:
+        ids_by_name = {name: class_id for class_id, name in model.names.items()}
+        classes = []
+        for name in args.classes.split(','):
+            if name.strip() not in ids_by_name:
+                print(f"Unknown class '{name.strip()}' for model {args.model}")
+                sys.exit(1)
+            classes.append(ids_by_name[name.strip()])
+
+    try:
+        source = FrameSource(args.source)
+    except ValueError as e:
+        print(str(e))
+        sys.exit(1)
+
+    annotator = BulkAnnotator(model, args.output, batch_size=args.batch, decode_workers=args.decode_workers,
+                              write_workers=args.write_workers, every=args.every, image_width=args.width,
+                              conf=args.conf, classes=classes, label_class=args.label_class,
+                              device="cpu" if args.no_cuda else None)
+    try:
+        annotator.run(source)
+    except KeyboardInterrupt:
+        print("Interrupted, progress saved; run the same command again to resume")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@
 """
 import cv2
 import numpy as np
+import os
 import time
 import contextlib
 import mss
@@ -76,6 +77,76 @@ class ScreenCapture:
         except Exception as e:
             print(f"Error cleaning MSS screen capture resources: {str(e)}")
 
+class VideoReplay:
+    """
+    Источник кадров из видеофайла или папки с изображениями.
+    Позволяет прогонять записанную игру через конвейер без захвата экрана.
+    """
+    IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+    DEFAULT_FPS = 60.0
+
+    def __init__(self, path, loop=False, fps=None):
+        """
+        Открывает запись.
+
+        Args:
+            path: Путь к видеофайлу или папке с кадрами (кадры берутся в порядке имен)
+            loop: Начинать запись заново после последнего кадра
+            fps: Частота кадров записи (None - из видеофайла, для папки - DEFAULT_FPS)
+        """
+        self.path = path
+        self.loop = loop
+        self.finished = False
+        self.frame_index = 0
+        self.video = None
+        self.images = None
+        if os.path.isdir(path):
+            self.images = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(self.IMAGE_EXTENSIONS))
+            if not self.images:
+                raise ValueError(f"No images found in {path}")
+        else:
+            self.video = cv2.VideoCapture(path)
+            if not self.video.isOpened():
+                raise ValueError(f"Cannot open video {path}")
+            fps = fps or self.video.get(cv2.CAP_PROP_FPS)
+        self.fps = fps or self.DEFAULT_FPS
+        print(f"Replay source opened: {path}")
+
+    def capture(self):
+        """
+        Возвращает следующий кадр записи.
+
+        Returns:
+            np.ndarray: Кадр в формате BGR или None, если запись закончилась
+        """
+        if self.finished:
+            return None
+        if self.images is not None:
+            if self.frame_index >= len(self.images):
+                if not self.loop:
+                    self.finished = True
+                    return None
+                self.frame_index = 0
+            frame = cv2.imread(self.images[self.frame_index])
+        else:
+            ok, frame = self.video.read()
+            if not ok and self.loop:
+                self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self.video.read()
+            if not ok:
+                self.finished = True
+                return None
+        self.frame_index += 1
+        return frame
+
+    def cleanup(self):
+        """
+        Закрывает запись.
+        """
+        if self.video is not None:
+            self.video.release()
+
 # Функция-обертка для обратной совместимости
 def capture_screen(monitor_number=0):
     """
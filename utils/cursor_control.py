@@ -3,18 +3,48 @@
 Предоставляет класс для отслеживания и управления курсором в различных режимах.
 """
 
-import win32api
-import win32con
+import ctypes
 import time
 import math
 import random
-import keyboard
-from collections import deque
-from threading import Thread
+import sys
+from collections import deque, namedtuple
+from threading import Event, Thread
 
+from utils import timing
+from utils.actuation import KeyActuator, Win32Actuator
 from utils.kalman import KalmanFilter, BoxFilter
 from utils.detector import DEFAULT_IGNORED_CLASSES, COCO_CLASSES
 
+# Неизменяемый снимок цели, который поток кадров передает потоку управления.
+# Публикуется заменой одной ссылки, поэтому поток управления всегда видит
+# согласованные координаты, рамку, скорость цели (пикс/с) и время захвата кадра (timing.now()).
+TargetState = namedtuple('TargetState', ['x', 'y', 'box', 'distance', 'timestamp', 'sequence', 'vx', 'vy'])
+
+
+def smooth_damp(current, target, velocity, smooth_time, dt):
+    """
+    Шаг критически демпфированного сближения с целью (без перерегулирования).
+    
+    Решение вычисляется для произвольного dt, поэтому результат не зависит от частоты тактов.
+    
+    Args:
+        current: Текущее значение
+        target: Целевое значение
+        velocity: Текущая скорость изменения значения
+        smooth_time: Характерное время сближения (сек)
+        dt: Время с предыдущего шага (сек)
+        
+    Returns:
+        tuple: (новое значение, новая скорость)
+    """
+    omega = 2.0 / smooth_time
+    x = omega * dt
+    decay = 1.0 / (1.0 + x + 0.48 * x * x + 0.235 * x * x * x)
+    change = current - target
+    temp = (velocity + omega * change) * dt
+    return target + (change + temp) * decay, (velocity - omega * temp) * decay
+
 class CursorController:
     """
     Класс для управления курсором мыши с поддержкой различных режимов работы:
@@ -22,19 +52,37 @@ class CursorController:
     - Автоматическое следование за целью
     - Автоматическая атака (кликание)
     - Фильтрация движений для плавного перемещения
+    
+    Поток управления спит на событии, пока управление выключено или нет цели,
+    и просыпается при появлении новой цели. Во время наведения он работает
+    с частотой update_rate, а после схождения курсора с целью - с converged_rate.
+    
+    В предиктивном режиме цель экстраполируется по ее скорости на задержку
+    конвейера (возраст снимка), а курсор ведется критически демпфированным
+    законом smooth_damp с отдельной настройкой для каждого режима.
     """
     
-    def __init__(self):
+    def __init__(self, update_rate=500, converged_rate=60, actuator=None, predictive=False, spin_window=None):
+        """
+        Args:
+            update_rate: Частота цикла управления во время наведения (Hz)
+            converged_rate: Частота цикла после схождения курсора с целью (Hz)
+            actuator: Исполнитель ввода (None - Win32Actuator; RecordingActuator для тестов и замеров)
+            predictive: Включить предиктивный режим управления
+            spin_window: Окно активного ожидания такта (сек); при 500 Hz активное ожидание удерживает
+                         GIL и занимает ядро. None - без активного ожидания, если системный
+                         таймер работает с точностью 1 мс, иначе окно 0.5 мс
+        """
+        # Весь ввод идет через исполнитель: события такта отправляются одним пакетом
+        self.actuator = actuator or Win32Actuator()
+        
         # Системные параметры
-        self.screen_width = win32api.GetSystemMetrics(win32con.SM_CXVIRTUALSCREEN)
-        self.screen_height = win32api.GetSystemMetrics(win32con.SM_CYVIRTUALSCREEN)
+        self.screen_width, self.screen_height = self.actuator.screen_size()
         self.center_x = self.screen_width // 2
         self.center_y = self.screen_height // 2
         
         # Параметры движения
-        self.current_x, self.current_y = win32api.GetCursorPos()
-        self.target_x = self.current_x
-        self.target_y = self.current_y
+        self.current_x, self.current_y = self.actuator.cursor_position()
         self.relative_mode = False
         self.smoothing_factor = 0.1  # Коэффициент экспоненциального сглаживания движений курсора - чем меньше, тем плавнее движения
         self.sensitivity = 1.0
@@ -45,11 +93,53 @@ class CursorController:
         # Флаг для отслеживания перемещения курсора в текущем кадре
         self.cursor_moved_this_frame = False
         
-        # Параметры высокочастотного обновления
-        self.update_interval = 1/500  # 500 Hz
-        self.running = True
-        self.update_thread = Thread(target=self._update_loop, daemon=True)
-        self.update_thread.start()
+        # Снимок цели от потока кадров (TargetState) и время захвата/номер текущего кадра
+        self.target_state = None
+        self.frame_timestamp = None
+        self.frame_sequence = 0
+        self.frame_cursor_position = None  # Позиция курсора из контекста текущего кадра
+        # Последний снимок с отфильтрованным центром: скорость цели оценивается только по таким снимкам
+        self.velocity_reference = None
+        
+        # Виртуальная цель принадлежит только потоку управления: она начинается
+        # с координат нового снимка и смещается навстречу движению в относительном режиме
+        self.virtual_x = self.current_x
+        self.virtual_y = self.current_y
+        self.virtual_source = None
+        
+        # Предиктивный режим: экстраполяция цели на задержку конвейера и критически
+        # демпфированное сближение. smooth_time - характерное время сближения (сек) для каждого режима
+        self.predictive_enabled = predictive
+        self.PREDICTIVE_SMOOTH_TIME = {'absolute': 0.06, 'relative': 0.1}
+        self.MAX_PREDICTION = 0.2  # Максимальный горизонт экстраполяции (сек)
+        self.VELOCITY_SMOOTHING = 0.5  # Вес нового измерения скорости цели
+        self.control_x = None  # Дробная позиция курсора, которую ведет регулятор
+        self.control_y = None
+        self.control_vx = 0.0  # Скорость курсора (пикс/с)
+        self.control_vy = 0.0
+        self.relative_remainder_x = 0.0  # Остаток дробных отсчетов мыши в относительном режиме
+        self.relative_remainder_y = 0.0
+        
+        # Параметры цикла управления: событие пробуждения и адаптивная частота
+        self.update_interval = 1 / update_rate  # Интервал во время наведения
+        self.converged_interval = 1 / converged_rate  # Интервал после схождения с целью
+        self.wake_event = Event()
+        self.loop_state = 'idle'
+        self.tick_intervals = deque(maxlen=500)  # Фактические интервалы между тактами
+        self.tick_lateness = deque(maxlen=500)  # Опоздание тактов относительно расписания
+        
+        # Повышаем точность системного таймера до 1 мс, иначе ожидания короче
+        # ~15 мс округляются непредсказуемо
+        try:
+            ctypes.windll.winmm.timeBeginPeriod(1)
+            self.timer_period_set = True
+        except Exception:
+            self.timer_period_set = False
+        if spin_window is None:
+            # Вне Windows sleep() и так просыпается вовремя
+            high_resolution = self.timer_period_set or sys.platform != 'win32'
+            spin_window = 0.0 if high_resolution else 0.0005
+        self.spin_window = spin_window
         
         # Параметры состояния
         self.following_enabled = False  # По умолчанию режим следования выключен
@@ -58,7 +148,6 @@ class CursorController:
         self.last_attack_time = 0
         self.attack_interval = random.uniform(0.1, 0.3)  # Случайный интервал между кликами
         self.last_position = None
-        self.last_box = None
         
         # Список игнорируемых типов объектов (не будут выбираться в качестве цели)
         self.ignored_classes = DEFAULT_IGNORED_CLASSES.copy()
@@ -75,7 +164,9 @@ class CursorController:
         self.distance_threshold_release = 1.8  # Порог в метрах для отпускания W
         self.target_lost_timeout = 0.3  # Уменьшаем время до признания цели потерянной
         
-        # Параметры движения вперед
+        # Параметры движения вперед. Клавиша W нажимается в потоке клавиш,
+        # ручное нажатие отслеживается по событиям хука клавиатуры
+        self.key_actuator = KeyActuator(self.actuator, keys=('w',))
         self.w_key_pressed = False
         self.manual_key_pressed = False  # Флаг для отслеживания ручного нажатия клавиши W
         
@@ -111,6 +202,11 @@ class CursorController:
         self.smoothed_min_y = None
         self.smoothed_max_x = None
         self.smoothed_max_y = None
+        
+        # Поток управления запускается после инициализации всех параметров
+        self.running = True
+        self.update_thread = Thread(target=self._update_loop, daemon=True)
+        self.update_thread.start()
 
     def toggle_following(self):
         """Переключает режим следования за целью"""
@@ -125,6 +221,12 @@ class CursorController:
     def toggle_cursor_control(self):
         """Переключает режим управления курсором мыши (включено/выключено)"""
         self.cursor_control_enabled = not self.cursor_control_enabled
+        self.wake_event.set()
+        return True
+        
+    def toggle_predictive(self):
+        """Переключает предиктивный режим управления"""
+        self.predictive_enabled = not self.predictive_enabled
         return True
         
     def toggle_attack(self):
@@ -165,20 +267,35 @@ class CursorController:
     def handle_attack(self):
         """Обрабатывает режим атаки"""
         if self.attack_enabled:
-            current_time = time.time()
+            current_time = timing.now()
             if current_time - self.last_attack_time >= self.attack_interval:
                 # Выполняем клик
-                win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
-                win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
+                self.actuator.click('left')
+                self.actuator.flush()
                 
                 # Обновляем время и интервал
                 self.last_attack_time = current_time
                 self.attack_interval = random.uniform(0.1, 0.3)
                 
-    def handle_auto_movement(self, distance, box):
-        """Обрабатывает автоматическое движение курсора и управление движением с клавишей W"""
-        current_time = time.time()
-        
+    def _set_w_key(self, pressed):
+        """Ставит нажатие или отпускание W в очередь потока клавиш (не блокирует)"""
+        if pressed:
+            self.key_actuator.press('w')
+        else:
+            self.key_actuator.release('w')
+        self.w_key_pressed = pressed
+    
+    def handle_auto_movement(self, distance, box, velocity=None):
+        """
+        Обрабатывает автоматическое движение курсора и управление движением с клавишей W.
+        Вызывается в потоке кадров и только ставит намерения в очередь, не ожидая ввода.
+        
+        Args:
+            distance: Расстояние до цели
+            box: Рамка цели (None - цели нет)
+            velocity: Скорость цели (vx, vy) в пикс/с из фильтра Калмана конвейера. Если задана,
+                      рамка уже отфильтрована и используется без BoxFilter
+        """
         # Сохраняем расстояние для отображения в любом случае
         if distance is not None and distance > 0:
             self.last_distance = distance
@@ -186,29 +303,28 @@ class CursorController:
         # Проверка на потерю цели
         if not box:
             if self.w_key_pressed and self.following_enabled and not self.manual_key_pressed:
-                try:
-                    keyboard.release('w')
-                    self.w_key_pressed = False
-                    time.sleep(0.01)
-                except Exception as e:
-                    print(f"Error releasing W key: {e}")
+                self._set_w_key(False)
             return
         
         # Проверка валидности расстояния
         if distance is None or distance <= 0:
             return
         
-        # Применяем BoxFilter к координатам рамки
-        # Фильтруем только самые необходимые координаты (x_min, y_min)
-        # Остальные вычисляются из исходной ширины и высоты
-        filtered_box = self.box_filter.update(box)
+        if velocity is not None:
+            # Рамку и скорость цели сгладил банк фильтров Калмана конвейера
+            filtered_box = tuple(box)
+            center = None
+        else:
+            # Применяем BoxFilter к координатам рамки
+            # Фильтруем только самые необходимые координаты (x_min, y_min)
+            # Остальные вычисляются из исходной ширины и высоты
+            filtered_box = self.box_filter.update(box)
+            
+            # Вычисляем центр цели после фильтрации
+            center = self.box_filter.get_center()
         
         # Сохраняем отфильтрованные данные
         self.filtered_box = filtered_box
-        self.last_box = self.filtered_box
-        
-        # Вычисляем центр цели после фильтрации
-        center = self.box_filter.get_center()
         
         # Создаем локальные переменные для центра цели
         if center:
@@ -223,96 +339,296 @@ class CursorController:
         filtered_distance = self.distance_filter.update(distance)
         self.last_distance = filtered_distance
         
-        # Обновляем глобальные target_x и target_y для использования в других методах
-        self.target_x = tgt_x
-        self.target_y = tgt_y
+        # Публикуем снимок цели для потока управления
+        self.publish_target(tgt_x, tgt_y, box=filtered_box, distance=filtered_distance, velocity=velocity)
         
         # Управление клавишей W
         if self.following_enabled:
-            try:
-                manual_w_pressed = keyboard.is_pressed('w')
-                if manual_w_pressed and not self.w_key_pressed:
-                    self.manual_key_pressed = True
-                    return
-                if not manual_w_pressed and self.manual_key_pressed:
-                    self.manual_key_pressed = False
-                
-                # Если пользователь не нажимает W вручную и следование включено
-                if not self.manual_key_pressed:
-                    # Используем фильтрованное расстояние для более стабильного поведения
-                    # Если расстояние больше 1.9м и клавиша W не нажата - нажимаем W
-                    if filtered_distance > 1.9 and not self.w_key_pressed:
-                        keyboard.press('w')
-                        self.w_key_pressed = True
-                        time.sleep(0.01)  # Небольшая пауза после нажатия
-                    # Если расстояние меньше 1.8м и клавиша W нажата - отпускаем W
-                    elif filtered_distance < 1.8 and self.w_key_pressed:
-                        keyboard.release('w')
-                        self.w_key_pressed = False
-                        time.sleep(0.01)  # Небольшая пауза после отпускания
-            except Exception as e:
-                print(f"Error in auto W key handling: {str(e)}")
+            manual_w_pressed = self.key_actuator.is_manual('w')
+            if manual_w_pressed and not self.w_key_pressed:
+                self.manual_key_pressed = True
+                return
+            if not manual_w_pressed and self.manual_key_pressed:
+                self.manual_key_pressed = False
+            
+            # Если пользователь не нажимает W вручную и следование включено
+            if not self.manual_key_pressed:
+                # Используем фильтрованное расстояние для более стабильного поведения
+                # Если расстояние больше порога и клавиша W не нажата - нажимаем W
+                if filtered_distance > self.distance_threshold_press and not self.w_key_pressed:
+                    self._set_w_key(True)
+                # Если расстояние меньше порога отпускания и клавиша W нажата - отпускаем W
+                elif filtered_distance < self.distance_threshold_release and self.w_key_pressed:
+                    self._set_w_key(False)
         else:
             if self.w_key_pressed and not self.manual_key_pressed:
-                try:
-                    keyboard.release('w')
-                    self.w_key_pressed = False
-                except Exception as e:
-                    print(f"Error releasing W key: {e}")
+                self._set_w_key(False)
         
         # Устанавливаем целевую позицию курсора только если включено управление курсором
         if self.cursor_control_enabled:
-            self.move_cursor(self.target_x, self.target_y)
+            self.move_cursor(tgt_x, tgt_y)
             # Отмечаем, что курсор уже был перемещен в этом кадре
             self.cursor_moved_this_frame = True
     
+    def begin_frame(self, timestamp=None, sequence=None, cursor_position=None):
+        """
+        Начинает обработку кадра: цели, опубликованные до следующего вызова,
+        получают время захвата и номер этого кадра.
+        
+        Args:
+            timestamp: Время захвата кадра (timing.now(), None - текущее время)
+            sequence: Номер кадра (None - следующий по порядку)
+            cursor_position: Позиция курсора из контекста кадра (None - запрашивается у исполнителя)
+        """
+        self.cursor_moved_this_frame = False
+        self.frame_timestamp = timestamp if timestamp is not None else timing.now()
+        self.frame_sequence = sequence if sequence is not None else self.frame_sequence + 1
+        self.frame_cursor_position = cursor_position
+    
+    def _frame_cursor_position(self):
+        """Позиция курсора на начало кадра (один запрос к системе за кадр)"""
+        if self.frame_cursor_position is None:
+            self.frame_cursor_position = self.actuator.cursor_position()
+        return self.frame_cursor_position
+    
+    def publish_target(self, target_x, target_y, box=None, distance=None, estimate_velocity=True, velocity=None):
+        """
+        Публикует новый снимок цели и будит поток управления.
+        
+        Args:
+            target_x, target_y: Координаты цели
+            box: Рамка цели (None - рамка предыдущего снимка)
+            distance: Расстояние до цели (None - расстояние предыдущего снимка)
+            estimate_velocity: Обновить оценку скорости цели по этим координатам. Скорость
+                               оценивается только между снимками с отфильтрованным центром
+                               (handle_auto_movement); остальные снимки сохраняют прежнюю скорость
+            velocity: Готовая оценка скорости (vx, vy) в пикс/с, например из фильтра Калмана
+                      (None - оценка по смещению между снимками)
+        """
+        previous = self.target_state
+        timestamp = self.frame_timestamp if self.frame_timestamp is not None else timing.now()
+        vx, vy = 0.0, 0.0
+        if previous is not None:
+            box = box if box is not None else previous.box
+            distance = distance if distance is not None else previous.distance
+            vx, vy = previous.vx, previous.vy
+            if timestamp - previous.timestamp > self.target_lost_timeout:
+                vx, vy = 0.0, 0.0
+        
+        reference = self.velocity_reference
+        if velocity is not None:
+            vx, vy = velocity
+        elif estimate_velocity and reference is not None:
+            # Скорость цели оценивается между кадрами по времени их захвата
+            dt = timestamp - reference.timestamp
+            if reference.sequence != self.frame_sequence and 0 < dt <= self.target_lost_timeout:
+                weight = self.VELOCITY_SMOOTHING
+                vx = weight * (target_x - reference.x) / dt + (1 - weight) * vx
+                vy = weight * (target_y - reference.y) / dt + (1 - weight) * vy
+        
+        self.target_state = TargetState(target_x, target_y, box, distance, timestamp, self.frame_sequence, vx, vy)
+        if estimate_velocity:
+            self.velocity_reference = self.target_state
+        self.wake_event.set()
+    
+    def _publish_raw_target(self, target_x, target_y):
+        """
+        Публикует координаты из move_cursor, если в этом кадре еще нет снимка
+        с отфильтрованным центром; скорость цели при этом не пересчитывается.
+        """
+        state = self.target_state
+        if state is not None and state.sequence == self.frame_sequence:
+            return
+        self.publish_target(target_x, target_y, estimate_velocity=False)
+    
+    def target_age(self):
+        """Возраст текущей цели в секундах от захвата кадра (None - цели нет)"""
+        state = self.target_state
+        return timing.now() - state.timestamp if state is not None else None
+    
+    def _has_target(self):
+        """Цель считается актуальной, пока ее кадр захвачен не дольше target_lost_timeout назад"""
+        age = self.target_age()
+        return age is not None and age <= self.target_lost_timeout
+    
+    def _sync_virtual_target(self, state):
+        """Переносит координаты нового снимка в виртуальную цель потока управления"""
+        if state is not self.virtual_source:
+            self.virtual_x, self.virtual_y = state.x, state.y
+            self.virtual_source = state
+    
     def _update_loop(self):
-        """Основной цикл обновления позиции мыши с частотой 500 Hz"""
-        last_time = time.perf_counter()
+        """Цикл управления курсором: ожидание цели в простое и адаптивная частота при наведении"""
+        next_tick = timing.now()
+        last_tick = None
         
         while self.running:
-            current_time = time.perf_counter()
-            dt = current_time - last_time
+            # Событие сбрасывается до проверки состояния, чтобы не пропустить
+            # цель, появившуюся между проверкой и ожиданием
+            self.wake_event.clear()
+            if not self.cursor_control_enabled or not self._has_target():
+                # Простой: спим до новой цели (таймаут - только для проверки running)
+                self.loop_state = 'idle'
+                last_tick = None
+                self.control_x = None
+                self.wake_event.wait(0.5)
+                next_tick = timing.now()
+                continue
+            
+            current_time = timing.now()
+            # Шаг регулятора рассчитывается по фактическому времени с прошлого такта
+            dt = current_time - last_tick if last_tick is not None else self.update_interval
+            if last_tick is not None:
+                self.tick_intervals.append(current_time - last_tick)
+                self.tick_lateness.append(max(0.0, current_time - next_tick))
+            last_tick = current_time
             
-            if dt >= self.update_interval:
-                try:
+            try:
+                # Снимок цели читается один раз за такт
+                state = self.target_state
+                self._sync_virtual_target(state)
+                if self.predictive_enabled:
+                    dt = min(dt, self.converged_interval)
                     if self.relative_mode:
-                        self._update_relative_mode()
+                        moved = self._update_predictive_relative(state, dt)
                     else:
-                        self._update_absolute_mode()
-                    
-                    last_time = current_time
-                except Exception as e:
-                    print(f"Error in update loop: {str(e)}")
-                    
-            time.sleep(max(0, self.update_interval - dt))
+                        moved = self._update_predictive_absolute(state, dt)
+                elif self.relative_mode:
+                    moved = self._update_relative_mode(state)
+                else:
+                    moved = self._update_absolute_mode(state)
+                # Все события такта отправляются одним пакетом
+                self.actuator.flush()
+            except Exception as e:
+                print(f"Error in update loop: {str(e)}")
+                moved = False
+            
+            # Курсор сошелся с целью - снижаем частоту до появления нового смещения
+            self.loop_state = 'active' if moved else 'converged'
+            interval = self.update_interval if moved else self.converged_interval
+            next_tick = max(next_tick + interval, current_time)
+            
+            if moved:
+                # Во время наведения такты идут строго по расписанию (sleep с досчетом опросом)
+                timing.wait_until(next_tick, self.spin_window)
+            else:
+                # После схождения новая цель прерывает ожидание такта
+                self.wake_event.wait(max(0.0, next_tick - timing.now()))
     
-    def _update_relative_mode(self):
-        """Обновление в относительном режиме с оптимизированными вычислениями"""
-        if not self.last_box:
-            return
+    def _predicted_target(self, state, use_velocity=True):
+        """Виртуальная цель, экстраполированная по скорости цели на возраст снимка"""
+        if not use_velocity:
+            return self.virtual_x, self.virtual_y
+        horizon = min(max(0.0, timing.now() - state.timestamp), self.MAX_PREDICTION)
+        return self.virtual_x + state.vx * horizon, self.virtual_y + state.vy * horizon
+    
+    def _update_predictive_absolute(self, state, dt):
+        """Предиктивное обновление в абсолютном режиме. Возвращает True, если курсор сдвинут"""
+        current_x, current_y = self.actuator.cursor_position()
+        # Регулятор ведет дробную позицию; если курсор сдвинули извне - начинаем с фактической
+        if (self.control_x is None or abs(self.control_x - current_x) > 2 or
+                abs(self.control_y - current_y) > 2):
+            self.control_x, self.control_y = float(current_x), float(current_y)
+            self.control_vx, self.control_vy = 0.0, 0.0
+        
+        target_x, target_y = self._predicted_target(state)
+        smooth_time = self.PREDICTIVE_SMOOTH_TIME['absolute']
+        self.control_x, self.control_vx = smooth_damp(self.control_x, target_x, self.control_vx, smooth_time, dt)
+        self.control_y, self.control_vy = smooth_damp(self.control_y, target_y, self.control_vy, smooth_time, dt)
+        
+        # Ограничиваем координаты экраном
+        self.control_x = max(0.0, min(self.control_x, self.screen_width - 1.0))
+        self.control_y = max(0.0, min(self.control_y, self.screen_height - 1.0))
+        new_x, new_y = int(round(self.control_x)), int(round(self.control_y))
+        
+        if (new_x, new_y) == (current_x, current_y):
+            # Сошлись: цель рядом, и регулятор уже практически остановился
+            error = math.hypot(target_x - self.control_x, target_y - self.control_y)
+            speed = math.hypot(self.control_vx, self.control_vy)
+            return error > self.STOP_THRESHOLD or speed * dt >= 0.5
+        
+        self.actuator.set_position(new_x, new_y)
+        return True
+    
+    def _update_predictive_relative(self, state, dt):
+        """Предиктивное обновление в относительном режиме. Возвращает True, если курсор сдвинут"""
+        if not state.box:
+            return False
+        
+        # Скорость цели на экране в относительном режиме определяется в основном
+        # поворотом камеры самим регулятором, поэтому упреждение по ней не применяем
+        target_x, target_y = self._predicted_target(state, use_velocity=False)
+        error_x = target_x - self.center_x
+        error_y = target_y - self.center_y
+        if math.hypot(error_x, error_y) <= self.RELATIVE_STOP_THRESHOLD:
+            self.control_vx, self.control_vy = 0.0, 0.0
+            return False
+        
+        # Сближаем ошибку наведения с нулем; пройденный путь переводится в отсчеты мыши
+        smooth_time = self.PREDICTIVE_SMOOTH_TIME['relative']
+        new_error_x, self.control_vx = smooth_damp(error_x, 0.0, self.control_vx, smooth_time, dt)
+        new_error_y, self.control_vy = smooth_damp(error_y, 0.0, self.control_vy, smooth_time, dt)
+        counts_x = (error_x - new_error_x) / self.VIRTUAL_TARGET_SHIFT + self.relative_remainder_x
+        counts_y = (error_y - new_error_y) / self.VIRTUAL_TARGET_SHIFT + self.relative_remainder_y
+        move_amount_x, move_amount_y = int(counts_x), int(counts_y)
+        self.relative_remainder_x = counts_x - move_amount_x
+        self.relative_remainder_y = counts_y - move_amount_y
+        if move_amount_x == 0 and move_amount_y == 0:
+            return True
+        
+        # Сдвигаем виртуальную цель навстречу движению
+        self.virtual_x -= move_amount_x * self.VIRTUAL_TARGET_SHIFT
+        self.virtual_y -= move_amount_y * self.VIRTUAL_TARGET_SHIFT
+        
+        # Перемещаем курсор и возвращаем его в центр (один пакет такта)
+        self.actuator.move_relative(move_amount_x, move_amount_y)
+        self.actuator.set_position(self.center_x, self.center_y)
+        return True
+    
+    def get_loop_stats(self):
+        """
+        Возвращает статистику цикла управления.
+        
+        Returns:
+            dict: Состояние цикла ('idle', 'active', 'converged'), фактическая частота (Hz),
+                  джиттер интервалов и среднее опоздание тактов (мс)
+        """
+        intervals = list(self.tick_intervals)
+        lateness = list(self.tick_lateness)
+        stats = {'state': self.loop_state, 'rate': 0.0, 'jitter_ms': 0.0, 'lateness_ms': 0.0}
+        if intervals:
+            mean = sum(intervals) / len(intervals)
+            stats['rate'] = 1.0 / mean if mean > 0 else 0.0
+            stats['jitter_ms'] = math.sqrt(sum((value - mean) ** 2 for value in intervals) / len(intervals)) * 1000
+            stats['lateness_ms'] = sum(lateness) / len(lateness) * 1000
+        return stats
+    
+    def _update_relative_mode(self, state):
+        """Обновление в относительном режиме с оптимизированными вычислениями. Возвращает True, если курсор сдвинут"""
+        if not state.box:
+            return False
             
         # Если управление курсором отключено, просто выходим
         if not self.cursor_control_enabled:
-            return
+            return False
         
         # Получаем разницу между целью и центром экрана
-        dx = self.target_x - self.center_x
-        dy = self.target_y - self.center_y
+        dx = self.virtual_x - self.center_x
+        dy = self.virtual_y - self.center_y
         
         # Вычисляем расстояние до цели
         distance = math.sqrt(dx*dx + dy*dy)
         
         # Если близко к цели - останавливаемся
         if distance <= self.RELATIVE_STOP_THRESHOLD:
-            return
+            return False
         
         # Нормализуем направление
         if distance > 0:
             norm_dx = dx / distance
             norm_dy = dy / distance
         else:
-            return
+            return False
         
         # Вычисляем шаг движения
         move_x = norm_dx * 100 / self.RELATIVE_SLOW_FACTOR
@@ -336,42 +652,37 @@ class CursorController:
             move_amount_y = 1 if norm_dy > 0 else -1
         
         # Сдвигаем виртуальную цель навстречу движению
-        self.target_x -= move_amount_x * self.VIRTUAL_TARGET_SHIFT
-        self.target_y -= move_amount_y * self.VIRTUAL_TARGET_SHIFT
-        
-        # Перемещаем курсор
-        win32api.mouse_event(
-            win32con.MOUSEEVENTF_MOVE, 
-            move_amount_x, move_amount_y, 
-            0, 0
-        )
-        
-        # Возвращаем курсор в центр
-        win32api.SetCursorPos((self.center_x, self.center_y))
+        self.virtual_x -= move_amount_x * self.VIRTUAL_TARGET_SHIFT
+        self.virtual_y -= move_amount_y * self.VIRTUAL_TARGET_SHIFT
+        
+        # Перемещаем курсор и возвращаем его в центр (один пакет такта)
+        self.actuator.move_relative(move_amount_x, move_amount_y)
+        self.actuator.set_position(self.center_x, self.center_y)
+        return True
     
-    def _update_absolute_mode(self):
-        """Обновление в абсолютном режиме с оптимизированными вычислениями"""
+    def _update_absolute_mode(self, state):
+        """Обновление в абсолютном режиме с оптимизированными вычислениями. Возвращает True, если курсор сдвинут"""
         # Если управление курсором отключено, просто выходим
         if not self.cursor_control_enabled:
-            return
+            return False
             
-        current_x, current_y = win32api.GetCursorPos()
+        current_x, current_y = self.actuator.cursor_position()
         
         # Вычисляем разницу до цели
-        dx = self.target_x - current_x
-        dy = self.target_y - current_y
+        dx = self.virtual_x - current_x
+        dy = self.virtual_y - current_y
         distance = math.sqrt(dx*dx + dy*dy)
         
         # Если достигли цели - останавливаемся
         if distance <= self.STOP_THRESHOLD:
-            return
+            return False
         
         # Нормализуем направление
         if distance > 0:
             norm_dx = dx / distance
             norm_dy = dy / distance
         else:
-            return
+            return False
         
         # Основной расчет движения
         move_x = dx * self.smoothing_factor / self.SLOW_FACTOR
@@ -399,31 +710,30 @@ class CursorController:
         new_y = max(0, min(new_y, self.screen_height - 1))
         
         # Устанавливаем новую позицию
-        win32api.SetCursorPos((new_x, new_y))
+        self.actuator.set_position(new_x, new_y)
+        return True
     
     def move_cursor(self, target_x, target_y):
         """Move cursor to target position"""
         # Если курсор уже перемещен в этом кадре, просто обновляем целевые координаты
         if self.cursor_moved_this_frame:
-            self.target_x = target_x
-            self.target_y = target_y
-            return win32api.GetCursorPos()
+            self._publish_raw_target(target_x, target_y)
+            return self._frame_cursor_position()
         
         # Если управление курсором отключено, только обновляем целевую позицию без перемещения
         if not self.cursor_control_enabled:
-            self.target_x = target_x
-            self.target_y = target_y
-            return win32api.GetCursorPos()
+            self._publish_raw_target(target_x, target_y)
+            return self._frame_cursor_position()
             
         # Применяем абсолютный или относительный режим
         if self.relative_mode:
             # В относительном режиме только устанавливаем цель
-            self.target_x = target_x
-            self.target_y = target_y
-            return win32api.GetCursorPos()
+            self._publish_raw_target(target_x, target_y)
+            return self._frame_cursor_position()
         else:
-            # Абсолютный режим - перемещаем курсор напрямую
-            current_pos = win32api.GetCursorPos()
+            # Абсолютный режим - перемещаем курсор напрямую. Смещение считается от текущей
+            # позиции курсора: снимок кадра мог устареть, пока поток управления вел курсор
+            current_pos = self.actuator.cursor_position()
             dx = target_x - current_pos[0]
             dy = target_y - current_pos[1]
             
@@ -433,33 +743,31 @@ class CursorController:
             
             # Перемещаем курсор, если разница достаточно большая
             if abs(dx) > 0.5 or abs(dy) > 0.5:
-                win32api.mouse_event(win32con.MOUSEEVENTF_MOVE, int(dx), int(dy), 0, 0)
+                self.actuator.move_relative(int(dx), int(dy))
+                self.actuator.flush()
+                current_pos = (current_pos[0] + int(dx), current_pos[1] + int(dy))
             
-            # Возвращаем обновленную позицию
-            return win32api.GetCursorPos()
+            # Возвращаем обновленную позицию (снимок кадра остается позицией на начало кадра)
+            return current_pos
     
     def cleanup(self):
         """Очистка ресурсов при завершении, гарантирует отпускание всех клавиш"""
         print("Running CursorController cleanup...")
-        # Отпускаем клавишу W, если она была зажата
-        if hasattr(self, 'w_key_pressed') and self.w_key_pressed:
-            try:
+        # Отпускаем клавишу W, если она была зажата: поток клавиш отправляет
+        # оставшиеся команды и отпускания, после чего завершается
+        if hasattr(self, 'key_actuator') and self.key_actuator.thread.is_alive():
+            if self.w_key_pressed:
                 print("Cleanup: Releasing W key")
-                keyboard.release('w')
-                time.sleep(0.02)  # Небольшая задержка для обработки
-                
-                # Двойная проверка отпускания
-                if keyboard.is_pressed('w'):
-                    print("W key still pressed after release! Trying again...")
-                    keyboard.release('w')
-                    time.sleep(0.02)
+            try:
+                self.key_actuator.close()
             except Exception as e:
                 print(f"Error releasing W key during cleanup: {e}")
-            
             self.w_key_pressed = False
         
         # Останавливаем поток обновления
         self.running = False
+        if hasattr(self, 'wake_event'):
+            self.wake_event.set()
         if hasattr(self, 'update_thread') and self.update_thread and self.update_thread.is_alive():
             try:
                 self.update_thread.join(timeout=1.0)
@@ -467,6 +775,13 @@ class CursorController:
             except Exception as e:
                 print(f"Error stopping update thread: {e}")
         
+        if getattr(self, 'timer_period_set', False):
+            try:
+                ctypes.windll.winmm.timeEndPeriod(1)
+            except Exception:
+                pass
+            self.timer_period_set = False
+        
         print("CursorController cleanup completed")
     
     def __del__(self):
@@ -6,10 +6,16 @@
 import cv2
 import numpy as np
 import math
+import threading
 import time
 import torch
 from ultralytics import YOLO
 
+from utils.motion import GlobalMotionEstimator, MotionProposer, box_in_regions, box_iou, merge_regions, shift_box
+from utils.performance import PerformanceCounter
+from utils.pyramid import get_pyramid
+from utils import timing
+
 # Словарь имен классов COCO для YOLO11
 COCO_CLASSES = {
     0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 4: 'airplane', 5: 'bus', 
@@ -46,10 +52,182 @@ DEFAULT_IGNORED_CLASSES = [
     'scissors', 'teddy bear', 'hair drier', 'toothbrush'
 ]
 
+class DeviceCircuitBreaker:
+    """
+    Предохранитель (circuit breaker) для устройства инференса.
+
+    После нескольких ошибок подряд на основном устройстве (например, CUDA)
+    закрепляет резервное устройство и повторно проверяет основное только
+    по расписанию с экспоненциальной задержкой.
+    """
+
+    CLOSED = 'closed'        # Работаем на основном устройстве
+    OPEN = 'open'            # Основное устройство отключено, работаем на резервном
+    HALF_OPEN = 'half-open'  # Пробный запуск на основном устройстве
+
+    def __init__(self, primary_device, fallback_device="cpu", failure_threshold=3,
+                 base_backoff=1.0, max_backoff=60.0):
+        """
+        Инициализирует предохранитель.
+
+        Args:
+            primary_device: Основное устройство для инференса
+            fallback_device: Резервное устройство
+            failure_threshold: Количество ошибок подряд до переключения на резервное устройство
+            base_backoff: Начальная задержка перед повторной проверкой основного устройства (сек)
+            max_backoff: Максимальная задержка перед повторной проверкой (сек)
+        """
+        self.primary_device = primary_device
+        self.fallback_device = fallback_device
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.backoff = base_backoff
+        self.next_probe_time = 0.0
+        self.probe_in_flight = False  # Пробный запуск на основном устройстве уже выполняется
+        self.last_error = None
+        # Устройство общее для всех конвейеров детектора, поэтому переходы состояний под блокировкой
+        self.lock = threading.Lock()
+
+    def select_device(self):
+        """
+        Выбирает устройство для очередного запуска модели.
+
+        Returns:
+            str: Устройство для инференса
+        """
+        if self.primary_device == self.fallback_device:
+            return self.primary_device
+
+        with self.lock:
+            if self.state == self.OPEN:
+                if timing.now() < self.next_probe_time:
+                    return self.fallback_device
+                # Пора повторно проверить основное устройство
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                # Основное устройство проверяет один запуск; остальные конвейеры
+                # работают на резервном, пока проба не завершится
+                if self.probe_in_flight:
+                    return self.fallback_device
+                self.probe_in_flight = True
+
+        return self.primary_device
+
+    def record_success(self, device):
+        """Отмечает успешный запуск модели на устройстве"""
+        if device != self.primary_device:
+            return
+
+        with self.lock:
+            if self.state != self.CLOSED:
+                print(f"Device {self.primary_device} recovered, leaving fallback {self.fallback_device}")
+            self.state = self.CLOSED
+            self.probe_in_flight = False
+            self.consecutive_failures = 0
+            self.backoff = self.base_backoff
+
+    def record_failure(self, device, error):
+        """
+        Отмечает ошибку запуска модели на устройстве.
+
+        Returns:
+            bool: True, если основное устройство отключено (предохранитель разомкнут)
+        """
+        if device != self.primary_device:
+            return self.state == self.OPEN
+
+        with self.lock:
+            self.consecutive_failures += 1
+            self.total_failures += 1
+            self.last_error = str(error)
+
+            if self.state == self.HALF_OPEN:
+                # Пробный запуск не удался - увеличиваем задержку
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+                self._open()
+            elif self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._open()
+                print(f"Device {self.primary_device} failed {self.consecutive_failures} times in a row, "
+                      f"pinning {self.fallback_device}: {self.last_error}")
+
+            return self.state == self.OPEN
+
+    def _open(self):
+        """Переключает предохранитель на резервное устройство до следующей проверки"""
+        self.state = self.OPEN
+        self.probe_in_flight = False
+        self.next_probe_time = timing.now() + self.backoff
+
+    def get_state(self):
+        """
+        Возвращает описание состояния для статистики производительности.
+
+        Returns:
+            str: Строка вида 'cuda:0 closed' или 'cpu open (cuda:0 retry in 8.0s, failures=5)'
+        """
+        if self.state == self.CLOSED:
+            return f"{self.primary_device} {self.state}"
+
+        retry_in = max(0.0, self.next_probe_time - timing.now())
+        return (f"{self.fallback_device} {self.state} "
+                f"({self.primary_device} retry in {retry_in:.1f}s, failures={self.total_failures})")
+
+
+class ModelSlot:
+    """
+    Дополнительная модель детектора со своим набором классов и частотой запуска.
+    
+    Например, небольшая специализированная модель для класса 'bag' рядом
+    с основной моделью COCO.
+    """
+    
+    def __init__(self, name, model, class_map, classes=None, interval=0.5, conf=None):
+        """
+        Инициализирует слот модели.
+        
+        Args:
+            name: Имя слота (используется в статистике производительности)
+            model: Загруженная модель YOLO
+            class_map: Соответствие ID классов модели глобальным ID детектора
+            classes: Список ID классов модели, которые нужно детектировать (None - все)
+            interval: Интервал между запусками модели (сек)
+            conf: Порог достоверности (None - порог детектора)
+        """
+        self.name = name
+        self.model = model
+        self.class_map = class_map
+        self.classes = classes
+        self.interval = interval
+        self.conf = conf
+    
+    def is_due(self, current_time, last_run_time):
+        """Пора ли запускать модель (время последнего запуска хранит DetectionState конвейера)"""
+        return current_time - last_run_time >= self.interval
+
+
 class YOLOPersonDetector:
-    """Класс для обнаружения людей и других объектов с помощью YOLOv8"""
+    """
+    Класс для обнаружения людей и других объектов с помощью YOLOv8.
     
-    def __init__(self, model=None, conf=0.5, device="auto", debug=False):
+    Детектор хранит только общие для всех конвейеров ресурсы: модели, плагины,
+    области кадра, предохранитель устройства и счетчики задержки моделей.
+    Все, что относится к отдельному кадру (общий вход моделей с масштабом и
+    смещением, последние результаты, расписание дополнительных моделей и
+    плагинов, результаты проверки большой моделью), хранится в DetectionState,
+    который передается в методы параметром state. Поэтому несколько конвейеров
+    со своими DetectionState могут использовать один детектор в разных потоках.
+    Удаленный клиент (set_remote) держит один конвейер запросов и должен
+    использоваться одним конвейером.
+    """
+    
+    def __init__(self, model=None, conf=0.5, device="auto", debug=False,
+                 verifier_model=None, verify_interval=1.0, low_confidence=0.6):
         """
         Инициализирует детектор объектов.
         
@@ -58,12 +236,14 @@ class YOLOPersonDetector:
             conf: Порог достоверности для детекции (от 0 до 1)
             device: Устройство для инференса ('cuda', 'cpu' или 'auto')
             debug: Флаг для вывода отладочных сообщений
+            verifier_model: Большая модель YOLO для периодической проверки (второй уровень каскада)
+            verify_interval: Интервал полной проверки кадра большой моделью (сек)
+            low_confidence: Детекции быстрой модели ниже этого порога проверяются большой моделью
         """
         self.model = model
         self.conf = conf
-        self.last_frame = None
-        self.last_results = None
         self.debug = debug
+        self.input_width = 640  # Ширина кадра на входе модели
         
         # Определяем устройство для инференса
         self.cuda_available = torch.cuda.is_available()
@@ -71,7 +251,39 @@ class YOLOPersonDetector:
             self.device = "cuda:0" if self.cuda_available else "cpu"
         else:
             self.device = device
-            
+
+        # Предохранитель: при повторяющихся ошибках основного устройства закрепляем CPU
+        primary_device = self.device if self.cuda_available else "cpu"
+        self.device_breaker = DeviceCircuitBreaker(primary_device, fallback_device="cpu")
+
+        # Двухуровневый каскад: быстрая модель на каждом проходе, большая - для проверки
+        self.verifier_model = verifier_model
+        self.verify_interval = verify_interval
+        self.low_confidence = low_confidence
+        
+        # Отдельный учет задержки для каждого уровня каскада
+        self.tier_counters = {'detect_fast': PerformanceCounter('Fast Model')}
+        if self.verifier_model is not None:
+            self.tier_counters['detect_verify'] = PerformanceCounter('Verifier Model')
+        
+        # Дополнительные модели со своими классами и частотой запуска
+        self.model_slots = {}
+        
+        # Статические области экрана: рабочая область и маски исключения (HUD, панели оверлея)
+        self.active_region = None     # (x1, y1, x2, y2) в пикселях экрана или None - весь кадр
+        self.exclusion_masks = []     # Список (x1, y1, x2, y2) в пикселях экрана
+        self.regions_version = 0      # Меняется в set_regions(), чтобы общий вход кадра построился заново
+        
+        # Быстрые классические детекторы для простых классов
+        self.plugins = []
+        self.plugin_width = 320  # Ширина кадра для плагинов
+        
+        # Удаленный сервер инференса (None - только локальная модель)
+        self.remote = None
+        
+        # Состояние кадров по умолчанию (для вызовов без параметра state, например сервера удаленного инференса)
+        self.detection_state = DetectionState()
+
         print(f"YOLOPersonDetector initialized on {self.device}")
         
         # Добавляем поддержку пользовательских классов (вне COCO)
@@ -93,13 +305,416 @@ class YOLOPersonDetector:
                             self.model.names[class_id] = class_name
             except Exception as e:
                 print(f"Warning: Could not set device to {self.device}: {str(e)}")
-    
-    def detect(self, frame):
+        
+        if self.verifier_model:
+            try:
+                self.verifier_model.to(self.device)
+                print(f"Verifier model moved to {self.device}")
+            except Exception as e:
+                print(f"Warning: Could not set verifier device to {self.device}: {str(e)}")
+
+    def _run_model(self, inputs, tier='fast', **kwargs):
+        """
+        Запускает модель на устройстве, выбранном предохранителем.
+
+        Args:
+            inputs: Входные данные для модели
+            tier: Уровень каскада ('fast' - основная модель, 'verify' - большая модель)
+                  или имя дополнительной модели из add_model()
+            **kwargs: Дополнительные параметры вызова модели
+
+        Returns:
+            tuple: (results, device) - результаты и устройство, на котором они получены
+        """
+        if tier == 'fast':
+            model = self.model
+        elif tier == 'verify':
+            model = self.verifier_model
+        else:
+            model = self.model_slots[tier].model
+        counter = self.tier_counters['detect_' + tier]
+        # Счетчик общий для конвейеров: длительность замеряется локально, а не через start/stop
+        start_time = time.perf_counter()
+        try:
+            device = self.device_breaker.select_device()
+            try:
+                results = model(inputs, device=device, **kwargs)
+            except Exception as device_error:
+                fallback = self.device_breaker.fallback_device
+                if device == fallback:
+                    raise
+                self.device_breaker.record_failure(device, device_error)
+                if self.debug or self.device_breaker.state != DeviceCircuitBreaker.OPEN:
+                    print(f"Error using {device} for detection, falling back to {fallback}: {str(device_error)}")
+                return model(inputs, device=fallback, **kwargs), fallback
+
+            self.device_breaker.record_success(device)
+            return results, device
+        finally:
+            counter.record(time.perf_counter() - start_time)
+
+    def add_model(self, name, model, class_names=None, classes=None, interval=0.5, conf=None):
+        """
+        Добавляет дополнительную модель со своим набором классов.
+        
+        Классы модели сопоставляются глобальным ID по имени: классы COCO
+        получают свои ID, новые классы - ID после пользовательских.
+        
+        Args:
+            name: Имя модели
+            model: Загруженная модель YOLO
+            class_names: Словарь {ID класса в модели: имя} (по умолчанию model.names)
+            classes: Список ID классов модели для детекции (None - все)
+            interval: Интервал между запусками модели (сек)
+            conf: Порог достоверности (None - порог детектора)
+        
+        Returns:
+            ModelSlot: Созданный слот модели
+        """
+        if class_names is None:
+            class_names = dict(getattr(model, 'names', {}))
+        
+        # Сопоставляем классы модели глобальным ID по имени
+        class_map = {int(local_id): self._class_id_for_name(class_name, name)
+                     for local_id, class_name in class_names.items()}
+        
+        try:
+            model.to(self.device)
+        except Exception as e:
+            print(f"Warning: Could not set device for model '{name}' to {self.device}: {str(e)}")
+        
+        slot = ModelSlot(name, model, class_map, classes=classes, interval=interval, conf=conf)
+        self.model_slots[name] = slot
+        self.tier_counters['detect_' + name] = PerformanceCounter(f'Model {name}')
+        print(f"Model '{name}' added with classes: {', '.join(class_names.values())}")
+        return slot
+
+    def _class_id_for_name(self, class_name, source):
+        """
+        Возвращает глобальный ID класса по имени, регистрируя новый пользовательский класс при необходимости.
+        
+        Args:
+            class_name: Имя класса
+            source: Имя модели или плагина (для сообщения о новом классе)
+        """
+        all_classes = COCO_CLASSES.copy()
+        all_classes.update(self.custom_classes)
+        for class_id, known_name in all_classes.items():
+            if known_name.lower() == class_name.lower():
+                return class_id
+        
+        class_id = max(all_classes) + 1
+        self.custom_classes[class_id] = class_name
+        print(f"Adding custom class '{class_name}' with ID {class_id} from '{source}'")
+        return class_id
+
+    def add_plugin(self, plugin):
+        """
+        Добавляет быстрый классический детектор для одного класса.
+        
+        Класс плагина исключается из запуска нейросетей, чтобы они
+        обрабатывали только классы, которым действительно нужна сеть.
+        
+        Args:
+            plugin: Экземпляр FastDetector (см. utils/fast_detectors.py)
+        """
+        plugin.class_id = self._class_id_for_name(plugin.class_name, type(plugin).__name__)
+        self.plugins.append(plugin)
+        self.tier_counters.setdefault('detect_plugins', PerformanceCounter('Fast Plugins'))
+        print(f"Fast detector {type(plugin).__name__} added for class '{plugin.class_name}'")
+
+    def _cnn_classes(self, class_names):
+        """
+        Список ID классов модели, которые не обслуживаются быстрыми плагинами.
+        
+        Args:
+            class_names: Словарь {ID класса в модели: имя}
+        
+        Returns:
+            list: ID классов для параметра classes модели или None, если нужны все классы
+        """
+        if not self.plugins or not class_names:
+            return None
+        plugin_names = {plugin.class_name.lower() for plugin in self.plugins}
+        class_ids = [int(class_id) for class_id, class_name in class_names.items()
+                     if class_name.lower() not in plugin_names]
+        return class_ids if len(class_ids) < len(class_names) else None
+
+    def run_plugins(self, frame, state=None):
+        """
+        Запускает быстрые плагины, для которых подошло время.
+        
+        Все плагины работают на одном уменьшенном кадре.
+        
+        Args:
+            frame: Текущий кадр
+            state: Состояние кадров конвейера (DetectionState; None - состояние детектора)
+        
+        Returns:
+            bool: True, если хотя бы один плагин обновил свои объекты
+        """
+        if frame is None or not self.plugins:
+            return False
+        state = state or self.detection_state
+        
+        current_time = timing.now()
+        due_plugins = [plugin for plugin in self.plugins
+                       if plugin.is_due(current_time, state.extra_run_times.get(plugin, 0))]
+        if not due_plugins:
+            return False
+        
+        start_time = time.perf_counter()
+        try:
+            small_frame = get_pyramid(frame).level(self.plugin_width)
+            scale = small_frame.shape[1] / frame.shape[1]
+            for plugin in due_plugins:
+                state.extra_run_times[plugin] = current_time
+                try:
+                    detections = [(x1, y1, x2, y2, conf, plugin.class_id)
+                                  for x1, y1, x2, y2, conf in plugin.detect(small_frame, scale)]
+                    state.extra_objects[plugin] = self._objects_from_array(
+                        np.array(detections, dtype=np.float32).reshape(-1, 6), 1.0 / scale, 1.0 / scale
+                    )
+                except Exception as e:
+                    print(f"Error in fast detector for class '{plugin.class_name}': {str(e)}")
+        finally:
+            self.tier_counters['detect_plugins'].record(time.perf_counter() - start_time)
+        return True
+
+    def set_regions(self, active_region=None, exclusion_masks=()):
+        """
+        Задает рабочую область и маски исключения (см. DETECTION_PROFILES в config/settings.py).
+        
+        Пиксели вне рабочей области и под масками не попадают на вход моделей,
+        а детекции с центром в этих областях отбрасываются.
+        
+        Args:
+            active_region: Рабочая область (x1, y1, x2, y2) в пикселях экрана или None - весь кадр
+            exclusion_masks: Список областей (x1, y1, x2, y2), исключаемых из детекции
+        """
+        self.active_region = tuple(int(v) for v in active_region) if active_region else None
+        self.exclusion_masks = [tuple(int(v) for v in mask) for mask in exclusion_masks]
+        # Общий вход, уже построенный конвейерами для текущего кадра, относится к прежним областям
+        self.regions_version += 1
+        if self.active_region or self.exclusion_masks:
+            print(f"Detection regions: active={self.active_region}, masks={len(self.exclusion_masks)}")
+
+    def get_active_rect(self, frame):
+        """Рабочая область, ограниченная размерами кадра (x1, y1, x2, y2)"""
+        frame_height, frame_width = frame.shape[:2]
+        if self.active_region is None:
+            return 0, 0, frame_width, frame_height
+        x1, y1, x2, y2 = self.active_region
+        x1, y1 = max(0, min(x1, frame_width - 1)), max(0, min(y1, frame_height - 1))
+        return x1, y1, max(x1 + 1, min(x2, frame_width)), max(y1 + 1, min(y2, frame_height))
+
+    def is_excluded(self, box):
+        """Лежит ли центр рамки вне рабочей области или под маской исключения"""
+        center_x = (box[0] + box[2]) / 2
+        center_y = (box[1] + box[3]) / 2
+        if self.active_region is not None:
+            x1, y1, x2, y2 = self.active_region
+            if not (x1 <= center_x < x2 and y1 <= center_y < y2):
+                return True
+        return box_in_regions(box, self.exclusion_masks)
+
+    def _apply_masks(self, image, offset_x, offset_y, scale_x, scale_y):
+        """
+        Закрашивает области под масками исключения нейтральным серым (как отступы letterbox).
+        
+        Args:
+            image: Изображение для изменения (должно быть собственной копией)
+            offset_x, offset_y: Положение изображения на экране
+            scale_x, scale_y: Масштаб от изображения к экрану
+        """
+        image_height, image_width = image.shape[:2]
+        for x1, y1, x2, y2 in self.exclusion_masks:
+            mx1 = max(0, int((x1 - offset_x) / scale_x))
+            my1 = max(0, int((y1 - offset_y) / scale_y))
+            mx2 = min(image_width, int(math.ceil((x2 - offset_x) / scale_x)))
+            my2 = min(image_height, int(math.ceil((y2 - offset_y) / scale_y)))
+            if mx1 < mx2 and my1 < my2:
+                image[my1:my2, mx1:mx2] = 114
+
+    def _prepare_level(self, frame, width):
+        """
+        Уменьшает кадр до заданной ширины, вырезает рабочую область и закрашивает маски.
+        
+        Args:
+            frame: Исходный кадр
+            width: Ширина уменьшенного кадра (до вырезания рабочей области)
+        
+        Returns:
+            tuple: (изображение, scale_x, scale_y, offset_x, offset_y) - масштаб и
+                   смещение для перевода координат изображения в координаты экрана
+        """
+        original_height, original_width = frame.shape[:2]
+        image = get_pyramid(frame).level(width)
+        scale_x = original_width / image.shape[1]
+        scale_y = original_height / image.shape[0]
+        
+        # Вырезаем рабочую область в том же масштабе - вход модели становится меньше
+        x1, y1, x2, y2 = self.get_active_rect(frame)
+        crop_x1, crop_y1 = int(x1 / scale_x), int(y1 / scale_y)
+        crop_x2 = max(crop_x1 + 1, int(math.ceil(x2 / scale_x)))
+        crop_y2 = max(crop_y1 + 1, int(math.ceil(y2 / scale_y)))
+        image = image[crop_y1:crop_y2, crop_x1:crop_x2]
+        offset_x, offset_y = int(crop_x1 * scale_x), int(crop_y1 * scale_y)
+        
+        if self.exclusion_masks:
+            # Уровень пирамиды общий, поэтому маски накладываем на копию
+            image = image.copy()
+            self._apply_masks(image, offset_x, offset_y, scale_x, scale_y)
+        return image, scale_x, scale_y, offset_x, offset_y
+
+    def set_remote(self, client):
+        """
+        Подключает удаленный сервер инференса (см. utils/remote_inference.py).
+        
+        Args:
+            client: Экземпляр RemoteInferenceClient или None для отключения
+        """
+        self.remote = client
+        if client is not None:
+            self.tier_counters['detect_remote'] = client.counter
+        else:
+            self.tier_counters.pop('detect_remote', None)
+
+    def detect_remote(self, frame):
+        """
+        Отправляет кадр на удаленный сервер и забирает последний готовый результат.
+        
+        Запросы выполняются конвейером, поэтому результат обычно относится к
+        одному из предыдущих кадров - он возвращается вместе с этим кадром.
+        
+        Args:
+            frame: Текущий кадр
+        
+        Returns:
+            tuple: (объекты в координатах экрана, кадр, на котором они получены)
+                   или None, если нового результата нет
+        """
+        if self.remote is None or frame is None:
+            return None
+        
+        if self.remote.can_submit():
+            image, scale_x, scale_y, offset_x, offset_y = self._prepare_level(frame, self.remote.width)
+            self.remote.submit(image, context=(frame, scale_x, scale_y, offset_x, offset_y))
+        
+        result = self.remote.poll()
+        if result is None:
+            return None
+        detections, (source_frame, scale_x, scale_y, offset_x, offset_y) = result
+        objects = self._objects_from_array(detections, scale_x, scale_y, offset_x, offset_y)
+        objects.sort(key=lambda x: x['area'], reverse=True)
+        return objects, source_frame
+
+    def _prepare_shared_input(self, frame, state=None):
+        """
+        Готовит один вход для всех моделей текущего кадра.
+        
+        Кадр уменьшается до input_width, дополняется до размера, кратного 32,
+        и переводится в тензор BCHW (RGB, 0-1). Вход кешируется в состоянии
+        конвейера, поэтому повторный вызов для того же кадра возвращает уже
+        подготовленный тензор.
+        
+        Args:
+            frame: Текущий кадр
+            state: Состояние кадров конвейера (DetectionState; None - состояние детектора)
+        
+        Returns:
+            tuple: (тензор для моделей YOLO, (scale_x, scale_y, offset_x, offset_y)) - масштаб
+                   и смещение для перевода рамок входа в координаты кадра
+        """
+        state = state or self.detection_state
+        if (frame is state.shared_frame and state.shared_input is not None and
+                state.shared_regions_version == self.regions_version):
+            return state.shared_input, state.shared_geometry
+        
+        resized_frame, scale_x, scale_y, offset_x, offset_y = self._prepare_level(frame, self.input_width)
+        target_height, target_width = resized_frame.shape[:2]
+        
+        # Дополняем снизу и справа до размера, кратного шагу сети (как letterbox YOLO)
+        padded_height = int(math.ceil(target_height / 32.0)) * 32
+        padded_width = int(math.ceil(target_width / 32.0)) * 32
+        if padded_height != target_height or padded_width != target_width:
+            resized_frame = cv2.copyMakeBorder(resized_frame, 0, padded_height - target_height,
+                                               0, padded_width - target_width,
+                                               cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        
+        rgb = np.ascontiguousarray(resized_frame[:, :, ::-1].transpose(2, 0, 1))
+        state.shared_input = torch.from_numpy(rgb).unsqueeze(0).float().div_(255.0)
+        state.shared_frame = frame
+        state.shared_geometry = (scale_x, scale_y, offset_x, offset_y)
+        state.shared_regions_version = self.regions_version
+        return state.shared_input, state.shared_geometry
+
+    def run_model_slots(self, frame, state=None):
+        """
+        Запускает дополнительные модели, для которых подошло время.
+        
+        Args:
+            frame: Текущий кадр
+            state: Состояние кадров конвейера (DetectionState; None - состояние детектора)
+        
+        Returns:
+            bool: True, если хотя бы одна модель обновила свои объекты
+        """
+        if frame is None or not self.model_slots:
+            return False
+        state = state or self.detection_state
+        
+        current_time = timing.now()
+        updated = False
+        for name, slot in self.model_slots.items():
+            if not slot.is_due(current_time, state.extra_run_times.get(name, 0)):
+                continue
+            state.extra_run_times[name] = current_time
+            try:
+                shared_input, geometry = self._prepare_shared_input(frame, state)
+                conf = slot.conf if slot.conf is not None else self.conf
+                classes = slot.classes
+                plugin_classes = {plugin.class_id for plugin in self.plugins}
+                if plugin_classes:
+                    # Классы, обслуживаемые плагинами, сети не нужны
+                    classes = [local_id for local_id, global_id in slot.class_map.items()
+                               if global_id not in plugin_classes and (classes is None or local_id in classes)]
+                results, _ = self._run_model(shared_input, tier=name, conf=conf,
+                                             classes=classes, verbose=False)
+                
+                objects = []
+                for r in results:
+                    detections = self._results_to_array(r)
+                    # Переводим ID классов модели в глобальные ID
+                    detections[:, 5] = [slot.class_map.get(int(cls), int(cls)) for cls in detections[:, 5]]
+                    objects.extend(self._objects_from_array(detections, *geometry))
+                state.extra_objects[name] = objects
+                updated = True
+            except Exception as e:
+                print(f"Error in model '{name}' detection: {str(e)}")
+        return updated
+
+    def get_extra_objects(self, state=None):
+        """Возвращает последние объекты всех дополнительных моделей и быстрых плагинов конвейера"""
+        state = state or self.detection_state
+        objects = []
+        for name in self.model_slots:
+            objects.extend(state.extra_objects.get(name, []))
+        for plugin in self.plugins:
+            objects.extend(state.extra_objects.get(plugin, []))
+        return objects
+
+    def get_device_state(self):
+        """Возвращает состояние предохранителя устройства для статистики"""
+        return self.device_breaker.get_state()
+
+    def detect(self, frame, state=None):
         """
         Обнаружение людей на кадре.
         
         Args:
             frame: Входное изображение для обработки
+            state: Состояние кадров конвейера (DetectionState; None - состояние детектора)
             
         Returns:
             Результаты детекции или None в случае ошибки
@@ -109,45 +724,36 @@ class YOLOPersonDetector:
             
         # Запускаем детекцию
         try:
-            # Масштабируем кадр до меньшего размера для ускорения
-            original_height, original_width = frame.shape[:2]
-            target_width = 640
-            target_height = int(original_height * (target_width / original_width))
-            resized_frame = cv2.resize(frame, (target_width, target_height))
+            # Общий вход кадра: рамки переводятся в пиксели кадра тем же масштабом, что и в get_all_objects()
+            state = state or self.detection_state
+            shared_input, geometry = self._prepare_shared_input(frame, state)
             
             # Замеряем время инференса
-            start_time = time.time()
+            start_time = time.perf_counter()
             
-            # Используем CUDA, если доступно
-            device = self.device if self.cuda_available else "cpu"
-            
-            try:
-                # Пробуем использовать CUDA
-                results = self.model(resized_frame, conf=self.conf, classes=0, device=device)  # class 0 = person
-            except Exception as cuda_error:
-                print(f"Error using {device} for detection, falling back to CPU: {str(cuda_error)}")
-                # Если произошла ошибка с CUDA, используем CPU
-                results = self.model(resized_frame, conf=self.conf, classes=0, device="cpu")
+            # Используем CUDA, если доступно (с переключением на CPU через предохранитель)
+            results, device = self._run_model(shared_input, conf=self.conf, classes=0, verbose=False)  # class 0 = person
             
             # Рассчитываем время работы
-            inference_time = (time.time() - start_time) * 1000  # в мс
+            inference_time = (time.perf_counter() - start_time) * 1000  # в мс
             if self.debug:
                 print(f"Detection time: {inference_time:.2f}ms on {device}")
             
-            self.last_results = results
-            self.last_frame = frame
+            state.last_results = results
+            state.last_geometry = geometry
                 
             return results
         except Exception as e:
             print(f"Error in YOLO detection: {str(e)}")
             return None
             
-    def detect_all_objects(self, frame):
+    def detect_all_objects(self, frame, state=None):
         """
         Обнаружение всех объектов на кадре.
         
         Args:
             frame: Входное изображение для обработки
+            state: Состояние кадров конвейера (DetectionState; None - состояние детектора)
             
         Returns:
             Результаты детекции или None в случае ошибки
@@ -158,32 +764,24 @@ class YOLOPersonDetector:
         # Запускаем детекцию
         try:
             # Масштабируем кадр до меньшего размера для ускорения
-            original_height, original_width = frame.shape[:2]
-            target_width = 640
-            target_height = int(original_height * (target_width / original_width))
-            resized_frame = cv2.resize(frame, (target_width, target_height))
+            # Вход общий для всех моделей детектора на этом кадре
+            state = state or self.detection_state
+            shared_input, geometry = self._prepare_shared_input(frame, state)
             
             # Замеряем время инференса
-            start_time = time.time()
-            
-            # Используем CUDA, если доступно
-            device = self.device if self.cuda_available else "cpu"
+            start_time = time.perf_counter()
             
-            try:
-                # Пробуем использовать CUDA
-                results = self.model(resized_frame, conf=self.conf, device=device, verbose=False)
-            except Exception as cuda_error:
-                print(f"Error using {device} for detection, falling back to CPU: {str(cuda_error)}")
-                # Если произошла ошибка с CUDA, используем CPU
-                results = self.model(resized_frame, conf=self.conf, device="cpu", verbose=False)
+            # Используем CUDA, если доступно (с переключением на CPU через предохранитель)
+            results, device = self._run_model(shared_input, conf=self.conf, verbose=False,
+                                              classes=self._cnn_classes(getattr(self.model, 'names', None)))
             
             # Рассчитываем время работы
-            inference_time = (time.time() - start_time) * 1000  # в мс
+            inference_time = (time.perf_counter() - start_time) * 1000  # в мс
             if self.debug:
                 print(f"All objects detection time: {inference_time:.2f}ms on {device}")
             
-            self.last_results = results
-            self.last_frame = frame
+            state.last_results = results
+            state.last_geometry = geometry
             
             return results
         except Exception as e:
@@ -192,114 +790,274 @@ class YOLOPersonDetector:
             traceback.print_exc()
             return None
             
-    def get_all_objects(self, results=None):
+    def get_all_objects(self, results=None, state=None):
         """
         Получает рамки всех обнаруженных объектов.
         
         Args:
-            results: Результаты детекции из detect_all_objects()
+            results: Результаты детекции из detect_all_objects() (None - последние результаты конвейера)
+            state: Состояние кадров конвейера, в котором получены результаты
+                   (DetectionState; None - состояние детектора)
         
         Returns:
             list: список объектов с информацией о типе, местоположении и размере
         """
+        state = state or self.detection_state
         if results is None:
-            results = self.last_results
+            results = state.last_results
             
         if results is None or len(results) == 0:
             return []
-            
-        # Используем глобальный словарь классов COCO + пользовательские классы
-        coco_classes = COCO_CLASSES.copy()
-        coco_classes.update(self.custom_classes)
-            
-        # Находим все объекты
+        
+        # Вход модели дополнен до кратного 32, поэтому рамки переводятся в пиксели кадра
+        # масштабом уменьшения и смещением рабочей области, с которыми был построен вход
+        geometry = state.last_geometry if results is state.last_results else None
         objects = []
         for r in results:
-            if hasattr(r, 'boxes'):
-                for box in r.boxes:
-                    class_id = int(box.cls[0])
-                    class_name = coco_classes.get(class_id, f'Unknown ({class_id})')
-                    
-                    # Получаем координаты в процентах от размера кадра (0-1)
-                    # Это позволяет масштабировать их обратно к оригинальному размеру
-                    xyxy_normalized = box.xyxyn[0].tolist() 
-                    
-                    # Если у нас есть оригинальный кадр, масштабируем координаты
-                    if self.last_frame is not None:
-                        height, width = self.last_frame.shape[:2]
-                        x1 = int(xyxy_normalized[0] * width)
-                        y1 = int(xyxy_normalized[1] * height)
-                        x2 = int(xyxy_normalized[2] * width)
-                        y2 = int(xyxy_normalized[3] * height)
-                    else:
-                        # Используем абсолютные координаты, если нет оригинального кадра
-                        x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                        
-                    conf = float(box.conf[0])
-                    area = (x2 - x1) * (y2 - y1)
-                    
-                    # Создаем объект с информацией
-                    objects.append({
-                        'box': (x1, y1, x2, y2),
-                        'area': area,
-                        'confidence': conf,
-                        'class_id': class_id,
-                        'class_name': class_name
-                    })
+            detections = self._results_to_array(r)
+            if geometry is not None:
+                objects.extend(self._objects_from_array(detections, *geometry))
+            else:
+                # Используем абсолютные координаты, если вход модели неизвестен
+                objects.extend(self._objects_from_array(detections))
         
         # Сортируем по площади (от большего к меньшему)
         objects.sort(key=lambda x: x['area'], reverse=True)
         return objects
-            
-    def get_person_box(self, results=None):
+
+    @staticmethod
+    def _results_to_array(result):
         """
-        Получает рамку самого большого человека на кадре.
+        Переводит результат YOLO в компактный массив детекций.
         
         Args:
-            results: Результаты детекции
+            result: Один элемент результатов YOLO
         
         Returns:
-            tuple: (min_x, min_y, max_x, max_y) или None если люди не обнаружены
+            np.ndarray: Массив формы (N, 6) со строками (x1, y1, x2, y2, conf, class_id)
+                        в пикселях входного изображения модели
         """
-        if results is None:
-            results = self.last_results
+        boxes = getattr(result, 'boxes', None)
+        if boxes is None or len(boxes) == 0:
+            return np.zeros((0, 6), dtype=np.float32)
+        
+        xyxy = boxes.xyxy.cpu().numpy()
+        conf = boxes.conf.cpu().numpy().reshape(-1, 1)
+        cls = boxes.cls.cpu().numpy().reshape(-1, 1)
+        return np.hstack((xyxy, conf, cls)).astype(np.float32)
+
+    def _objects_from_array(self, detections, scale_x=1.0, scale_y=1.0, offset_x=0, offset_y=0):
+        """
+        Переводит массив детекций в список объектов в координатах экрана.
+        
+        Детекции вне рабочей области и под масками исключения отбрасываются.
+        
+        Args:
+            detections: Массив (N, 6) из _results_to_array()
+            scale_x, scale_y: Масштаб от входного изображения модели к экрану
+            offset_x, offset_y: Смещение входного изображения на экране (для областей кадра)
+        
+        Returns:
+            list: список объектов в формате get_all_objects()
+        """
+        # Используем глобальный словарь классов COCO + пользовательские классы
+        coco_classes = COCO_CLASSES.copy()
+        coco_classes.update(self.custom_classes)
+        
+        objects = []
+        for x1, y1, x2, y2, conf, cls in detections.tolist():
+            class_id = int(cls)
+            x1 = int(x1 * scale_x) + offset_x
+            y1 = int(y1 * scale_y) + offset_y
+            x2 = int(x2 * scale_x) + offset_x
+            y2 = int(y2 * scale_y) + offset_y
+            if (self.active_region is not None or self.exclusion_masks) and self.is_excluded((x1, y1, x2, y2)):
+                continue
             
-        if results is None or len(results) == 0:
+            # Создаем объект с информацией
+            objects.append({
+                'box': (x1, y1, x2, y2),
+                'area': (x2 - x1) * (y2 - y1),
+                'confidence': float(conf),
+                'class_id': class_id,
+                'class_name': coco_classes.get(class_id, f'Unknown ({class_id})')
+            })
+        return objects
+
+    def detect_regions(self, frame, regions, tier='fast'):
+        """
+        Обнаружение объектов только в заданных областях кадра.
+        
+        Области вырезаются из кадра, уменьшаются в том же масштабе, что и
+        полный кадр в detect_all_objects(), и обрабатываются одним пакетом.
+        
+        Args:
+            frame: Входное изображение
+            regions: Список областей (x1, y1, x2, y2) в пикселях кадра
+            tier: Уровень каскада, модель которого используется ('fast' или 'verify')
+        
+        Returns:
+            list: список объектов в координатах кадра (формат get_all_objects())
+                  или None в случае ошибки
+        """
+        if frame is None or self.model is None or not regions:
             return None
+        
+        try:
+            # Масштаб совпадает с полным проходом, чтобы объекты были того же размера
+            scale = min(1.0, self.input_width / frame.shape[1])
+            crops = []
+            for x1, y1, x2, y2 in regions:
+                crop = frame[y1:y2, x1:x2]
+                if scale < 1.0:
+                    crop = cv2.resize(crop, (max(1, int((x2 - x1) * scale)), max(1, int((y2 - y1) * scale))),
+                                      interpolation=cv2.INTER_AREA)
+                if self.exclusion_masks:
+                    if scale >= 1.0:
+                        crop = crop.copy()  # Без уменьшения crop - представление кадра
+                    self._apply_masks(crop, x1, y1, (x2 - x1) / crop.shape[1], (y2 - y1) / crop.shape[0])
+                crops.append(crop)
             
-        # Находим все боксы людей
-        boxes = []
-        for r in results:
-            if hasattr(r, 'boxes'):
-                for box in r.boxes:
-                    if box.cls[0] == 0:  # класс 0 - человек
-                        # Получаем координаты в процентах от размера кадра (0-1)
-                        # Это позволяет масштабировать их обратно к оригинальному размеру
-                        xyxy_normalized = box.xyxyn[0].tolist() 
-                        
-                        # Если у нас есть оригинальный кадр, масштабируем координаты
-                        if self.last_frame is not None:
-                            height, width = self.last_frame.shape[:2]
-                            x1 = int(xyxy_normalized[0] * width)
-                            y1 = int(xyxy_normalized[1] * height)
-                            x2 = int(xyxy_normalized[2] * width)
-                            y2 = int(xyxy_normalized[3] * height)
-                        else:
-                            # Используем абсолютные координаты, если нет оригинального кадра
-                            x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                            
-                        conf = float(box.conf[0])
-                        area = (x2 - x1) * (y2 - y1)
-                        boxes.append((x1, y1, x2, y2, area, conf))
-        
-        if not boxes:
+            # Размер входа модели - по наибольшей области, кратно 32
+            max_side = max(max(crop.shape[:2]) for crop in crops)
+            imgsz = min(self.input_width, int(math.ceil(max_side / 32.0)) * 32)
+            
+            start_time = time.perf_counter()
+            model = self.verifier_model if tier == 'verify' else self.model
+            results, device = self._run_model(crops, tier=tier, conf=self.conf, imgsz=imgsz, verbose=False,
+                                              classes=self._cnn_classes(getattr(model, 'names', None)))
+            inference_time = (time.perf_counter() - start_time) * 1000  # в мс
+            if self.debug:
+                print(f"Region detection time: {inference_time:.2f}ms for {len(crops)} regions on {device}")
+            
+            objects = []
+            for (x1, y1, x2, y2), crop, r in zip(regions, crops, results):
+                crop_height, crop_width = crop.shape[:2]
+                objects.extend(self._objects_from_array(
+                    self._results_to_array(r),
+                    (x2 - x1) / crop_width, (y2 - y1) / crop_height,
+                    x1, y1
+                ))
+            return objects
+        except Exception as e:
+            print(f"Error in YOLO region detection: {str(e)}")
             return None
             
-        # Выбираем бокс с наибольшей площадью
-        boxes.sort(key=lambda x: x[4], reverse=True)
-        x1, y1, x2, y2, _, _ = boxes[0]
+    def verify_objects(self, frame, objects, state=None):
+        """
+        Второй уровень каскада: проверка детекций быстрой модели большой моделью.
+        
+        Большая модель запускается по всему кадру раз в verify_interval секунд,
+        а в промежутках - только на областях с неуверенными детекциями.
+        Ее результаты подтверждают, добавляют или отклоняют объекты быстрой
+        модели и запоминаются до следующей полной проверки.
+        
+        Args:
+            frame: Кадр, на котором получены объекты
+            objects: Объекты быстрой модели (формат get_all_objects())
+            state: Состояние кадров конвейера с результатами проверки (DetectionState; None - состояние детектора)
+        
+        Returns:
+            list: Скорректированный список объектов
+        """
+        if self.verifier_model is None or frame is None:
+            return objects
+        state = state or self.detection_state
+        
+        current_time = timing.now()
+        self._expire_verification(state, current_time)
+        frame_height, frame_width = frame.shape[:2]
+        active_rect = self.get_active_rect(frame)
+        
+        if current_time - state.last_verify_time >= self.verify_interval:
+            # Полная проверка всей рабочей области кадра
+            regions = [active_rect]
+        else:
+            # Проверяем только неуверенные детекции, которые еще не были подтверждены
+            regions = []
+            for obj in objects:
+                if obj['confidence'] >= self.low_confidence:
+                    continue
+                if any(box_iou(obj['box'], box) >= 0.5 for box, _ in state.confirmed_boxes + state.suppressed_boxes):
+                    continue
+                x1, y1, x2, y2 = obj['box']
+                pad_x, pad_y = (x2 - x1) // 2, (y2 - y1) // 2
+                regions.append((max(0, x1 - pad_x), max(0, y1 - pad_y),
+                                min(frame_width, x2 + pad_x), min(frame_height, y2 + pad_y)))
+            regions = merge_regions(regions)
+        
+        if regions:
+            verifier_objects = self.detect_regions(frame, regions, tier='verify')
+            if verifier_objects is not None:
+                if regions[0] == active_rect:
+                    state.last_verify_time = current_time
+                self._record_verification(state, objects, verifier_objects, regions, current_time)
+        
+        return self._apply_verification(state, objects)
+
+    def _record_verification(self, state, objects, verifier_objects, regions, current_time):
+        """Запоминает подтвержденные, отклоненные и добавленные большой моделью объекты"""
+        expires = current_time + self.verify_interval
+        checked = [obj for obj in objects if box_in_regions(obj['box'], regions)]
+        
+        for obj in checked:
+            match = any(v['class_id'] == obj['class_id'] and box_iou(v['box'], obj['box']) >= 0.5
+                        for v in verifier_objects)
+            if match:
+                state.confirmed_boxes.append((obj['box'], expires))
+            else:
+                state.suppressed_boxes.append((obj['box'], expires))
+        
+        # Объекты, которые быстрая модель пропустила
+        state.verified_objects = [(v, t) for v, t in state.verified_objects
+                                  if not box_in_regions(v['box'], regions)]
+        for v in verifier_objects:
+            if not any(box_iou(v['box'], obj['box']) >= 0.5 for obj in checked):
+                state.verified_objects.append((dict(v, verified=True), expires))
+
+    def _apply_verification(self, state, objects):
+        """Применяет запомненные результаты большой модели к объектам быстрой модели"""
+        result = []
+        for obj in objects:
+            if any(box_iou(obj['box'], box) >= 0.5 for box, _ in state.suppressed_boxes):
+                continue
+            if any(box_iou(obj['box'], box) >= 0.5 for box, _ in state.confirmed_boxes):
+                obj = dict(obj, verified=True)
+            result.append(obj)
+        
+        for v, _ in state.verified_objects:
+            if not any(box_iou(v['box'], obj['box']) >= 0.5 for obj in result):
+                result.append(v)
+        
+        result.sort(key=lambda x: x['area'], reverse=True)
+        return result
+
+    def _expire_verification(self, state, current_time):
+        """Удаляет устаревшие результаты большой модели"""
+        state.verified_objects = [(v, t) for v, t in state.verified_objects if t > current_time]
+        state.confirmed_boxes = [(b, t) for b, t in state.confirmed_boxes if t > current_time]
+        state.suppressed_boxes = [(b, t) for b, t in state.suppressed_boxes if t > current_time]
+            
+    def get_person_box(self, results=None, state=None):
+        """
+        Получает рамку самого большого человека на кадре.
+        
+        Рамки берутся в пикселях кадра из get_all_objects(): нормированные
+        координаты YOLO относятся к дополненному входу модели, а не к кадру.
         
-        return (x1, y1, x2, y2)
+        Args:
+            results: Результаты детекции
+            state: Состояние кадров конвейера, в котором получены результаты (None - состояние детектора)
+        
+        Returns:
+            tuple: (min_x, min_y, max_x, max_y) или None если люди не обнаружены
+        """
+        people = [obj for obj in self.get_all_objects(results, state) if obj['class_id'] == 0]  # класс 0 - человек
+        if not people:
+            return None
+        
+        # Выбираем рамку с наибольшей площадью
+        return max(people, key=lambda obj: obj['area'])['box']
     
     def calculate_3d_position(self, box, screen_width, screen_height):
         """
@@ -357,7 +1115,74 @@ class YOLOPersonDetector:
         return target_x, target_y, distance, speed, direction
 
 
-def detect_objects(frame, perf_monitor, detector, screen_width, screen_height):
+class DetectionState:
+    """
+    Состояние detect_objects() между кадрами: кеш результатов, расписание
+    запусков, вспомогательные оценщики движения и все покадровое состояние
+    детектора (общий вход моделей, объекты дополнительных моделей и плагинов,
+    результаты проверки большой моделью).
+    
+    Каждый конвейер (или детектор) хранит свое состояние, поэтому несколько
+    конвейеров могут работать независимо в разных потоках, в том числе с одним детектором.
+    """
+    
+    def __init__(self):
+        # Хранение времени последнего полного анализа
+        self.last_full_detection_time = 0
+        self.detection_interval = 0.1  # 10 раз в секунду
+        self.cached_results = None
+        self.debug_log_counter = 0
+        self.debug_log_interval = 20  # Логировать каждый 20-й цикл детекции
+        self.results_fresh = False  # Получены ли результаты новым проходом YOLO
+        self.cached_objects = []
+        self.cached_main_objects = []  # Объекты основной модели (без дополнительных)
+        # Компенсация панорамирования камеры для кешированных рамок
+        self.motion_compensation = True
+        self.motion_estimator = GlobalMotionEstimator()
+        # Каскад: YOLO только по изменившимся областям, полный кадр раз в секунду
+        self.region_cascade = True
+        self.motion_proposer = MotionProposer()
+        self.full_frame_interval = 1.0
+        self.last_full_frame_time = 0
+        
+        # Общий вход моделей для текущего кадра и его геометрия (scale_x, scale_y, offset_x, offset_y)
+        self.shared_frame = None
+        self.shared_input = None
+        self.shared_geometry = (1.0, 1.0, 0, 0)
+        self.shared_regions_version = None
+        # Последние результаты основной модели и геометрия входа, на котором они получены
+        self.last_results = None
+        self.last_geometry = None
+        # Дополнительные модели и плагины: время последнего запуска и объекты (ключ - имя модели или плагин)
+        self.extra_run_times = {}
+        self.extra_objects = {}
+        # Результаты проверки большой моделью
+        self.last_verify_time = 0
+        self.verified_objects = []   # Объекты, найденные только большой моделью: (объект, время истечения)
+        self.confirmed_boxes = []    # Подтвержденные рамки: (рамка, время истечения)
+        self.suppressed_boxes = []   # Отклоненные рамки: (рамка, время истечения)
+
+
+def _compensate_motion(state, frame, objects):
+    """
+    Сдвигает рамки объектов вслед за панорамированием камеры с опорного кадра.
+    
+    Args:
+        state: Состояние детекции (DetectionState) с оценщиком движения
+        frame: Текущий кадр
+        objects: Объекты в координатах опорного кадра
+    
+    Returns:
+        list: Объекты в координатах текущего кадра
+    """
+    dx, dy = state.motion_estimator.estimate(frame)
+    if abs(dx) < 1 and abs(dy) < 1:
+        return objects
+    frame_height, frame_width = frame.shape[:2]
+    return [dict(obj, box=shift_box(obj['box'], dx, dy, frame_width, frame_height)) for obj in objects]
+
+
+def detect_objects(frame, perf_monitor, detector, screen_width, screen_height, state=None):
     """
     Обнаруживает объекты на заданном кадре используя YOLO.
     
@@ -367,6 +1192,7 @@ def detect_objects(frame, perf_monitor, detector, screen_width, screen_height):
         detector: Экземпляр YOLOPersonDetector
         screen_width: Ширина экрана
         screen_height: Высота экрана
+        state: Состояние детекции между кадрами (DetectionState); по умолчанию - состояние детектора
         
     Returns:
         Кортеж из (all_objects, results) где all_objects - список обнаруженных объектов,
@@ -380,31 +1206,110 @@ def detect_objects(frame, perf_monitor, detector, screen_width, screen_height):
         # Детекция с помощью YOLO
         perf_monitor.start('detection')
         
-        # Хранение времени последнего полного анализа
-        if not hasattr(detect_objects, "last_full_detection_time"):
-            detect_objects.last_full_detection_time = 0
-            detect_objects.detection_interval = 0.1  # 10 раз в секунду
-            detect_objects.cached_results = None
-            detect_objects.debug_log_counter = 0
-            detect_objects.debug_log_interval = 20  # Логировать каждый 20-й цикл детекции
+        if state is None:
+            state = detector.detection_state
         
-        current_time = time.time()
+        current_time = timing.now()
+        
+        # Статические маски детектора действуют и на поиск изменений, и на оценку движения
+        for helper in (state.motion_proposer, state.motion_estimator):
+            helper.active_region = detector.active_region
+            helper.exclusion_masks = detector.exclusion_masks
         
         # Уменьшаем частоту инференса для снижения нагрузки
-        # Делаем полный анализ только раз в 100 мс (10 Гц), а в остальное время используем кеш
-        if current_time - detect_objects.last_full_detection_time >= detect_objects.detection_interval:
-            # Запускаем детекцию всех объектов
-            results = detector.detect_all_objects(frame)
-            detect_objects.cached_results = results
-            detect_objects.last_full_detection_time = current_time
+        # Делаем анализ только раз в 100 мс (10 Гц), а в остальное время используем кеш
+        if current_time - state.last_full_detection_time >= state.detection_interval:
+            state.last_full_detection_time = current_time
+            reference_frame = frame
+            
+            # Удаленный инференс: кадр уходит на сервер, а результат приходит с задержкой
+            # конвейера; пока сервер не укладывается в бюджет задержки, работает локальная модель
+            remote_result = detector.detect_remote(frame) if detector.remote is not None else None
+            use_remote = detector.remote is not None and detector.remote.healthy
+            
+            # Каскад: сначала ищем изменившиеся области на уменьшенном кадре,
+            # полный проход выполняем периодически или при крупных изменениях
+            regions = None
+            if (state.region_cascade and not use_remote and
+                    current_time - state.last_full_frame_time < state.full_frame_interval):
+                regions = state.motion_proposer.propose(frame)
+            
+            region_objects = detector.detect_regions(frame, regions) if regions else None
+            
+            if use_remote:
+                if remote_result is not None:
+                    # Объекты получены на одном из предыдущих кадров
+                    state.cached_main_objects, reference_frame = remote_result
+                    state.cached_results = None
+                    state.last_full_frame_time = current_time
+                    state.results_fresh = True
+                else:
+                    state.results_fresh = False
+                results = state.cached_results
+            elif regions == []:
+                # Сцена не изменилась - кешированные объекты остаются актуальными
+                results = state.cached_results
+                state.results_fresh = False
+            elif region_objects is not None:
+                # Заменяем объекты в изменившихся областях результатами по этим областям
+                results = state.cached_results
+                # Кешированные рамки относятся к прежнему опорному кадру: переносим их на текущий
+                # до смены опорного кадра, иначе накопленный сдвиг камеры будет потерян
+                cached_main_objects = state.cached_main_objects
+                if state.motion_compensation and cached_main_objects:
+                    cached_main_objects = _compensate_motion(state, frame, cached_main_objects)
+                kept_objects = [obj for obj in cached_main_objects
+                                if not box_in_regions(obj['box'], regions)]
+                state.cached_main_objects = kept_objects + region_objects
+                state.results_fresh = True
+            else:
+                # Запускаем детекцию всех объектов по всему кадру
+                results = detector.detect_all_objects(frame, state)
+                state.cached_results = results
+                state.cached_main_objects = detector.get_all_objects(results, state)
+                state.last_full_frame_time = current_time
+                state.results_fresh = True
+            
+            if state.results_fresh:
+                # Второй уровень каскада: проверка большой моделью
+                state.cached_main_objects = detector.verify_objects(frame, state.cached_main_objects, state)
+                
+                # Дополнительные модели и быстрые плагины запускаются на тех же кадрах
+                # по своему расписанию; модели используют общий предобработанный вход
+                detector.run_model_slots(frame, state)
+                detector.run_plugins(frame, state)
+                state.cached_objects = sorted(
+                    state.cached_main_objects + detector.get_extra_objects(state),
+                    key=lambda x: x['area'], reverse=True
+                )
+            all_objects = state.cached_objects
+            
+            # Кадр детекции становится опорным для оценки движения камеры и поиска изменений
+            if state.results_fresh:
+                if state.motion_compensation:
+                    state.motion_estimator.set_reference(reference_frame)
+                if state.region_cascade:
+                    state.motion_proposer.set_reference(reference_frame)
+            
+            # Результат удаленного сервера сразу сдвигаем от его кадра к текущему
+            if state.motion_compensation and all_objects and reference_frame is not frame:
+                all_objects = _compensate_motion(state, frame, all_objects)
         else:
             # Используем кешированные результаты
-            results = detect_objects.cached_results
-        
-        # Получаем все объекты
-        all_objects = detector.get_all_objects(results)
+            results = state.cached_results
+            state.results_fresh = False
+            all_objects = state.cached_objects
+            
+            # Сдвигаем кешированные рамки вслед за панорамированием камеры
+            if state.motion_compensation and all_objects:
+                all_objects = _compensate_motion(state, frame, all_objects)
         
         perf_monitor.stop('detection')
+        perf_monitor.set_state('device', detector.get_device_state())
+        if detector.remote is not None:
+            perf_monitor.set_state('remote', detector.remote.get_state())
+        for name, counter in detector.tier_counters.items():
+            perf_monitor.add_counter(name, counter)
         
         # Список для хранения всех найденных объектов
         detected_objects = []
@@ -412,9 +1317,9 @@ def detect_objects(frame, perf_monitor, detector, screen_width, screen_height):
         # Если найдены объекты, обработаем их
         if all_objects:
             # Выводим информацию о количестве найденных объектов только каждый N-ый раз
-            detect_objects.debug_log_counter += 1
-            if detect_objects.debug_log_counter >= detect_objects.debug_log_interval:
-                detect_objects.debug_log_counter = 0
+            state.debug_log_counter += 1
+            if state.debug_log_counter >= state.debug_log_interval:
+                state.debug_log_counter = 0
                 print(f"Detected {len(all_objects)} objects")
             
             # Добавляем все объекты в список объектов для отображения
@@ -465,7 +1370,7 @@ def detect_objects(frame, perf_monitor, detector, screen_width, screen_height):
         return [], None
 
 
-def select_target(detected_objects, cursor_controller, training_active=False):
+def select_target(detected_objects, cursor_controller, training_active=False, context=None):
     """
     Выбирает целевой объект из списка обнаруженных объектов.
     
@@ -473,6 +1378,7 @@ def select_target(detected_objects, cursor_controller, training_active=False):
         detected_objects: Список обнаруженных объектов
         cursor_controller: Объект контроллера курсора с настройками таргетинга
         training_active: Флаг активности режима обучения
+        context: Контекст кадра (FrameContext); режим следования берется из него
         
     Returns:
         Кортеж из (target_box, target_x, target_y, target_distance, target_speed, target_direction)
@@ -497,7 +1403,8 @@ def select_target(detected_objects, cursor_controller, training_active=False):
             return None, None, None, None, 0.0, 0.0
         
         # Определяем целевой объект в зависимости от режима
-        if cursor_controller.following_enabled:
+        following_enabled = context.following_enabled if context is not None else cursor_controller.following_enabled
+        if following_enabled:
             # Режим следования за ближайшим объектом
             nearest_object = min(valid_objects, key=lambda obj: obj['distance'])
             target_box = nearest_object['box']
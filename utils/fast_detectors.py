@@ -0,0 +1,179 @@
+"""
+Модуль быстрых классических детекторов для простых классов объектов.
+Предоставляет плагины для YOLOPersonDetector на основе порогов HSV и сопоставления шаблонов.
+"""
+
+import cv2
+import numpy as np
+
+from utils.motion import box_iou
+
+
+class FastDetector:
+    """
+    Базовый класс плагина быстрого детектора.
+
+    Плагин работает на уменьшенном кадре и возвращает рамки одного класса.
+    Класс, обслуживаемый плагином, исключается из запуска нейросети.
+    """
+
+    def __init__(self, class_name, interval=0.1):
+        """
+        Инициализирует плагин.
+
+        Args:
+            class_name: Имя класса, который обнаруживает плагин
+            interval: Интервал между запусками плагина (сек)
+        """
+        self.class_name = class_name
+        self.interval = interval
+
+    def is_due(self, current_time, last_run_time):
+        """Пора ли запускать плагин (время последнего запуска хранит DetectionState конвейера)"""
+        return current_time - last_run_time >= self.interval
+
+    def detect(self, small_frame, scale):
+        """
+        Обнаруживает объекты на уменьшенном кадре.
+
+        Args:
+            small_frame: Уменьшенный кадр (BGR)
+            scale: Масштаб уменьшенного кадра относительно экрана
+
+        Returns:
+            list: Список (x1, y1, x2, y2, confidence) в пикселях уменьшенного кадра
+        """
+        raise NotImplementedError
+
+
+class HSVThresholdDetector(FastDetector):
+    """Детектор по диапазону цвета в пространстве HSV с поиском контуров"""
+
+    def __init__(self, class_name, lower, upper, min_area=30, max_objects=10, interval=0.1):
+        """
+        Инициализирует HSV-детектор.
+
+        Args:
+            class_name: Имя класса
+            lower: Нижняя граница (H, S, V)
+            upper: Верхняя граница (H, S, V)
+            min_area: Минимальная площадь контура в пикселях уменьшенного кадра
+            max_objects: Максимальное количество возвращаемых объектов
+            interval: Интервал между запусками (сек)
+        """
+        super().__init__(class_name, interval)
+        self.lower = np.array(lower, dtype=np.uint8)
+        self.upper = np.array(upper, dtype=np.uint8)
+        self.min_area = min_area
+        self.max_objects = max_objects
+        self.kernel = np.ones((3, 3), np.uint8)
+
+    def detect(self, small_frame, scale):
+        hsv = cv2.cvtColor(small_frame, cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, self.lower, self.upper)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
+
+        contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        detections = []
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area < self.min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            # Достоверность - доля заполнения рамки контуром
+            detections.append((x, y, x + w, y + h, min(1.0, area / float(w * h))))
+
+        detections.sort(key=lambda d: (d[2] - d[0]) * (d[3] - d[1]), reverse=True)
+        return detections[:self.max_objects]
+
+
+class TemplateMatchDetector(FastDetector):
+    """Детектор по шаблону изображения на нескольких масштабах"""
+
+    def __init__(self, class_name, template, scales=(0.75, 1.0, 1.25), threshold=0.8,
+                 max_objects=5, interval=0.1):
+        """
+        Инициализирует детектор по шаблону.
+
+        Args:
+            class_name: Имя класса
+            template: Путь к изображению шаблона или массив (BGR), вырезанный из кадра в разрешении экрана
+            scales: Масштабы шаблона для поиска
+            threshold: Минимальное значение нормированной корреляции
+            max_objects: Максимальное количество возвращаемых объектов
+            interval: Интервал между запусками (сек)
+        """
+        super().__init__(class_name, interval)
+        if isinstance(template, str):
+            template = cv2.imread(template)
+            if template is None:
+                raise ValueError(f"Cannot read template image for class '{class_name}'")
+        if template.ndim == 3:
+            template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+
+        self.template = template
+        self.scales = scales
+        self.threshold = threshold
+        self.max_objects = max_objects
+        # Шаблоны, уменьшенные под масштаб рабочего кадра (строятся один раз)
+        self.templates = []
+        self.templates_scale = None
+
+    def detect(self, small_frame, scale):
+        gray = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY) if small_frame.ndim == 3 else small_frame
+
+        if self.templates_scale != scale:
+            self.templates = []
+            for template_scale in self.scales:
+                factor = template_scale * scale
+                scaled = cv2.resize(self.template, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+                if min(scaled.shape[:2]) >= 4:
+                    self.templates.append(scaled)
+            self.templates_scale = scale
+
+        candidates = []
+        for template in self.templates:
+            height, width = template.shape[:2]
+            if gray.shape[0] < height or gray.shape[1] < width:
+                continue
+            scores = cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
+            # Вокруг совпадения порог превышают сотни соседних пикселей, поэтому берем
+            # только пики: каждый найденный максимум гасится вместе с окрестностью размера шаблона
+            for _ in range(self.max_objects):
+                _, max_score, _, (x, y) = cv2.minMaxLoc(scores)
+                if max_score < self.threshold:
+                    break
+                candidates.append((x, y, x + width, y + height, float(max_score)))
+                scores[max(0, y - height // 2):y + height // 2 + 1,
+                       max(0, x - width // 2):x + width // 2 + 1] = -1.0
+
+        # Подавление пересекающихся совпадений разных масштабов (жадный NMS по пикам)
+        candidates.sort(key=lambda d: d[4], reverse=True)
+        detections = []
+        for candidate in candidates:
+            if all(box_iou(candidate, kept) < 0.3 for kept in detections):
+                detections.append(candidate)
+                if len(detections) >= self.max_objects:
+                    break
+        return detections
+
+
+def create_fast_detector(class_name, config):
+    """
+    Создает плагин по словарю настроек (см. FAST_DETECTOR_CONFIG в config/settings.py).
+
+    Args:
+        class_name: Имя класса
+        config: Словарь с ключом 'type' ('hsv' или 'template') и параметрами плагина
+
+    Returns:
+        FastDetector: Созданный плагин
+    """
+    params = dict(config)
+    detector_type = params.pop('type')
+    if detector_type == 'hsv':
+        return HSVThresholdDetector(class_name, **params)
+    if detector_type == 'template':
+        return TemplateMatchDetector(class_name, **params)
+    raise ValueError(f"Unknown fast detector type '{detector_type}' for class '{class_name}'")
+
@@ -0,0 +1,106 @@
+"""
+Модуль горячих клавиш.
+Клавиши регистрируются один раз как обработчики хука клавиатуры, которые
+только ставят команды в очередь. Цикл кадров разбирает очередь без
+ожидания, поэтому опрос клавиш и паузы после переключений не нужны.
+"""
+
+import queue
+import threading
+import time
+
+try:
+    import keyboard
+except ImportError:
+    # Без keyboard команды можно ставить только через push() (тесты, замеры)
+    keyboard = None
+
+
+class HotkeyDispatcher:
+    """
+    Диспетчер горячих клавиш с очередью команд.
+
+    Хук клавиатуры срабатывает только на переход клавиши из отпущенного
+    состояния в нажатое (автоповтор игнорируется), а dispatch() дополнительно
+    подавляет повторы одной команды чаще, чем раз в debounce секунд.
+    """
+
+    def __init__(self, debounce=0.2):
+        """
+        Args:
+            debounce: Минимальный интервал между выполнениями одной команды (сек)
+        """
+        self.debounce = debounce
+        self.commands = queue.SimpleQueue()
+        self.handlers = {}  # Команда -> обработчик
+        self.last_dispatch = {}  # Команда -> время последнего выполнения
+        self.pressed = set()  # Клавиши, нажатые сейчас (для отсечения автоповтора)
+        self.lock = threading.Lock()
+        self.hooks = []
+
+    def register(self, keys, command, handler):
+        """
+        Регистрирует горячую клавишу.
+
+        Args:
+            keys: Имя клавиши или список имен (например, 'f5' или ['+', 'plus'])
+            command: Имя команды
+            handler: Функция без аргументов, выполняемая в потоке dispatch()
+        """
+        if keyboard is None:
+            raise RuntimeError("HotkeyDispatcher requires the keyboard package")
+        self.handlers[command] = handler
+        if isinstance(keys, str):
+            keys = [keys]
+        for key in keys:
+            self.hooks.append(keyboard.hook_key(key, lambda event, key=key: self._on_key_event(key, command, event)))
+
+    def _on_key_event(self, key, command, event):
+        """Обработчик хука клавиатуры (вызывается в потоке хука)"""
+        with self.lock:
+            if event.event_type != keyboard.KEY_DOWN:
+                self.pressed.discard(key)
+                return
+            if key in self.pressed:
+                return
+            self.pressed.add(key)
+        self.push(command)
+
+    def push(self, command):
+        """Ставит команду в очередь"""
+        self.commands.put((command, time.perf_counter()))
+
+    def dispatch(self):
+        """
+        Выполняет команды из очереди без ожидания.
+
+        Returns:
+            list: Выполненные команды
+        """
+        dispatched = []
+        while True:
+            try:
+                command, timestamp = self.commands.get_nowait()
+            except queue.Empty:
+                break
+            # Программный антидребезг: повтор команды раньше debounce игнорируется
+            if timestamp - self.last_dispatch.get(command, float('-inf')) < self.debounce:
+                continue
+            self.last_dispatch[command] = timestamp
+            handler = self.handlers.get(command)
+            if handler is not None:
+                try:
+                    handler()
+                except Exception as e:
+                    print(f"Error handling hotkey command '{command}': {str(e)}")
+            dispatched.append(command)
+        return dispatched
+
+    def close(self):
+        """Снимает хуки клавиатуры"""
+        for hook in self.hooks:
+            try:
+                keyboard.unhook(hook)
+            except Exception:
+                pass
+        self.hooks = []
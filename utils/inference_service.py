@@ -0,0 +1,490 @@
+"""
+Модуль локального сервиса инференса YOLO.
+Сервис загружает модель один раз и обслуживает несколько процессов main15.py,
+объединяя запросы, пришедшие в течение короткого окна, в один пакет.
+
+Запуск сервиса:
+    python -m utils.inference_service --model models/yolo11n.pt
+"""
+
+import argparse
+import itertools
+import json
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+import torch
+
+from utils.protocol import array_from_buffer, array_header, attach_shared_memory, recv_message, send_message
+
+DEFAULT_PORT = 8765
+
+
+def _detections_array(result):
+    """Переводит результат YOLO в массив (N, 6): x1, y1, x2, y2, conf, class_id"""
+    boxes = getattr(result, 'boxes', None)
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0, 6), dtype=np.float32)
+    return boxes.data[:, :6].cpu().numpy().astype(np.float32)
+
+
+class _Request:
+    """Запрос клиента, ожидающий выполнения в пакете"""
+
+    def __init__(self, connection, request_id, kind, inputs, options):
+        self.connection = connection
+        self.request_id = request_id
+        self.kind = kind
+        self.inputs = inputs
+        self.options = options
+        self.size = inputs.shape[0] if kind == 'tensor' else len(inputs)
+        # Запросы объединяются в пакет только при одинаковых параметрах и размере входа
+        shape = tuple(inputs.shape[1:]) if kind == 'tensor' else None
+        self.key = (kind, shape, json.dumps(options, sort_keys=True))
+
+
+class ServiceConnection:
+    """Подключение клиента к сервису"""
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.send_lock = threading.Lock()
+        self.shared_blocks = {}
+
+    def send(self, header, payload=b''):
+        with self.send_lock:
+            send_message(self.sock, header, payload)
+
+    def shared_buffer(self, name):
+        """
+        Буфер общей памяти клиента (подключение кешируется по имени).
+
+        Клиент держит один блок и при увеличении кадра заменяет его блоком с новым
+        именем, поэтому при появлении нового имени прежнее подключение закрывается.
+        """
+        block = self.shared_blocks.get(name)
+        if block is None:
+            self._close_shared()
+            block = attach_shared_memory(name)
+            self.shared_blocks[name] = block
+        return block.buf
+
+    def _close_shared(self):
+        for block in self.shared_blocks.values():
+            try:
+                block.close()
+            except Exception:
+                pass
+        self.shared_blocks.clear()
+
+    def close(self):
+        self._close_shared()
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+
+class InferenceServer:
+    """
+    Резидентный сервис инференса с динамическим пакетированием.
+
+    Каждое подключение обслуживается своим потоком приема, а модель
+    используется только одним потоком пакетирования. Запросы с одинаковыми
+    параметрами, пришедшие в течение batch_window, выполняются одним вызовом модели.
+    """
+
+    def __init__(self, model, host='127.0.0.1', port=DEFAULT_PORT, device=None,
+                 batch_window=0.004, max_batch=8):
+        """
+        Инициализирует сервис.
+
+        Args:
+            model: Загруженная модель YOLO
+            host: Адрес для подключений (по умолчанию только локальные)
+            port: Порт сервиса
+            device: Устройство для инференса ('cuda:0', 'cpu' или None - автоматически)
+            batch_window: Время ожидания дополнительных запросов для пакета (сек)
+            max_batch: Максимальное количество изображений в пакете
+        """
+        self.model = model
+        self.host = host
+        self.port = port
+        self.device = device or ("cuda:0" if torch.cuda.is_available() else "cpu")
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+
+        self.requests = queue.Queue()
+        self.backlog = deque()  # Запросы, не вошедшие в предыдущий пакет
+        self.running = False
+        self.server_socket = None
+
+        # Статистика пакетирования
+        self.batches = 0
+        self.images = 0
+        self.last_stats_time = time.perf_counter()
+
+        self.model.to(self.device)
+
+    def serve_forever(self):
+        """Принимает подключения до вызова shutdown()"""
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen()
+        self.running = True
+
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        print(f"Inference service listening on {self.host}:{self.port} (device {self.device})")
+
+        try:
+            while self.running:
+                try:
+                    sock, address = self.server_socket.accept()
+                except OSError:
+                    break
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                threading.Thread(target=self._client_loop, args=(ServiceConnection(sock, address),),
+                                 daemon=True).start()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Останавливает сервис"""
+        if not self.running:
+            return
+        self.running = False
+        self.requests.put(None)
+        try:
+            # На Linux close() не прерывает accept() в другом потоке, shutdown() - прерывает
+            self.server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.server_socket.close()
+        except Exception:
+            pass
+        print("Inference service stopped")
+
+    def _client_loop(self, connection):
+        """Принимает запросы одного клиента"""
+        print(f"Client connected: {connection.address}")
+        try:
+            while self.running:
+                header, payload = recv_message(connection.sock)
+                message_type = header.get('type')
+                if message_type == 'hello':
+                    connection.send({'type': 'hello', 'names': self.model.names, 'device': self.device})
+                elif message_type == 'predict':
+                    try:
+                        self.requests.put(self._parse_request(connection, header, payload))
+                    except Exception as e:
+                        connection.send({'type': 'error', 'id': header.get('id'), 'message': str(e)})
+                else:
+                    connection.send({'type': 'error', 'id': header.get('id'),
+                                     'message': f"Unknown message type '{message_type}'"})
+        except (ConnectionError, OSError):
+            pass
+        except Exception as e:
+            print(f"Error in inference client loop: {str(e)}")
+        finally:
+            connection.close()
+            print(f"Client disconnected: {connection.address}")
+
+    def _parse_request(self, connection, header, payload):
+        """Восстанавливает входные данные запроса из сообщения или общей памяти"""
+        buffer = connection.shared_buffer(header['shm']) if header.get('shm') else payload
+        arrays = [array_from_buffer(description, buffer, description['offset'])
+                  for description in header['arrays']]
+
+        if header['kind'] == 'tensor':
+            # Тензор передается как uint8 (исходный кадр 0-255), копируем из буфера клиента
+            inputs = torch.from_numpy(np.array(arrays[0]))
+        else:
+            inputs = [np.array(array) for array in arrays]
+        return _Request(connection, header['id'], header['kind'], inputs, header.get('options', {}))
+
+    def _next_request(self, timeout=None):
+        """Следующий запрос: сначала из отложенных, затем из очереди"""
+        if self.backlog:
+            return self.backlog.popleft()
+        try:
+            return self.requests.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _batch_loop(self):
+        """Собирает запросы в пакеты и выполняет их"""
+        while self.running:
+            first = self._next_request()
+            if first is None:
+                continue
+
+            batch = [first]
+            size = first.size
+            deferred = []
+            # Окно пакета отсчитывается по монотонным часам: перевод системных часов его не растянет
+            deadline = time.perf_counter() + self.batch_window
+            while size < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                request = self._next_request(timeout)
+                if request is None:
+                    break
+                if request.key == first.key and size + request.size <= self.max_batch:
+                    batch.append(request)
+                    size += request.size
+                else:
+                    deferred.append(request)
+            self.backlog.extend(deferred)
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        """Выполняет пакет запросов одним вызовом модели и рассылает ответы"""
+        first = batch[0]
+        options = dict(first.options)
+        try:
+            if first.kind == 'tensor':
+                inputs = torch.cat([request.inputs for request in batch]).to(self.device)
+                inputs = inputs.float().div_(255.0)
+            else:
+                inputs = [image for request in batch for image in request.inputs]
+            results = self.model(inputs, device=self.device, verbose=False, **options)
+        except Exception as e:
+            print(f"Error in batched inference: {str(e)}")
+            for request in batch:
+                self._reply(request, {'type': 'error', 'id': request.request_id, 'message': str(e)})
+            return
+
+        index = 0
+        for request in batch:
+            detections = [_detections_array(result) for result in results[index:index + request.size]]
+            index += request.size
+            descriptions = []
+            offset = 0
+            for array in detections:
+                descriptions.append(dict(array_header(array), offset=offset))
+                offset += array.nbytes
+            payload = b''.join(array.tobytes() for array in detections)
+            self._reply(request, {'type': 'result', 'id': request.request_id, 'arrays': descriptions}, payload)
+
+        self.batches += 1
+        self.images += index
+        current_time = time.perf_counter()
+        if current_time - self.last_stats_time >= 10.0:
+            print(f"Inference service: {self.batches} batches, "
+                  f"{self.images / max(1, self.batches):.2f} images per batch")
+            self.batches = 0
+            self.images = 0
+            self.last_stats_time = current_time
+
+    @staticmethod
+    def _reply(request, header, payload=b''):
+        try:
+            request.connection.send(header, payload)
+        except Exception:
+            # Клиент отключился - ответ больше не нужен
+            pass
+
+
+class InferenceClient:
+    """
+    Клиент локального сервиса инференса.
+
+    Кадры передаются через общую память (use_shared_memory=True) или в
+    самом сообщении; результаты возвращаются массивами детекций.
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, use_shared_memory=True, timeout=5.0):
+        """
+        Подключается к сервису.
+
+        Args:
+            host: Адрес сервиса
+            port: Порт сервиса
+            use_shared_memory: Передавать кадры через общую память (только для локального сервиса)
+            timeout: Таймаут ожидания ответа (сек)
+
+        Raises:
+            OSError: Сервис недоступен
+        """
+        self.host = host
+        self.port = port
+        self.use_shared_memory = use_shared_memory
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.shared_block = None
+
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        send_message(self.sock, {'type': 'hello'})
+        header, _ = recv_message(self.sock)
+        self.names = {int(class_id): name for class_id, name in header['names'].items()}
+        self.device = header.get('device')
+        print(f"Connected to inference service at {host}:{port} (device {self.device})")
+
+    def predict(self, source, **options):
+        """
+        Выполняет инференс в сервисе.
+
+        Args:
+            source: Тензор BCHW (RGB, 0-1) или изображение/список изображений (BGR, uint8)
+            **options: Параметры модели (conf, classes, imgsz)
+
+        Returns:
+            list: Массивы детекций (N, 6) для каждого изображения
+
+        Raises:
+            RuntimeError: Ошибка инференса в сервисе
+            ConnectionError: Соединение с сервисом потеряно
+        """
+        if isinstance(source, torch.Tensor):
+            kind = 'tensor'
+            # Вход получен из кадра uint8, поэтому перевод обратно в 0-255 не теряет точности
+            arrays = [source.detach().mul(255.0).round_().to(torch.uint8).cpu().numpy()]
+        else:
+            kind = 'images'
+            arrays = [np.ascontiguousarray(image) for image in
+                      (source if isinstance(source, (list, tuple)) else [source])]
+
+        descriptions = []
+        offset = 0
+        for array in arrays:
+            descriptions.append(dict(array_header(array), offset=offset))
+            offset += array.nbytes
+
+        with self.lock:
+            request_id = next(self.ids)
+            header = {'type': 'predict', 'id': request_id, 'kind': kind,
+                      'arrays': descriptions, 'options': self._clean_options(options)}
+            if self.use_shared_memory:
+                header['shm'] = self._write_shared(arrays, offset)
+                send_message(self.sock, header)
+            else:
+                send_message(self.sock, header, b''.join(array.tobytes() for array in arrays))
+
+            response, payload = recv_message(self.sock)
+
+        if response.get('type') == 'error':
+            raise RuntimeError(f"Inference service error: {response.get('message')}")
+        return [array_from_buffer(description, payload, description['offset'])
+                for description in response['arrays']]
+
+    def _write_shared(self, arrays, size):
+        """Записывает массивы в блок общей памяти, при необходимости увеличивая его"""
+        if self.shared_block is None or self.shared_block.size < size:
+            self._release_shared()
+            self.shared_block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        offset = 0
+        for array in arrays:
+            target = np.ndarray(array.shape, dtype=array.dtype, buffer=self.shared_block.buf, offset=offset)
+            target[...] = array
+            offset += array.nbytes
+        return self.shared_block.name
+
+    def _release_shared(self):
+        if self.shared_block is not None:
+            self.shared_block.close()
+            self.shared_block.unlink()
+            self.shared_block = None
+
+    @staticmethod
+    def _clean_options(options):
+        """Оставляет параметры, которые имеют смысл для сервиса, в формате JSON"""
+        cleaned = {}
+        for name in ('conf', 'iou', 'imgsz', 'max_det'):
+            if options.get(name) is not None:
+                cleaned[name] = options[name]
+        classes = options.get('classes')
+        if classes is not None:
+            cleaned['classes'] = [int(classes)] if np.isscalar(classes) else [int(c) for c in classes]
+        return cleaned
+
+    def close(self):
+        """Закрывает соединение и освобождает общую память"""
+        with self.lock:
+            self._release_shared()
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+
+
+class ServiceModel:
+    """
+    Модель с интерфейсом YOLO, выполняющая инференс в сервисе.
+
+    Передается в YOLOPersonDetector вместо локальной модели: возвращает
+    объекты ultralytics Results, поэтому остальной код не меняется.
+    """
+
+    def __init__(self, client):
+        """
+        Args:
+            client: Подключенный InferenceClient (или совместимый клиент)
+        """
+        self.client = client
+        self.names = dict(client.names)
+
+    def to(self, device):
+        """Устройство выбирает сервис - локальный перенос не нужен"""
+        return self
+
+    def __call__(self, source, device=None, verbose=False, **options):
+        from ultralytics.engine.results import Results
+
+        detections = self.client.predict(source, **options)
+        if isinstance(source, torch.Tensor):
+            # Рамки в координатах входного тензора; изображение для Results не нужно
+            shapes = [tuple(source.shape[2:])] * source.shape[0]
+        else:
+            images = source if isinstance(source, (list, tuple)) else [source]
+            shapes = [image.shape[:2] for image in images]
+
+        results = []
+        for (height, width), array in zip(shapes, detections):
+            stand_in = np.broadcast_to(np.uint8(0), (height, width, 3))
+            results.append(Results(stand_in, path='', names=self.names, boxes=torch.from_numpy(np.array(array))))
+        return results
+
+
+def main():
+    """Запуск сервиса из командной строки"""
+    parser = argparse.ArgumentParser(description='Reign of Bots - Local inference service')
+    parser.add_argument('--model', default='models/yolo11n.pt', help='YOLO model to serve')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--batch-window', type=float, default=4.0,
+                        help='Time to wait for more requests before running a batch (ms)')
+    parser.add_argument('--max-batch', type=int, default=8, help='Maximum images per batch')
+    parser.add_argument('--no-cuda', action='store_true', help='Run inference on CPU')
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+
+    try:
+        model = YOLO(args.model)
+    except Exception as e:
+        print(f"Error loading model {args.model}: {str(e)}")
+        sys.exit(1)
+
+    server = InferenceServer(model, host=args.host, port=args.port,
+                             device="cpu" if args.no_cuda else None,
+                             batch_window=args.batch_window / 1000.0, max_batch=args.max_batch)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
 """
 Модуль для работы с фильтром Калмана.
-Предоставляет класс для сглаживания координат объектов.
+Предоставляет классы для сглаживания координат объектов: скалярный фильтр,
+фильтр рамки цели и векторизованный банк фильтров для всех объектов кадра.
 """
 
+import numpy as np
+
 class KalmanFilter:
     """Реализация простого фильтра Калмана для сглаживания координат"""
     
@@ -127,4 +130,237 @@ class BoxFilter:
         center_x = (x_min + x_max) // 2
         center_y = (y_min + y_max) // 2
         
-        return center_x, center_y 
\ No newline at end of file
+        return center_x, center_y
+
+
+class KalmanFilterBank:
+    """
+    Банк фильтров Калмана с моделью постоянной скорости для N рамок.
+    
+    Состояние строки: центр (cx, cy) и размер (w, h) рамки и их скорости
+    (пикс/с). Четыре измерения независимы, поэтому ковариация каждого
+    хранится тремя числами (p_pos, p_cross, p_vel). Все состояния лежат в
+    непрерывных массивах, и predict/update выполняются одной векторной
+    операцией для всех строк. Строки добавляются и удаляются по мере
+    появления и исчезновения треков (удаленная строка заменяется последней).
+    """
+    
+    def __init__(self, capacity=32, process_noise=2000.0, measurement_noise=4.0, velocity_variance=1e4):
+        """
+        Инициализирует банк фильтров.
+        
+        Args:
+            capacity: Начальная емкость (массивы растут вдвое при заполнении)
+            process_noise: Спектральная плотность шума ускорения (пикс^2/с^3, больше = быстрее реакция)
+            measurement_noise: Дисперсия измерения (пикс^2)
+            velocity_variance: Начальная дисперсия скорости новой строки
+        """
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.velocity_variance = velocity_variance
+        self.count = 0
+        self.ids = []  # Номер строки -> идентификатор трека
+        self.rows = {}  # Идентификатор трека -> номер строки
+        self.next_id = 0
+        self._allocate(max(1, capacity))
+    
+    def _allocate(self, capacity):
+        """Выделяет массивы заданной емкости, сохраняя активные строки"""
+        count = self.count
+        arrays = {
+            'position': np.zeros((capacity, 4)),  # cx, cy, w, h
+            'velocity': np.zeros((capacity, 4)),
+            'p_pos': np.zeros((capacity, 4)),
+            'p_cross': np.zeros((capacity, 4)),
+            'p_vel': np.zeros((capacity, 4)),
+            'misses': np.zeros(capacity, dtype=np.int32),  # Шагов track() подряд без измерения
+        }
+        for name, array in arrays.items():
+            if count:
+                array[:count] = getattr(self, name)[:count]
+            setattr(self, name, array)
+        self.capacity = capacity
+    
+    def __len__(self):
+        return self.count
+    
+    def __contains__(self, track_id):
+        return track_id in self.rows
+    
+    @staticmethod
+    def _to_measurements(boxes):
+        """Рамки (x_min, y_min, x_max, y_max) -> измерения (cx, cy, w, h)"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        sizes = boxes[:, 2:] - boxes[:, :2]
+        return np.hstack((boxes[:, :2] + sizes / 2, sizes))
+    
+    def add(self, box, track_id=None):
+        """
+        Добавляет строку для нового трека.
+        
+        Args:
+            box: Рамка (x_min, y_min, x_max, y_max)
+            track_id: Идентификатор трека (None - следующий свободный номер)
+            
+        Returns:
+            Идентификатор трека
+        """
+        if track_id is None:
+            track_id = self.next_id
+            self.next_id += 1
+        if track_id in self.rows:
+            raise ValueError(f"Track {track_id} already exists")
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        
+        row = self.count
+        self.position[row] = self._to_measurements(box)[0]
+        self.velocity[row] = 0.0
+        self.p_pos[row] = self.measurement_noise
+        self.p_cross[row] = 0.0
+        self.p_vel[row] = self.velocity_variance
+        self.misses[row] = 0
+        self.ids.append(track_id)
+        self.rows[track_id] = row
+        self.count += 1
+        return track_id
+    
+    def remove(self, track_id):
+        """Удаляет строку трека, переставляя на ее место последнюю строку"""
+        row = self.rows.pop(track_id)
+        last = self.count - 1
+        if row != last:
+            for array in (self.position, self.velocity, self.p_pos, self.p_cross, self.p_vel, self.misses):
+                array[row] = array[last]
+            moved_id = self.ids[last]
+            self.ids[row] = moved_id
+            self.rows[moved_id] = row
+        self.ids.pop()
+        self.count -= 1
+    
+    def clear(self):
+        """Удаляет все строки"""
+        self.count = 0
+        self.ids = []
+        self.rows = {}
+    
+    def predict(self, dt):
+        """
+        Продвигает состояние всех строк на dt секунд.
+        
+        Args:
+            dt: Время с предыдущего предсказания (сек)
+        """
+        n = self.count
+        if not n or dt <= 0:
+            return
+        q = self.process_noise
+        p_pos, p_cross, p_vel = self.p_pos[:n], self.p_cross[:n], self.p_vel[:n]
+        self.position[:n] += self.velocity[:n] * dt
+        # P = F P F^T + Q для F = [[1, dt], [0, 1]] и белого шума ускорения
+        p_pos += dt * (2 * p_cross + dt * p_vel) + q * dt ** 3 / 3
+        p_cross += dt * p_vel + q * dt ** 2 / 2
+        p_vel += q * dt
+    
+    def update(self, track_ids, boxes):
+        """
+        Корректирует строки измерениями (одна векторная операция для всех треков).
+        
+        Args:
+            track_ids: Идентификаторы треков
+            boxes: Рамки (x_min, y_min, x_max, y_max) в том же порядке
+        """
+        if not len(track_ids):
+            return
+        rows = np.fromiter((self.rows[track_id] for track_id in track_ids), dtype=np.intp, count=len(track_ids))
+        measurements = self._to_measurements(boxes)
+        
+        p_pos, p_cross, p_vel = self.p_pos[rows], self.p_cross[rows], self.p_vel[rows]
+        innovation = measurements - self.position[rows]
+        s = p_pos + self.measurement_noise
+        gain_pos = p_pos / s
+        gain_vel = p_cross / s
+        
+        self.position[rows] += gain_pos * innovation
+        self.velocity[rows] += gain_vel * innovation
+        self.p_vel[rows] = p_vel - gain_vel * p_cross
+        self.p_pos[rows] = (1 - gain_pos) * p_pos
+        self.p_cross[rows] = (1 - gain_pos) * p_cross
+        self.misses[rows] = 0
+    
+    def track(self, boxes, dt, max_distance=100.0, max_misses=5):
+        """
+        Один шаг сопровождения всех объектов кадра: предсказание, сопоставление
+        рамок с треками по ближайшему центру, обновление, создание новых треков
+        и удаление потерянных. Пропуски считаются только в track(), поэтому между
+        проходами детектора треки можно продвигать вызовом predict().
+        
+        Args:
+            boxes: Рамки кадра (x_min, y_min, x_max, y_max)
+            dt: Время с предыдущего кадра (сек)
+            max_distance: Максимальное расстояние между центрами для сопоставления (пикс)
+            max_misses: Число шагов track() без измерения, после которого трек удаляется
+            
+        Returns:
+            list: Идентификаторы треков для каждой рамки кадра (в том же порядке)
+        """
+        self.predict(dt)
+        self.misses[:self.count] += 1
+        measurements = self._to_measurements(boxes)
+        track_ids = [None] * len(measurements)
+        
+        n = self.count
+        if n and len(measurements):
+            # Матрица расстояний между центрами (кадр x треки), жадное сопоставление по возрастанию
+            distances = np.linalg.norm(measurements[:, None, :2] - self.position[None, :n, :2], axis=2)
+            box_indices, rows = np.nonzero(distances <= max_distance)
+            order = np.argsort(distances[box_indices, rows], kind='stable')
+            used_rows = set()
+            for box_index, row in zip(box_indices[order].tolist(), rows[order].tolist()):
+                if track_ids[box_index] is not None or row in used_rows:
+                    continue
+                track_ids[box_index] = self.ids[row]
+                used_rows.add(row)
+        
+        matched = [index for index, track_id in enumerate(track_ids) if track_id is not None]
+        if matched:
+            self.update([track_ids[index] for index in matched], np.asarray(boxes, dtype=np.float64).reshape(-1, 4)[matched])
+        
+        # Удаляем потерянные треки до добавления новых, чтобы не сдвигать их строки
+        for row in np.nonzero(self.misses[:self.count] > max_misses)[0][::-1]:
+            self.remove(self.ids[row])
+        for index, track_id in enumerate(track_ids):
+            if track_id is None:
+                track_ids[index] = self.add(boxes[index])
+        return track_ids
+    
+    def boxes(self, track_ids=None):
+        """
+        Отфильтрованные рамки.
+        
+        Args:
+            track_ids: Идентификаторы треков (None - все строки в порядке хранения)
+            
+        Returns:
+            np.ndarray: Массив (n, 4) рамок (x_min, y_min, x_max, y_max)
+        """
+        position = self.position[self._select(track_ids)]
+        half = position[:, 2:] / 2
+        return np.hstack((position[:, :2] - half, position[:, :2] + half))
+    
+    def velocities(self, track_ids=None):
+        """
+        Оценки скорости.
+        
+        Args:
+            track_ids: Идентификаторы треков (None - все строки в порядке хранения)
+            
+        Returns:
+            np.ndarray: Массив (n, 4) скоростей центра и размера (vx, vy, vw, vh) в пикс/с
+        """
+        return self.velocity[self._select(track_ids)].copy()
+    
+    def _select(self, track_ids):
+        if track_ids is None:
+            return slice(0, self.count)
+        return np.fromiter((self.rows[track_id] for track_id in track_ids), dtype=np.intp, count=len(track_ids))
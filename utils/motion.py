@@ -0,0 +1,335 @@
+"""
+Модуль для оценки движения изображения между кадрами.
+Предоставляет оценку глобального сдвига сцены (панорамирование камеры)
+и поиск изменившихся областей для каскадной детекции.
+"""
+
+import cv2
+import numpy as np
+
+from utils.pyramid import get_pyramid
+
+
+class GlobalMotionEstimator:
+    """
+    Оценка глобального сдвига кадра методом фазовой корреляции.
+
+    Опорный кадр задается при каждом запуске детектора, после чего для
+    любого следующего кадра можно получить сдвиг сцены в пикселях экрана.
+    Расчет выполняется на сильно уменьшенном изображении в оттенках серого,
+    поэтому занимает доли миллисекунды.
+    """
+
+    def __init__(self, width=160, min_response=0.1, max_shift_ratio=0.25):
+        """
+        Инициализирует оценщик движения.
+
+        Args:
+            width: Ширина уменьшенного изображения для фазовой корреляции
+            min_response: Минимальный отклик корреляции, при котором сдвиг считается надежным
+            max_shift_ratio: Максимальный допустимый сдвиг в долях от размера кадра
+        """
+        self.width = width
+        self.min_response = min_response
+        self.max_shift_ratio = max_shift_ratio
+
+        self.reference = None
+        self.window = None
+        self.scale = 1.0
+        self.last_shift = (0.0, 0.0)
+        self.last_response = 0.0
+        # Статические области (HUD, панели оверлея), которые не участвуют в оценке
+        self.active_region = None
+        self.exclusion_masks = []
+
+    def set_reference(self, frame):
+        """
+        Задает опорный кадр (кадр, на котором выполнялась детекция).
+
+        Args:
+            frame: Опорный кадр (BGR)
+        """
+        if frame is None:
+            self.reference = None
+            return
+
+        self.reference = self._prepare(frame)
+        self.last_shift = (0.0, 0.0)
+        self.last_response = 1.0
+
+    def estimate(self, frame):
+        """
+        Оценивает сдвиг сцены относительно опорного кадра.
+
+        Args:
+            frame: Текущий кадр (BGR)
+
+        Returns:
+            tuple: (dx, dy) - сдвиг содержимого кадра в пикселях экрана
+        """
+        if self.reference is None or frame is None:
+            return 0.0, 0.0
+
+        current = self._prepare(frame)
+        if current.shape != self.reference.shape:
+            return 0.0, 0.0
+
+        (shift_x, shift_y), response = cv2.phaseCorrelate(self.reference, current, self.window)
+        self.last_response = response
+
+        # При слабом отклике (смена сцены, сильный шум) оставляем прошлую оценку
+        height, width = current.shape[:2]
+        if (response < self.min_response or
+                abs(shift_x) > width * self.max_shift_ratio or
+                abs(shift_y) > height * self.max_shift_ratio):
+            return self.last_shift
+
+        self.last_shift = (shift_x * self.scale, shift_y * self.scale)
+        return self.last_shift
+
+    def _prepare(self, frame):
+        """Уменьшает кадр и переводит его в формат для фазовой корреляции"""
+        self.scale = frame.shape[1] / self.width
+
+        # Уменьшенный кадр берется из общей пирамиды кадра
+        small = get_pyramid(frame).level(self.width, gray=True)
+
+        if self.window is None or self.window.shape != small.shape:
+            self.window = cv2.createHanningWindow((small.shape[1], small.shape[0]), cv2.CV_32F)
+
+        small = np.float32(small)
+        if self.active_region is not None or self.exclusion_masks:
+            # Неподвижные элементы интерфейса тянут оценку к нулевому сдвигу - заменяем их средним
+            regions = self.exclusion_masks + outside_regions(self.active_region, frame.shape[1], frame.shape[0])
+            fill_regions(small, regions, self.scale, float(small.mean()))
+        return small
+
+
+class MotionProposer:
+    """
+    Дешевый детектор изменений для каскадной детекции.
+
+    Сравнивает уменьшенный кадр с опорным (кадром последней детекции) и
+    предлагает области, в которых произошли изменения. YOLO затем
+    запускается только на этих областях.
+    """
+
+    def __init__(self, width=320, diff_threshold=25, min_area=12, padding=0.5,
+                 min_region_size=96, max_coverage=0.35, max_regions=6):
+        """
+        Инициализирует детектор изменений.
+
+        Args:
+            width: Ширина уменьшенного изображения для поиска изменений
+            diff_threshold: Порог разности яркости (0-255)
+            min_area: Минимальная площадь области изменений (в пикселях уменьшенного кадра)
+            padding: Расширение найденной области в долях от ее размера
+            min_region_size: Минимальный размер стороны области в пикселях экрана
+            max_coverage: Максимальная доля кадра, покрытая областями; при превышении нужен полный проход
+            max_regions: Максимальное количество областей; при превышении нужен полный проход
+        """
+        self.width = width
+        self.diff_threshold = diff_threshold
+        self.min_area = min_area
+        self.padding = padding
+        self.min_region_size = min_region_size
+        self.max_coverage = max_coverage
+        self.max_regions = max_regions
+
+        self.reference = None
+        self.kernel = np.ones((3, 3), np.uint8)
+        # Изменения вне рабочей области и под масками исключения не учитываются
+        self.active_region = None
+        self.exclusion_masks = []
+
+    def set_reference(self, frame):
+        """
+        Задает опорный кадр (кадр, на котором выполнялась детекция).
+
+        Args:
+            frame: Опорный кадр (BGR)
+        """
+        self.reference = self._prepare(frame) if frame is not None else None
+
+    def propose(self, frame):
+        """
+        Находит области кадра, изменившиеся с момента последней детекции.
+
+        Args:
+            frame: Текущий кадр (BGR)
+
+        Returns:
+            list: Список областей (x1, y1, x2, y2) в пикселях экрана,
+                  пустой список, если изменений нет, или None, если нужен полный проход
+        """
+        if self.reference is None or frame is None:
+            return None
+
+        current = self._prepare(frame)
+        if current.shape != self.reference.shape:
+            return None
+
+        # Маска изменившихся пикселей
+        diff = cv2.absdiff(self.reference, current)
+        _, mask = cv2.threshold(diff, self.diff_threshold, 255, cv2.THRESH_BINARY)
+        frame_height, frame_width = frame.shape[:2]
+        scale = frame_width / self.width
+        if self.active_region is not None or self.exclusion_masks:
+            regions = self.exclusion_masks + outside_regions(self.active_region, frame_width, frame_height)
+            fill_regions(mask, regions, scale, 0)
+        mask = cv2.dilate(mask, self.kernel, iterations=2)
+
+        contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        rects = [cv2.boundingRect(c) for c in contours if cv2.contourArea(c) >= self.min_area]
+        if not rects:
+            return []
+
+        # Переводим области в координаты экрана с расширением
+        regions = []
+        for x, y, w, h in rects:
+            pad_x = w * self.padding
+            pad_y = h * self.padding
+            center_x = (x + w / 2) * scale
+            center_y = (y + h / 2) * scale
+            half_w = max((w + 2 * pad_x) * scale, self.min_region_size) / 2
+            half_h = max((h + 2 * pad_y) * scale, self.min_region_size) / 2
+            regions.append((max(0, int(center_x - half_w)), max(0, int(center_y - half_h)),
+                            min(frame_width, int(center_x + half_w)), min(frame_height, int(center_y + half_h))))
+
+        regions = merge_regions(regions)
+
+        coverage = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions) / float(frame_width * frame_height)
+        if len(regions) > self.max_regions or coverage > self.max_coverage:
+            return None
+
+        return regions
+
+    def _prepare(self, frame):
+        """Берет уменьшенный кадр в оттенках серого из пирамиды и слегка размывает"""
+        small = get_pyramid(frame).level(self.width, gray=True)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+
+def merge_regions(regions):
+    """
+    Объединяет пересекающиеся области в охватывающие прямоугольники.
+
+    Args:
+        regions: Список областей (x1, y1, x2, y2)
+
+    Returns:
+        list: Список непересекающихся областей
+    """
+    merged = list(regions)
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        while merged:
+            x1, y1, x2, y2 = merged.pop()
+            i = 0
+            while i < len(merged):
+                ox1, oy1, ox2, oy2 = merged[i]
+                if ox1 < x2 and x1 < ox2 and oy1 < y2 and y1 < oy2:
+                    x1, y1, x2, y2 = min(x1, ox1), min(y1, oy1), max(x2, ox2), max(y2, oy2)
+                    merged.pop(i)
+                    changed = True
+                else:
+                    i += 1
+            result.append((x1, y1, x2, y2))
+        merged = result
+    return merged
+
+
+def outside_regions(active_region, frame_width, frame_height):
+    """
+    Возвращает области кадра вне рабочей области.
+
+    Args:
+        active_region: Рабочая область (x1, y1, x2, y2) или None - весь кадр
+        frame_width, frame_height: Размеры кадра
+
+    Returns:
+        list: До четырех областей (x1, y1, x2, y2), дополняющих рабочую область до кадра
+    """
+    if active_region is None:
+        return []
+    x1, y1, x2, y2 = active_region
+    regions = [(0, 0, frame_width, y1), (0, y2, frame_width, frame_height),
+               (0, y1, x1, y2), (x2, y1, frame_width, y2)]
+    return [(rx1, ry1, rx2, ry2) for rx1, ry1, rx2, ry2 in regions if rx1 < rx2 and ry1 < ry2]
+
+
+def fill_regions(image, regions, scale, value):
+    """
+    Закрашивает области экрана на уменьшенном изображении.
+
+    Args:
+        image: Уменьшенное изображение (изменяется на месте)
+        regions: Список областей (x1, y1, x2, y2) в пикселях экрана
+        scale: Масштаб от изображения к экрану
+        value: Значение для закрашивания
+    """
+    height, width = image.shape[:2]
+    for x1, y1, x2, y2 in regions:
+        sx1, sy1 = max(0, int(x1 / scale)), max(0, int(y1 / scale))
+        sx2, sy2 = min(width, int(np.ceil(x2 / scale))), min(height, int(np.ceil(y2 / scale)))
+        if sx1 < sx2 and sy1 < sy2:
+            image[sy1:sy2, sx1:sx2] = value
+
+
+def box_iou(box_a, box_b):
+    """
+    Вычисляет отношение площади пересечения рамок к площади их объединения (IoU).
+    
+    Args:
+        box_a, box_b: Рамки (x_min, y_min, x_max, y_max)
+    
+    Returns:
+        float: IoU от 0 до 1
+    """
+    inter_w = min(box_a[2], box_b[2]) - max(box_a[0], box_b[0])
+    inter_h = min(box_a[3], box_b[3]) - max(box_a[1], box_b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    union = ((box_a[2] - box_a[0]) * (box_a[3] - box_a[1]) +
+             (box_b[2] - box_b[0]) * (box_b[3] - box_b[1]) - inter)
+    return inter / union if union > 0 else 0.0
+
+
+def box_in_regions(box, regions):
+    """
+    Проверяет, лежит ли центр рамки внутри одной из областей.
+
+    Args:
+        box: Рамка (x_min, y_min, x_max, y_max)
+        regions: Список областей (x1, y1, x2, y2)
+
+    Returns:
+        bool: True, если центр рамки попадает в одну из областей
+    """
+    center_x = (box[0] + box[2]) / 2
+    center_y = (box[1] + box[3]) / 2
+    return any(x1 <= center_x < x2 and y1 <= center_y < y2 for x1, y1, x2, y2 in regions)
+
+
+def shift_box(box, dx, dy, frame_width, frame_height):
+    """
+    Сдвигает рамку на заданное смещение с ограничением размерами кадра.
+
+    Args:
+        box: Рамка (x_min, y_min, x_max, y_max)
+        dx, dy: Смещение в пикселях
+        frame_width, frame_height: Размеры кадра
+
+    Returns:
+        tuple: Сдвинутая рамка
+    """
+    x1, y1, x2, y2 = box
+    dx = int(round(dx))
+    dy = int(round(dy))
+    return (max(0, min(x1 + dx, frame_width - 1)),
+            max(0, min(y1 + dy, frame_height - 1)),
+            max(0, min(x2 + dx, frame_width)),
+            max(0, min(y2 + dy, frame_height)))
@@ -1,5 +1,6 @@
 """
 Модуль для мониторинга производительности и замера времени выполнения операций.
+Длительности измеряются монотонными часами высокого разрешения (time.perf_counter).
 """
 
 import time
@@ -16,21 +17,25 @@ class PerformanceCounter:
         self.last_time = 0.0
         self.current_time = 0.0
         self.avg_time = 0.0
-        self.last_reset_time = time.time()
+        self.last_reset_time = time.perf_counter()
         
     def start(self):
         """Начать замер времени операции"""
-        self.last_time = time.time()
+        self.last_time = time.perf_counter()
         
     def stop(self):
         """Остановить замер времени и обновить статистику"""
+        self.record(time.perf_counter() - self.last_time)
+        
+    def record(self, duration):
+        """Учесть длительность, измеренную вне start/stop (например, задержку асинхронного запроса)"""
         try:
-            self.current_time = time.time() - self.last_time
+            self.current_time = duration
             self.total_time += self.current_time
             self.count += 1
             
             # Обновляем среднее каждую секунду
-            current_time = time.time()
+            current_time = time.perf_counter()
             if current_time - self.last_reset_time >= 1.0:
                 if self.count > 0:
                     self.avg_time = self.total_time / self.count
@@ -38,7 +43,7 @@ class PerformanceCounter:
                 self.count = 0
                 self.last_reset_time = current_time
         except Exception as e:
-            print(f"Error in PerformanceCounter.stop for {self.name}: {str(e)}")
+            print(f"Error in PerformanceCounter.record for {self.name}: {str(e)}")
 
 class PerformanceMonitor:
     """
@@ -54,8 +59,10 @@ class PerformanceMonitor:
             'overlay': PerformanceCounter('Overlay Update'),
             'cursor': PerformanceCounter('Cursor Control')
         }
-        self.last_reset = time.time()
+        self.last_reset = time.perf_counter()
         self.reset_interval = 1.0
+        # Текстовые состояния компонентов (например, устройство инференса)
+        self.states = {}
         
     def start(self, counter_name):
         """Начать замер времени для указанной операции"""
@@ -67,9 +74,28 @@ class PerformanceMonitor:
         if counter_name in self.counters:
             self.counters[counter_name].stop()
         
+    def add_counter(self, name, counter=None):
+        """
+        Добавить счетчик, если его еще нет (например, счетчик отдельного уровня детектора).
+        
+        Returns:
+            PerformanceCounter: Зарегистрированный счетчик
+        """
+        if name not in self.counters:
+            self.counters[name] = counter if counter is not None else PerformanceCounter(name)
+        return self.counters[name]
+        
+    def set_state(self, name, value):
+        """Сохранить текущее состояние компонента для вывода вместе со статистикой"""
+        self.states[name] = value
+        
+    def get_states(self):
+        """Получить состояния компонентов"""
+        return dict(self.states)
+        
     def get_stats(self):
         """Получить статистику по всем счетчикам"""
-        current_time = time.time()
+        current_time = time.perf_counter()
         if current_time - self.last_reset >= self.reset_interval:
             self.last_reset = current_time
         return {name: counter for name, counter in self.counters.items()} 
\ No newline at end of file
@@ -0,0 +1,475 @@
+"""
+Модуль конвейера обработки кадров.
+Объединяет захват экрана, детекцию, выбор и сопровождение цели и управление
+курсором в одном объекте без глобального состояния.
+"""
+
+from collections import namedtuple
+from threading import Thread
+
+from utils import timing
+from utils.detector import DEFAULT_IGNORED_CLASSES, DetectionState, detect_objects, select_target
+from utils.kalman import KalmanFilterBank
+from utils.performance import PerformanceMonitor
+from utils.tracker import TargetTracker
+
+# Снимок состояния системы на один кадр. Создается один раз в начале обработки
+# кадра и передается детекции, выбору цели, управлению и оверлею, поэтому все
+# этапы видят одно время захвата, геометрию экрана, позицию курсора и режимы.
+FrameContext = namedtuple('FrameContext', [
+    'frame_id', 'timestamp', 'screen_width', 'screen_height', 'cursor_position',
+    'relative_mode', 'following_enabled', 'cursor_control_enabled', 'attack_enabled',
+    'training_active', 'fine_tuning_active'
+])
+
+
+class TargetingSettings:
+    """
+    Настройки выбора цели для конвейера без управления курсором (режим --headless).
+    Повторяет атрибуты CursorController, которые использует select_target.
+    """
+
+    def __init__(self, ignored_classes=None, following_enabled=False):
+        """
+        Args:
+            ignored_classes: Классы, которые не выбираются целью (None - DEFAULT_IGNORED_CLASSES)
+            following_enabled: Выбирать ближайший объект вместо самого крупного
+        """
+        self.ignored_classes = list(DEFAULT_IGNORED_CLASSES if ignored_classes is None else ignored_classes)
+        self.following_enabled = following_enabled
+
+
+class Pipeline:
+    """
+    Конвейер: захват -> детекция -> выбор цели -> сопровождение -> управление.
+
+    Все состояние (источник кадров, детектор, кеш детекции, трекер, режим
+    обучения, метрики) принадлежит экземпляру. Несколько конвейеров могут
+    работать одновременно в своих потоках, например по одному на монитор,
+    а отдельные этапы можно замерять изолированно.
+
+    Покадровое состояние детектора хранится в detection_state конвейера,
+    поэтому конвейеры могут использовать один детектор: общими остаются
+    только модели, предохранитель устройства и счетчики задержки. Конвейер
+    с удаленным инференсом (detector.set_remote) должен иметь свой детектор.
+    """
+
+    def __init__(self, detector, capture=None, monitor_number=0, cursor_controller=None,
+                 perf_monitor=None, tracker=None, trainer_factory=None, cursor_position=None, publisher=None,
+                 targeting=None, name='main'):
+        """
+        Инициализирует конвейер.
+
+        Args:
+            detector: Экземпляр YOLOPersonDetector
+            capture: Источник кадров - объект с методом capture() (None - ScreenCapture,
+                     создается при первом захвате в потоке конвейера)
+            monitor_number: Номер монитора для ScreenCapture по умолчанию
+            cursor_controller: CursorController для выбора цели и управления (None - без управления)
+            perf_monitor: PerformanceMonitor конвейера (None - создается новый)
+            tracker: Трекер цели между запусками YOLO (None - TargetTracker по умолчанию)
+            trainer_factory: Функция, создающая YOLOTrainer для сбора данных (None - обучение недоступно)
+            cursor_position: Функция, возвращающая позицию курсора для контекста кадра
+                             (None - позиция от исполнителя контроллера курсора)
+            publisher: DetectionPublisher для внешних потребителей результатов (None - без публикации)
+            targeting: Настройки выбора цели без управления (TargetingSettings), используются,
+                       когда cursor_controller не задан (без обоих цель не выбирается)
+            name: Имя конвейера для сообщений
+        """
+        self.detector = detector
+        self.capture_source = capture
+        self.monitor_number = monitor_number
+        self.cursor_controller = cursor_controller
+        self.targeting = targeting
+        self.perf_monitor = perf_monitor or PerformanceMonitor()
+        self.tracker = tracker or TargetTracker()
+        self.detection_state = DetectionState()
+        self.name = name
+
+        # Фильтры Калмана для всех объектов кадра: сглаженные рамки и скорости объектов.
+        # Идентификаторы треков относятся к объектам последнего прохода детектора (в том же порядке)
+        self.object_filters = KalmanFilterBank()
+        self.object_track_ids = []
+        self.filter_time = None
+
+        # Режим сбора данных для обучения
+        self.trainer_factory = trainer_factory
+        self.cursor_position = cursor_position
+        self.trainer = None
+        self.training_active = False
+        self.fine_tuning_active = False
+
+        # Обработчики, вызываемые после обработки каждого кадра:
+        # hook(frame, detected_objects, target_x, target_y)
+        self.hooks = []
+
+        # Публикация результатов каждого кадра
+        self.publisher = publisher
+        self.frame_count = 0
+        # Время захвата последнего кадра (timing.now()) для снимка цели
+        self.capture_time = None
+        # Контекст последнего обработанного кадра (FrameContext)
+        self.context = None
+
+        # Последний результат (кортеж process()) и работа в отдельном потоке
+        self.last_result = None
+        self.running = False
+        self.thread = None
+
+    def add_hook(self, hook):
+        """Добавляет обработчик результата кадра (например, отрисовку)"""
+        self.hooks.append(hook)
+
+    def grab(self):
+        """
+        Захватывает кадр из источника конвейера.
+
+        Returns:
+            np.ndarray: Кадр (BGR) или None в случае ошибки
+        """
+        if self.capture_source is None:
+            from utils.capture import ScreenCapture
+            self.capture_source = ScreenCapture(self.monitor_number)
+
+        self.perf_monitor.start('capture')
+        try:
+            self.capture_time = timing.now()
+            return self.capture_source.capture()
+        finally:
+            self.perf_monitor.stop('capture')
+
+    def step(self):
+        """
+        Захватывает и обрабатывает один кадр.
+
+        Returns:
+            tuple: Результат process() или None, если кадр не получен
+        """
+        frame = self.grab()
+        if frame is None:
+            return None
+        return self.process(frame)
+
+    def make_context(self, frame, capture_time=None):
+        """
+        Создает контекст кадра: единственный за кадр запрос позиции курсора и снимок режимов.
+        
+        Args:
+            frame: Кадр (BGR) или None
+            capture_time: Время захвата кадра (None - текущее время)
+            
+        Returns:
+            FrameContext: Контекст кадра
+        """
+        # Кадр захватывается со всего виртуального экрана, поэтому его размер совпадает с экраном
+        if frame is not None and frame.size:
+            screen_height, screen_width = frame.shape[:2]
+        elif self.context is not None:
+            screen_width, screen_height = self.context.screen_width, self.context.screen_height
+        else:
+            screen_width, screen_height = 0, 0
+        
+        cursor_controller = self.cursor_controller
+        if self.cursor_position is not None:
+            cursor_position = self.cursor_position()
+        elif cursor_controller is not None:
+            cursor_position = cursor_controller.actuator.cursor_position()
+        else:
+            cursor_position = None
+        
+        targeting = cursor_controller if cursor_controller is not None else self.targeting
+        return FrameContext(
+            frame_id=self.frame_count + 1,
+            timestamp=capture_time if capture_time is not None else timing.now(),
+            screen_width=screen_width,
+            screen_height=screen_height,
+            cursor_position=cursor_position,
+            relative_mode=getattr(cursor_controller, 'relative_mode', False),
+            following_enabled=getattr(targeting, 'following_enabled', False),
+            cursor_control_enabled=getattr(cursor_controller, 'cursor_control_enabled', False),
+            attack_enabled=getattr(cursor_controller, 'attack_enabled', False),
+            training_active=self.training_active,
+            fine_tuning_active=self.fine_tuning_active
+        )
+    
+    def process(self, frame):
+        """
+        Обрабатывает кадр: детекция, выбор цели, сопровождение и управление курсором.
+
+        Args:
+            frame: Кадр (BGR)
+
+        Returns:
+            tuple: (target_x, target_y, target_distance, speed, direction, detected_objects)
+        """
+        cursor_controller = self.cursor_controller
+        perf_monitor = self.perf_monitor
+        try:
+            # Контекст кадра; контроллер получает время захвата, номер кадра и позицию курсора
+            capture_time, self.capture_time = self.capture_time, None
+            context = self.context = self.make_context(frame, capture_time)
+            if cursor_controller is not None:
+                cursor_controller.begin_frame(context.timestamp, context.frame_id, context.cursor_position)
+
+            if frame is None or frame.size == 0:
+                print("Error: Invalid frame")
+                # Обязательно вызовем handle_auto_movement с box=None
+                if cursor_controller is not None:
+                    cursor_controller.handle_auto_movement(None, None)
+                return None, None, None, 0.0, 0.0, []
+
+            perf_monitor.start('process')
+
+            # 1. Обнаружение объектов
+            detected_objects, results = detect_objects(frame, perf_monitor, self.detector, context.screen_width,
+                                                       context.screen_height, self.detection_state)
+
+            # 1.1. Сглаживание рамок и оценка скоростей всех объектов кадра
+            self.filter_objects(detected_objects, context.timestamp)
+
+            target_box, target_x, target_y = None, None, None
+            control_box, target_velocity = None, None
+            target_distance, speed, direction = None, 0.0, 0.0
+            targeting = cursor_controller if cursor_controller is not None else self.targeting
+            if targeting is not None:
+                # 2. Выбор целевого объекта
+                target_box, target_x, target_y, target_distance, speed, direction = select_target(
+                    detected_objects,
+                    targeting,
+                    context.training_active,
+                    context
+                )
+
+                # 2.1. Сопровождение цели между запусками YOLO
+                # Новый проход детектора заново привязывает трекер, на остальных кадрах
+                # позиция цели обновляется по шаблону внешнего вида
+                if self.detection_state.results_fresh or not target_box:
+                    self.tracker.anchor(frame, target_box)
+                elif self.tracker.active and not self.tracker.matches(target_box):
+                    # Выбрана другая цель (смена режима, игнорируемых классов) - привязываемся к ней,
+                    # иначе трекер вернул бы наведение на прежний объект
+                    self.tracker.anchor(frame, target_box)
+                elif self.tracker.active:
+                    tracked_box = self.tracker.update(frame)
+                    if tracked_box:
+                        for obj in detected_objects:
+                            if obj.get('is_target', False):
+                                obj['box'] = tracked_box
+                                obj['position'] = ((tracked_box[0] + tracked_box[2]) // 2,
+                                                   (tracked_box[1] + tracked_box[3]) // 2)
+                                # Рамка трекера - измерение цели между проходами детектора
+                                if obj.get('track_id') in self.object_filters:
+                                    self.object_filters.update([obj['track_id']], [tracked_box])
+                        target_box = tracked_box
+                        target_x = (tracked_box[0] + tracked_box[2]) // 2
+                        target_y = (tracked_box[1] + tracked_box[3]) // 2
+
+                # 2.2. Управление получает рамку и скорость цели из фильтра Калмана
+                control_box, target_velocity = self.filtered_target(detected_objects, target_box)
+
+            if cursor_controller is not None:
+                # 3. Обработка движения курсора
+                cursor_controller.handle_auto_movement(target_distance, control_box, target_velocity)
+
+                # 4. Перемещение курсора если есть цель и еще не было перемещения в этом кадре
+                if (target_box and target_x is not None and target_y is not None and
+                        not context.training_active and not cursor_controller.cursor_moved_this_frame):
+                    perf_monitor.start('cursor')
+                    cursor_controller.move_cursor(target_x, target_y)
+                    perf_monitor.stop('cursor')
+
+            # 5. Сбор данных для обучения (до отрисовки, чтобы в кадр не попали рамки)
+            # Рамки берутся в пикселях кадра: нормированные координаты YOLO относятся к дополненному входу
+            if context.training_active and self.trainer is not None:
+                self.trainer.process_frame(frame, detected_objects, context.cursor_position)
+
+            # 6. Обработчики результата (отрисовка и т.п.)
+            for hook in self.hooks:
+                hook(frame, detected_objects, target_x, target_y)
+
+            perf_monitor.stop('process')
+            self.frame_count += 1
+
+            # 7. Публикация результата для внешних потребителей (не блокирует цикл)
+            if self.publisher is not None:
+                timings = {stage: counter.current_time for stage, counter in perf_monitor.get_stats().items()}
+                self.publisher.publish(self.frame_count, detected_objects, (target_x, target_y), timings)
+
+            self.last_result = (target_x, target_y, target_distance, speed, direction, detected_objects)
+            return self.last_result
+
+        except Exception as e:
+            print(f"Error in pipeline '{self.name}': {str(e)}")
+            import traceback
+            traceback.print_exc()
+            perf_monitor.stop('process')
+            # Гарантируем вызов handle_auto_movement даже при ошибке
+            if cursor_controller is not None:
+                cursor_controller.handle_auto_movement(None, None)
+            return None, None, None, 0.0, 0.0, []
+
+    def filter_objects(self, detected_objects, timestamp):
+        """
+        Продвигает фильтры Калмана всех объектов на время кадра.
+
+        За кадр выполняется одно векторное предсказание для всех треков и, если
+        детектор обновил объекты, одно векторное обновление их рамками. Каждый
+        объект получает ключи 'track_id', 'filtered_box' и 'velocity' (vx, vy в пикс/с).
+
+        Args:
+            detected_objects: Объекты кадра из detect_objects()
+            timestamp: Время захвата кадра (timing.now())
+        """
+        dt = timestamp - self.filter_time if self.filter_time is not None else 0.0
+        self.filter_time = timestamp
+
+        if self.detection_state.results_fresh:
+            self.object_track_ids = self.object_filters.track([obj['box'] for obj in detected_objects], dt)
+        else:
+            self.object_filters.predict(dt)
+
+        # Кешированные объекты идут в том же порядке, что и на проходе детектора
+        if len(self.object_track_ids) != len(detected_objects):
+            return
+        track_ids = [track_id for track_id in self.object_track_ids if track_id in self.object_filters]
+        if len(track_ids) != len(detected_objects):
+            return
+        boxes = self.object_filters.boxes(track_ids)
+        velocities = self.object_filters.velocities(track_ids)
+        for obj, track_id, box, velocity in zip(detected_objects, track_ids, boxes, velocities):
+            obj['track_id'] = track_id
+            obj['filtered_box'] = tuple(int(round(value)) for value in box)
+            obj['velocity'] = (float(velocity[0]), float(velocity[1]))
+
+    def filtered_target(self, detected_objects, target_box):
+        """
+        Рамка и скорость цели по фильтру Калмана.
+
+        Args:
+            detected_objects: Объекты кадра после filter_objects() и выбора цели
+            target_box: Рамка цели (None - цели нет)
+
+        Returns:
+            tuple: (рамка, (vx, vy)) из фильтра или (target_box, None), если цель не сопровождается
+        """
+        if not target_box:
+            return target_box, None
+        for obj in detected_objects:
+            if obj.get('is_target', False) and obj.get('track_id') in self.object_filters:
+                track_id = obj['track_id']
+                box = self.object_filters.boxes([track_id])[0]
+                velocity = self.object_filters.velocities([track_id])[0]
+                return tuple(int(round(value)) for value in box), (float(velocity[0]), float(velocity[1]))
+        return target_box, None
+
+    def start(self, interval=1.0 / 60.0):
+        """
+        Запускает конвейер в отдельном потоке.
+
+        Args:
+            interval: Минимальный интервал между кадрами (сек)
+        """
+        if self.running:
+            return
+        self.running = True
+        self.thread = Thread(target=self._run, args=(interval,), daemon=True)
+        self.thread.start()
+        print(f"Pipeline '{self.name}' started")
+
+    def stop(self):
+        """Останавливает поток конвейера и освобождает источник кадров"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+        self.cleanup()
+
+    def cleanup(self):
+        """Освобождает ресурсы источника кадров и издателя"""
+        if self.capture_source is not None and hasattr(self.capture_source, 'cleanup'):
+            self.capture_source.cleanup()
+        if self.publisher is not None:
+            self.publisher.close()
+
+    def _run(self, interval):
+        """Цикл потока конвейера: кадры по расписанию с точным ожиданием срока"""
+        next_frame_time = timing.now()
+        while self.running:
+            timing.wait_until(next_frame_time)
+            # После долгого кадра расписание сдвигается, а не догоняет пропущенные кадры
+            next_frame_time = max(next_frame_time + interval, timing.now())
+            self.step()
+
+    # --- Сбор данных и дообучение ---
+
+    def toggle_training_collection(self, frames_to_collect=100):
+        """
+        Включает или выключает сбор данных для обучения.
+
+        Returns:
+            bool: True, если сбор данных включен
+        """
+        if not self._ensure_trainer():
+            print("Cannot start training collection: failed to initialize trainer")
+            return False
+
+        if self.training_active:
+            self.trainer.stop_collection()
+            self.training_active = False
+            print("Training data collection stopped")
+        else:
+            # Start collecting data, all objects will be labeled as class 80 (bag)
+            self.trainer.start_collection(frames_to_collect=frames_to_collect)
+            self.training_active = True
+            print("Training data collection for new class 'Bag' started")
+            print("All detected objects will be automatically labeled as 'bag' (class 80)")
+
+        return self.training_active
+
+    def start_fine_tuning(self, device="cpu"):
+        """
+        Запускает дообучение модели на собранных данных в отдельном потоке.
+
+        Returns:
+            bool: True, если дообучение запущено
+        """
+        if not self._ensure_trainer():
+            print("Cannot start fine-tuning: failed to initialize trainer")
+            return False
+
+        if self.fine_tuning_active:
+            print("Fine-tuning is already in progress")
+            return False
+
+        Thread(target=self._fine_tuning_thread, args=(device,), daemon=True).start()
+        return True
+
+    def _ensure_trainer(self):
+        """Создает тренер при первом обращении"""
+        if self.trainer is None and self.trainer_factory is not None:
+            self.trainer = self.trainer_factory()
+        return self.trainer is not None
+
+    def _fine_tuning_thread(self, device):
+        self.fine_tuning_active = True
+        print("Starting model fine-tuning with new class 'Bag'...")
+
+        success = self.trainer.fine_tune(epochs=5, batch_size=4, device=device)
+
+        if success:
+            # Update the detector with the fine-tuned model
+            self.detector.model = self.trainer.model
+            self.detector.model.to(self.detector.device)
+            print("Updated detector with fine-tuned model")
+
+            # Добавляем класс 'bag' в пользовательские классы детектора
+            if 80 not in self.detector.custom_classes:
+                self.detector.custom_classes[80] = 'bag'
+                print("Added 'bag' class to detector's custom classes")
+
+            print("Model fine-tuning completed successfully!")
+            print("New class 'Bag' (ID 80) has been added to the model")
+        else:
+            print("Model fine-tuning failed")
+
+        self.fine_tuning_active = False
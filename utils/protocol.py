@@ -0,0 +1,105 @@
+"""
+Модуль протокола обмена сообщениями с сервисом инференса.
+Предоставляет кадрирование сообщений (заголовок JSON + двоичные данные), упаковку массивов
+и подключение к общей памяти.
+"""
+
+import json
+import struct
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Префикс сообщения: длина заголовка и длина двоичных данных
+PREFIX = struct.Struct('!II')
+# Ограничение размера заголовка (защита от поврежденного потока)
+MAX_HEADER_SIZE = 1 << 20
+
+
+def send_message(sock, header, payload=b''):
+    """
+    Отправляет сообщение в сокет.
+
+    Args:
+        sock: Подключенный сокет
+        header: Словарь заголовка (сериализуется в JSON)
+        payload: Двоичные данные (bytes, memoryview или массив numpy)
+    """
+    header_bytes = json.dumps(header).encode('utf-8')
+    payload = memoryview(payload).cast('B')
+    sock.sendall(PREFIX.pack(len(header_bytes), payload.nbytes) + header_bytes)
+    if payload.nbytes:
+        sock.sendall(payload)
+
+
+def recv_message(sock):
+    """
+    Принимает сообщение из сокета.
+
+    Args:
+        sock: Подключенный сокет
+
+    Returns:
+        tuple: (header, payload) - словарь заголовка и двоичные данные (bytearray)
+
+    Raises:
+        ConnectionError: Соединение закрыто или поток поврежден
+    """
+    header_size, payload_size = PREFIX.unpack(recv_exact(sock, PREFIX.size))
+    if header_size > MAX_HEADER_SIZE:
+        raise ConnectionError(f"Invalid message header size {header_size}")
+    header = json.loads(recv_exact(sock, header_size).decode('utf-8'))
+    payload = recv_exact(sock, payload_size) if payload_size else bytearray()
+    return header, payload
+
+
+def recv_exact(sock, size):
+    """Читает из сокета ровно size байт"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("Connection closed by peer")
+        received += count
+    return buffer
+
+
+def array_header(array):
+    """Описание массива для заголовка сообщения"""
+    return {'dtype': array.dtype.str, 'shape': list(array.shape)}
+
+
+def array_from_buffer(header, buffer, offset=0):
+    """
+    Восстанавливает массив по описанию из заголовка.
+
+    Args:
+        header: Словарь с ключами 'dtype' и 'shape'
+        buffer: Двоичные данные
+        offset: Смещение массива в данных
+
+    Returns:
+        np.ndarray: Массив (представление буфера)
+    """
+    dtype = np.dtype(header['dtype'])
+    shape = tuple(header['shape'])
+    count = int(np.prod(shape)) if shape else 1
+    return np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+
+def attach_shared_memory(name):
+    """Подключается к существующему блоку общей памяти, не забирая владение им"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: параметра track нет, снимаем блок с учета вручную,
+        # иначе при выходе процесса он будет удален у владельца
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(block._name, 'shared_memory')
+        except Exception:
+            pass
+        return block
@@ -0,0 +1,397 @@
+"""
+Модуль публикации результатов детекции для внешних потребителей.
+Каждый обработанный кадр (объекты, выбранная цель, замеры времени) кодируется
+в компактную двоичную запись и рассылается через общую память и/или локальный сокет.
+
+Публикация никогда не блокирует основной цикл: при переполнении кольца старые
+записи перезаписываются, а медленные подписчики сокета отключаются.
+
+Пример подписчика:
+    subscriber = RingSubscriber('rob_detections')
+    while True:
+        for record in subscriber.read():
+            print(record['frame_id'], record['target'], len(record['objects']))
+        time.sleep(0.01)
+"""
+
+import queue
+import socket
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+from utils.protocol import attach_shared_memory, recv_exact
+
+DEFAULT_PUBLISH_PORT = 8767
+
+# Запись кадра: номер кадра, время (сек), цель x/y (-1 - нет цели), число объектов и замеров
+FRAME_RECORD = struct.Struct('<Qdiihh')
+# Объект: рамка x1, y1, x2, y2, расстояние, флаг цели, длина имени класса (за ним имя в UTF-8)
+OBJECT_RECORD = struct.Struct('<iiiif?B')
+# Замер времени: длительность (сек), длина имени этапа (за ним имя в UTF-8)
+TIMING_RECORD = struct.Struct('<fB')
+# Префикс сообщения в потоке сокета: длина записи
+STREAM_PREFIX = struct.Struct('!I')
+
+# Заголовок кольца: номер последней записи, число ячеек, размер ячейки
+RING_HEADER = struct.Struct('<QII')
+# Заголовок ячейки кольца: номер записи, длина записи
+SLOT_HEADER = struct.Struct('<QI')
+
+
+def _encode_name(name):
+    return str(name).encode('utf-8')[:255]
+
+
+def encode_detections(frame_id, timestamp, detected_objects, target=None, timings=None):
+    """
+    Кодирует результат кадра в двоичную запись.
+
+    Args:
+        frame_id: Номер кадра
+        timestamp: Время кадра (time.time())
+        detected_objects: Список объектов detect_objects
+        target: Координаты цели (x, y) или None
+        timings: Словарь длительностей этапов {имя: секунды}
+
+    Returns:
+        bytes: Двоичная запись
+    """
+    timings = timings or {}
+    target_x, target_y = target if target and target[0] is not None else (-1, -1)
+    parts = [FRAME_RECORD.pack(frame_id, timestamp, int(target_x), int(target_y),
+                               len(detected_objects), len(timings))]
+    for obj in detected_objects:
+        name = _encode_name(obj.get('class', ''))
+        x1, y1, x2, y2 = obj['box']
+        parts.append(OBJECT_RECORD.pack(int(x1), int(y1), int(x2), int(y2),
+                                        float(obj.get('distance') or 0.0),
+                                        bool(obj.get('is_target', False)), len(name)))
+        parts.append(name)
+    for stage, duration in timings.items():
+        name = _encode_name(stage)
+        parts.append(TIMING_RECORD.pack(float(duration), len(name)))
+        parts.append(name)
+    return b''.join(parts)
+
+
+def decode_detections(buffer):
+    """
+    Декодирует двоичную запись кадра.
+
+    Args:
+        buffer: Запись (bytes, bytearray или memoryview)
+
+    Returns:
+        dict: Словарь с ключами 'frame_id', 'timestamp', 'target', 'objects', 'timings'
+    """
+    frame_id, timestamp, target_x, target_y, object_count, timing_count = FRAME_RECORD.unpack_from(buffer, 0)
+    offset = FRAME_RECORD.size
+
+    objects = []
+    for _ in range(object_count):
+        x1, y1, x2, y2, distance, is_target, name_size = OBJECT_RECORD.unpack_from(buffer, offset)
+        offset += OBJECT_RECORD.size
+        name = bytes(buffer[offset:offset + name_size]).decode('utf-8')
+        offset += name_size
+        objects.append({'class': name, 'box': (x1, y1, x2, y2),
+                        'distance': distance, 'is_target': is_target})
+
+    timings = {}
+    for _ in range(timing_count):
+        duration, name_size = TIMING_RECORD.unpack_from(buffer, offset)
+        offset += TIMING_RECORD.size
+        timings[bytes(buffer[offset:offset + name_size]).decode('utf-8')] = duration
+        offset += name_size
+
+    return {
+        'frame_id': frame_id,
+        'timestamp': timestamp,
+        'target': (target_x, target_y) if target_x >= 0 else None,
+        'objects': objects,
+        'timings': timings,
+    }
+
+
+class SharedMemoryRing:
+    """
+    Кольцевой буфер записей в общей памяти для подписчиков на этой же машине.
+
+    Писатель не ждет читателей: новая запись занимает следующую ячейку,
+    перезаписывая самую старую. Читатель, отставший больше чем на размер
+    кольца, пропускает перезаписанные записи (см. RingSubscriber).
+    """
+
+    def __init__(self, name, slots=64, slot_size=16384):
+        """
+        Создает кольцо.
+
+        Args:
+            name: Имя блока общей памяти (его указывают подписчики)
+            slots: Число ячеек
+            slot_size: Максимальный размер записи в байтах
+        """
+        self.name = name
+        self.slots = slots
+        self.slot_size = slot_size
+        size = RING_HEADER.size + slots * (SLOT_HEADER.size + slot_size)
+        try:
+            self.block = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Блок остался от аварийно завершенного процесса - пересоздаем его
+            stale = attach_shared_memory(name)
+            stale.close()
+            stale.unlink()
+            self.block = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.sequence = 0
+        self.dropped = 0
+        RING_HEADER.pack_into(self.block.buf, 0, 0, slots, slot_size)
+
+    def send(self, message):
+        """Записывает запись в кольцо (слишком большие записи отбрасываются)"""
+        if len(message) > self.slot_size:
+            self.dropped += 1
+            return
+        self.sequence += 1
+        offset = RING_HEADER.size + (self.sequence % self.slots) * (SLOT_HEADER.size + self.slot_size)
+        buf = self.block.buf
+        # Ячейка помечается недействительной на время записи, чтобы читатель
+        # не принял наполовину записанные данные за целую запись
+        SLOT_HEADER.pack_into(buf, offset, 0, 0)
+        buf[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + len(message)] = message
+        SLOT_HEADER.pack_into(buf, offset, self.sequence, len(message))
+        RING_HEADER.pack_into(buf, 0, self.sequence, self.slots, self.slot_size)
+
+    def close(self):
+        """Освобождает и удаляет блок общей памяти"""
+        try:
+            self.block.close()
+            self.block.unlink()
+        except Exception:
+            pass
+
+
+class RingSubscriber:
+    """Читатель кольца SharedMemoryRing"""
+
+    def __init__(self, name):
+        """
+        Подключается к кольцу.
+
+        Args:
+            name: Имя блока общей памяти издателя
+        """
+        self.block = attach_shared_memory(name)
+        _, self.slots, self.slot_size = RING_HEADER.unpack_from(self.block.buf, 0)
+        # Читаем только записи, опубликованные после подключения
+        self.next_sequence = RING_HEADER.unpack_from(self.block.buf, 0)[0] + 1
+        self.dropped = 0
+
+    def read(self):
+        """
+        Возвращает новые записи с момента предыдущего чтения.
+
+        Returns:
+            list: Список декодированных записей (decode_detections)
+        """
+        buf = self.block.buf
+        latest = RING_HEADER.unpack_from(buf, 0)[0]
+        if latest - self.next_sequence >= self.slots:
+            # Отстали больше чем на кольцо: старые записи уже перезаписаны
+            skipped_to = latest - self.slots + 1
+            self.dropped += skipped_to - self.next_sequence
+            self.next_sequence = skipped_to
+
+        records = []
+        while self.next_sequence <= latest:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            offset = RING_HEADER.size + (sequence % self.slots) * (SLOT_HEADER.size + self.slot_size)
+            slot_sequence, length = SLOT_HEADER.unpack_from(buf, offset)
+            if slot_sequence != sequence:
+                self.dropped += 1
+                continue
+            message = bytes(buf[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + length])
+            # Если писатель успел занять ячейку во время копирования - запись потеряна
+            if SLOT_HEADER.unpack_from(buf, offset)[0] != sequence:
+                self.dropped += 1
+                continue
+            records.append(decode_detections(message))
+        return records
+
+    def close(self):
+        self.block.close()
+
+
+class _StreamSubscriber:
+    """Подписчик потока: очередь записей и поток отправки"""
+
+    def __init__(self, sock, address, queue_size):
+        self.sock = sock
+        self.address = address
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.active = True
+        threading.Thread(target=self._send_loop, daemon=True).start()
+
+    def _send_loop(self):
+        try:
+            while self.active:
+                message = self.queue.get()
+                if message is None:
+                    break
+                self.sock.sendall(STREAM_PREFIX.pack(len(message)) + message)
+        except OSError:
+            pass
+        self.close()
+
+    def close(self):
+        self.active = False
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+
+class SocketStream:
+    """
+    Поток записей через локальный TCP-сокет.
+
+    У каждого подписчика своя ограниченная очередь и поток отправки. Если
+    подписчик не успевает забирать записи и его очередь заполнена, он
+    отключается, а основной цикл продолжает работу без ожидания.
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PUBLISH_PORT, queue_size=64):
+        """
+        Открывает сокет для подписчиков.
+
+        Args:
+            host: Адрес для подключений
+            port: Порт
+            queue_size: Число записей, которое может накопить подписчик до отключения
+        """
+        self.queue_size = queue_size
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.dropped_subscribers = 0
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((host, port))
+        self.server_socket.listen()
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        print(f"Detection stream listening on {host}:{port}")
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, address = self.server_socket.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            subscriber = _StreamSubscriber(sock, address, self.queue_size)
+            with self.lock:
+                self.subscribers.append(subscriber)
+            print(f"Detection stream subscriber connected: {address}")
+
+    def send(self, message):
+        """Ставит запись в очереди подписчиков, отключая отставших"""
+        with self.lock:
+            subscribers = self.subscribers
+            for subscriber in subscribers:
+                if not subscriber.active:
+                    continue
+                try:
+                    subscriber.queue.put_nowait(message)
+                except queue.Full:
+                    print(f"Detection stream subscriber {subscriber.address} is too slow, disconnecting")
+                    self.dropped_subscribers += 1
+                    subscriber.close()
+            self.subscribers = [subscriber for subscriber in subscribers if subscriber.active]
+
+    def close(self):
+        """Закрывает сокет и отключает подписчиков"""
+        self.running = False
+        try:
+            self.server_socket.close()
+        except Exception:
+            pass
+        with self.lock:
+            for subscriber in self.subscribers:
+                subscriber.close()
+                try:
+                    subscriber.queue.put_nowait(None)
+                except queue.Full:
+                    pass
+            self.subscribers = []
+
+
+class StreamSubscriber:
+    """Клиент потока SocketStream"""
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PUBLISH_PORT, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+
+    def receive(self):
+        """
+        Принимает следующую запись.
+
+        Returns:
+            dict: Декодированная запись (decode_detections)
+
+        Raises:
+            ConnectionError: Соединение закрыто издателем
+        """
+        length = STREAM_PREFIX.unpack(recv_exact(self.sock, STREAM_PREFIX.size))[0]
+        return decode_detections(recv_exact(self.sock, length))
+
+    def close(self):
+        self.sock.close()
+
+
+class DetectionPublisher:
+    """
+    Издатель результатов детекции.
+
+    Запись кодируется один раз и передается всем транспортам
+    (SharedMemoryRing, SocketStream). Ошибка транспорта не прерывает
+    обработку кадра.
+    """
+
+    def __init__(self, transports=None):
+        """
+        Args:
+            transports: Список транспортов с методами send(message) и close()
+        """
+        self.transports = list(transports or [])
+        self.published = 0
+
+    def add_transport(self, transport):
+        self.transports.append(transport)
+
+    def publish(self, frame_id, detected_objects, target=None, timings=None, timestamp=None):
+        """
+        Публикует результат кадра.
+
+        Args:
+            frame_id: Номер кадра
+            detected_objects: Список объектов detect_objects
+            target: Координаты цели (x, y) или None
+            timings: Словарь длительностей этапов {имя: секунды}
+            timestamp: Время кадра (None - текущее время)
+        """
+        if not self.transports:
+            return
+        message = encode_detections(frame_id, timestamp or time.time(), detected_objects, target, timings)
+        for transport in self.transports:
+            try:
+                transport.send(message)
+            except Exception as e:
+                print(f"Error publishing detections: {str(e)}")
+        self.published += 1
+
+    def close(self):
+        for transport in self.transports:
+            transport.close()
+        self.transports = []
@@ -0,0 +1,143 @@
+"""
+Модуль пирамиды изображений для захваченного кадра.
+Предоставляет ленивый кэш уменьшенных копий кадра, общий для всех потребителей пикселей.
+"""
+
+import threading
+
+import cv2
+
+# Пирамида последнего кадра хранится отдельно для каждого потока (конвейера)
+_local = threading.local()
+
+
+class FramePyramid:
+    """
+    Пирамида уменьшенных копий одного кадра.
+
+    Каждый уровень (ширина, цвет/оттенки серого, способ уменьшения) строится
+    один раз при первом запросе и затем переиспользуется. Уровни строятся из
+    ближайшего уже готового уровня, поэтому стоимость уменьшения не растет
+    с количеством потребителей. Уровни освобождаются вместе с пирамидой.
+    """
+
+    METHODS = ('area', 'pyrdown', 'linear')
+
+    def __init__(self, frame, method='area'):
+        """
+        Инициализирует пирамиду.
+
+        Args:
+            frame: Исходный кадр (BGR)
+            method: Способ уменьшения по умолчанию:
+                    'area' - cv2.INTER_AREA (лучшее качество при уменьшении),
+                    'pyrdown' - последовательные cv2.pyrDown с доводкой INTER_AREA,
+                    'linear' - cv2.INTER_LINEAR (быстрее, возможен алиасинг)
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown pyramid method '{method}'")
+
+        self.frame = frame
+        self.method = method
+        self.height, self.width = frame.shape[:2]
+        self.levels = {}
+        # Октавы cv2.pyrDown (каждая вдвое меньше предыдущей)
+        self.octaves = [frame]
+
+    def level(self, width, gray=False, method=None):
+        """
+        Возвращает кадр, уменьшенный до заданной ширины с сохранением пропорций.
+
+        Возвращаемый массив общий для всех потребителей и не должен изменяться.
+
+        Args:
+            width: Ширина уровня в пикселях (не больше ширины кадра)
+            gray: Вернуть изображение в оттенках серого
+            method: Способ уменьшения (по умолчанию - способ пирамиды)
+
+        Returns:
+            np.ndarray: Изображение уровня
+        """
+        method = method or self.method
+        width = max(1, min(int(width), self.width))
+        key = (width, gray, method)
+
+        image = self.levels.get(key)
+        if image is not None:
+            return image
+
+        if gray:
+            color = self.level(width, method=method)
+            image = cv2.cvtColor(color, cv2.COLOR_BGR2GRAY) if color.ndim == 3 else color
+        elif width == self.width:
+            image = self.frame
+        else:
+            height = self.level_height(width)
+            if method == 'pyrdown':
+                source = self._octave_for(width)
+            else:
+                source = self._source_for(width, method)
+            if source.shape[1] != width:
+                interpolation = cv2.INTER_LINEAR if method == 'linear' else cv2.INTER_AREA
+                source = cv2.resize(source, (width, height), interpolation=interpolation)
+            image = source
+
+        self.levels[key] = image
+        return image
+
+    def scaled(self, scale, gray=False, method=None):
+        """
+        Возвращает кадр, уменьшенный в заданное число раз.
+
+        Args:
+            scale: Масштаб относительно исходного кадра (0-1]
+            gray: Вернуть изображение в оттенках серого
+            method: Способ уменьшения
+
+        Returns:
+            np.ndarray: Изображение уровня
+        """
+        return self.level(int(round(self.width * min(1.0, scale))), gray=gray, method=method)
+
+    def level_height(self, width):
+        """Высота уровня заданной ширины"""
+        return max(1, int(self.height * width / self.width))
+
+    def _source_for(self, width, method):
+        """Наименьший готовый цветной уровень, который хотя бы вдвое шире требуемого"""
+        source = self.frame
+        for (level_width, level_gray, level_method), image in self.levels.items():
+            if (not level_gray and level_method == method and
+                    width * 2 <= level_width < source.shape[1]):
+                source = image
+        return source
+
+    def _octave_for(self, width):
+        """Наименьшая октава cv2.pyrDown, которая не уже требуемой ширины"""
+        while self.octaves[-1].shape[1] // 2 >= width:
+            self.octaves.append(cv2.pyrDown(self.octaves[-1]))
+        for octave in reversed(self.octaves):
+            if octave.shape[1] >= width:
+                return octave
+        return self.frame
+
+
+def get_pyramid(frame, method='area'):
+    """
+    Возвращает пирамиду для кадра, создавая ее при первом обращении.
+
+    Пирамида хранится только для последнего кадра текущего потока: с приходом
+    нового кадра прежняя пирамида и все ее уровни освобождаются.
+
+    Args:
+        frame: Кадр (BGR)
+        method: Способ уменьшения для новой пирамиды
+
+    Returns:
+        FramePyramid: Пирамида кадра
+    """
+    pyramid = getattr(_local, 'pyramid', None)
+    if pyramid is None or pyramid.frame is not frame:
+        pyramid = FramePyramid(frame, method)
+        _local.pyramid = pyramid
+    return pyramid
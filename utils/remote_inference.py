@@ -0,0 +1,386 @@
+"""
+Модуль удаленного инференса по TCP.
+Слабая игровая машина отправляет уменьшенные кадры в формате JPEG/PNG на
+мощную машину в локальной сети и получает компактные массивы детекций.
+
+Запуск сервера на удаленной машине:
+    python -m utils.remote_inference --model models/yolo11n.pt --host 0.0.0.0
+"""
+
+import argparse
+import itertools
+import queue
+import socket
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from utils.inference_service import ServiceConnection
+from utils.performance import PerformanceCounter
+from utils.protocol import array_from_buffer, array_header, recv_message, send_message
+
+DEFAULT_REMOTE_PORT = 8766
+
+
+class RemoteInferenceServer:
+    """
+    Сервер удаленного инференса на основе YOLOPersonDetector.
+
+    Потоки подключений принимают и декодируют кадры, а единственный поток
+    инференса обрабатывает их по очереди и отправляет ответы. Клиент может
+    держать несколько запросов в работе одновременно: декодирование и передача
+    следующего кадра идут параллельно с инференсом предыдущего.
+    """
+
+    def __init__(self, detector, host='127.0.0.1', port=DEFAULT_REMOTE_PORT):
+        """
+        Инициализирует сервер.
+
+        Args:
+            detector: Экземпляр YOLOPersonDetector
+            host: Адрес для подключений ('0.0.0.0' - доступ из локальной сети)
+            port: Порт сервера
+        """
+        self.detector = detector
+        self.host = host
+        self.port = port
+        self.requests = queue.Queue()
+        self.running = False
+        self.server_socket = None
+
+    def warm_up(self, width=640, height=360):
+        """Прогревает модель, чтобы первый запрос клиента не превысил бюджет задержки"""
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        start_time = time.perf_counter()
+        self.detector.detect_all_objects(frame)
+        print(f"Remote inference server warmed up in {(time.perf_counter() - start_time) * 1000:.0f}ms")
+
+    def serve_forever(self):
+        """Принимает подключения до вызова shutdown()"""
+        self.warm_up()
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen()
+        self.running = True
+
+        threading.Thread(target=self._inference_loop, daemon=True).start()
+        print(f"Remote inference server listening on {self.host}:{self.port}")
+
+        try:
+            while self.running:
+                try:
+                    sock, address = self.server_socket.accept()
+                except OSError:
+                    break
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                threading.Thread(target=self._client_loop, args=(ServiceConnection(sock, address),),
+                                 daemon=True).start()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Останавливает сервер"""
+        if not self.running:
+            return
+        self.running = False
+        self.requests.put(None)
+        try:
+            # На Linux close() не прерывает accept() в другом потоке, shutdown() - прерывает
+            self.server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.server_socket.close()
+        except Exception:
+            pass
+        print("Remote inference server stopped")
+
+    def _client_loop(self, connection):
+        """Принимает и декодирует кадры одного клиента"""
+        print(f"Remote client connected: {connection.address}")
+        try:
+            while self.running:
+                header, payload = recv_message(connection.sock)
+                if header.get('type') != 'detect':
+                    connection.send({'type': 'error', 'id': header.get('id'),
+                                     'message': f"Unknown message type '{header.get('type')}'"})
+                    continue
+                frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    connection.send({'type': 'error', 'id': header.get('id'), 'message': "Cannot decode frame"})
+                    continue
+                self.requests.put((connection, header['id'], frame))
+        except (ConnectionError, OSError):
+            pass
+        except Exception as e:
+            print(f"Error in remote client loop: {str(e)}")
+        finally:
+            connection.close()
+            print(f"Remote client disconnected: {connection.address}")
+
+    def _inference_loop(self):
+        """Выполняет детекцию для принятых кадров"""
+        while self.running:
+            request = self.requests.get()
+            if request is None:
+                break
+            connection, request_id, frame = request
+
+            start_time = time.perf_counter()
+            results = self.detector.detect_all_objects(frame)
+            objects = self.detector.get_all_objects(results) if results is not None else []
+            detections = np.array([obj['box'] + (obj['confidence'], obj['class_id']) for obj in objects],
+                                  dtype=np.float32).reshape(-1, 6)
+            header = dict(array_header(detections), type='result', id=request_id,
+                          server_time=time.perf_counter() - start_time)
+            try:
+                connection.send(header, detections)
+            except Exception:
+                # Клиент отключился - ответ больше не нужен
+                pass
+
+
+class RemoteInferenceClient:
+    """
+    Клиент удаленного инференса с конвейером запросов.
+
+    Держит до max_in_flight запросов в работе, измеряет задержку каждого
+    запроса и считает сервер пригодным, пока сглаженная задержка не
+    превышает бюджет. В остальное время раз в probe_interval отправляется
+    пробный кадр, чтобы заметить восстановление сервера.
+    """
+
+    def __init__(self, host, port=DEFAULT_REMOTE_PORT, encoding='jpeg', quality=80, width=640,
+                 max_in_flight=3, latency_budget=0.15, probe_interval=1.0, timeout=2.0):
+        """
+        Инициализирует клиента и пытается подключиться к серверу.
+
+        Args:
+            host: Адрес сервера
+            port: Порт сервера
+            encoding: Формат передачи кадров ('jpeg' или 'png')
+            quality: Качество JPEG (0-100)
+            width: Ширина передаваемого кадра
+            max_in_flight: Максимальное количество запросов в работе
+            latency_budget: Допустимая задержка ответа (сек); при превышении - локальный инференс
+            probe_interval: Интервал пробных запросов и попыток переподключения (сек)
+            timeout: Время, после которого запрос без ответа считается потерянным (сек)
+        """
+        if encoding not in ('jpeg', 'png'):
+            raise ValueError(f"Unknown frame encoding '{encoding}'")
+
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self.quality = quality
+        self.width = width
+        self.max_in_flight = max_in_flight
+        self.latency_budget = latency_budget
+        self.probe_interval = probe_interval
+        self.timeout = timeout
+
+        self.counter = PerformanceCounter('Remote Inference')
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.sock = None
+        self.connected = False
+        # Интервалы (задержка, таймауты, расписание проверок) измеряются по time.perf_counter():
+        # монотонные часы не сбиваются переводом системного времени и идут в реальном времени при повторе
+        self.pending = {}          # ID запроса -> (время отправки, контекст)
+        self.latest = None         # Последний полученный результат: (детекции, контекст)
+        self.latency = None        # Сглаженная задержка (сек)
+        self.last_latency = None   # Задержка последнего запроса (сек)
+        self.last_submit_time = float('-inf')
+        self.last_connect_time = float('-inf')
+
+        self._connect()
+
+    @property
+    def healthy(self):
+        """Можно ли полагаться на сервер вместо локального инференса"""
+        return self.connected and self.latency is not None and self.latency <= self.latency_budget
+
+    def get_state(self):
+        """Состояние клиента для статистики"""
+        if not self.connected:
+            return "disconnected"
+        if self.latency is None:
+            return "connecting"
+        state = "remote" if self.healthy else "local (slow)"
+        return f"{state} {self.latency * 1000:.0f}ms, {len(self.pending)} in flight"
+
+    def can_submit(self):
+        """
+        Можно ли отправить следующий кадр.
+
+        Returns:
+            bool: True, если есть место в конвейере (или пора отправить пробный кадр)
+        """
+        current_time = time.perf_counter()
+        with self.lock:
+            # Запросы без ответа дольше timeout считаем потерянными
+            expired = [request_id for request_id, (send_time, _) in self.pending.items()
+                       if current_time - send_time > self.timeout]
+            for request_id in expired:
+                del self.pending[request_id]
+            if expired:
+                self._update_latency(self.timeout)
+
+        if not self.connected:
+            if current_time - self.last_connect_time >= self.probe_interval:
+                self._connect()
+            return self.connected and not self.pending
+        if len(self.pending) >= self.max_in_flight:
+            return False
+        if not self.healthy and self.latency is not None:
+            # Сервер медленный: только редкие пробные запросы, по одному
+            return not self.pending and current_time - self.last_submit_time >= self.probe_interval
+        return True
+
+    def submit(self, image, context=None):
+        """
+        Кодирует и отправляет кадр на сервер без ожидания ответа.
+
+        Args:
+            image: Кадр (BGR), уже уменьшенный до нужной ширины
+            context: Любые данные, которые вернутся вместе с результатом
+
+        Returns:
+            bool: True, если кадр отправлен
+        """
+        if not self.connected:
+            return False
+
+        if self.encoding == 'jpeg':
+            ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        else:
+            ok, encoded = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            return False
+
+        request_id = next(self.ids)
+        send_time = time.perf_counter()
+        with self.lock:
+            self.pending[request_id] = (send_time, context)
+        try:
+            send_message(self.sock, {'type': 'detect', 'id': request_id, 'encoding': self.encoding}, encoded)
+        except OSError as e:
+            print(f"Error sending frame to remote inference server: {str(e)}")
+            self._disconnect()
+            return False
+        self.last_submit_time = send_time
+        return True
+
+    def poll(self):
+        """
+        Забирает последний полученный результат.
+
+        Returns:
+            tuple: (детекции (N, 6) в пикселях отправленного кадра, контекст) или None, если нового результата нет
+        """
+        with self.lock:
+            result = self.latest
+            self.latest = None
+        return result
+
+    def close(self):
+        """Закрывает соединение"""
+        self._disconnect()
+
+    def _connect(self):
+        """Подключается к серверу и запускает поток приема ответов"""
+        self.last_connect_time = time.perf_counter()
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(None)
+        except OSError as e:
+            print(f"Remote inference server {self.host}:{self.port} is unavailable: {str(e)}")
+            return
+
+        with self.lock:
+            self.sock = sock
+            self.connected = True
+            self.pending.clear()
+            self.latency = None
+        threading.Thread(target=self._receive_loop, args=(sock,), daemon=True).start()
+        print(f"Connected to remote inference server at {self.host}:{self.port}")
+
+    def _disconnect(self):
+        with self.lock:
+            sock, self.sock = self.sock, None
+            self.connected = False
+            self.pending.clear()
+        if sock is not None:
+            try:
+                sock.close()
+            except Exception:
+                pass
+
+    def _receive_loop(self, sock):
+        """Принимает ответы сервера"""
+        try:
+            while True:
+                header, payload = recv_message(sock)
+                receive_time = time.perf_counter()
+                with self.lock:
+                    request = self.pending.pop(header.get('id'), None)
+                    if request is None:
+                        # Запрос уже признан потерянным
+                        continue
+                    send_time, context = request
+                    self._update_latency(receive_time - send_time)
+                    if header.get('type') == 'result':
+                        detections = array_from_buffer(header, payload)
+                        self.latest = (detections, context)
+                    else:
+                        print(f"Remote inference error: {header.get('message')}")
+        except (ConnectionError, OSError):
+            pass
+        except Exception as e:
+            print(f"Error in remote inference receive loop: {str(e)}")
+        if self.sock is sock:
+            print("Remote inference server disconnected")
+            self._disconnect()
+
+    def _update_latency(self, latency):
+        """Обновляет сглаженную задержку (вызывается под self.lock)"""
+        self.last_latency = latency
+        self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+        self.counter.record(latency)
+
+
+def main():
+    """Запуск сервера из командной строки"""
+    parser = argparse.ArgumentParser(description='Reign of Bots - Remote inference server')
+    parser.add_argument('--model', default='models/yolo11n.pt', help='YOLO model to serve')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Address to listen on (use 0.0.0.0 to accept LAN clients)')
+    parser.add_argument('--port', type=int, default=DEFAULT_REMOTE_PORT, help='Port to listen on')
+    parser.add_argument('--conf', type=float, default=0.4, help='Detection confidence threshold')
+    parser.add_argument('--no-cuda', action='store_true', help='Run inference on CPU')
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    from utils.detector import YOLOPersonDetector
+
+    try:
+        model = YOLO(args.model)
+    except Exception as e:
+        print(f"Error loading model {args.model}: {str(e)}")
+        sys.exit(1)
+
+    detector = YOLOPersonDetector(model=model, conf=args.conf, device="cpu" if args.no_cuda else "auto")
+    server = RemoteInferenceServer(detector, host=args.host, port=args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
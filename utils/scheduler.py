@@ -0,0 +1,161 @@
+"""
+Модуль планировщика периодических задач по срокам.
+Каждая задача (обработка кадра, обновление оверлея, обслуживание GDI,
+вывод статистики) имеет свою частоту и срок следующего запуска. Цикл спит
+до ближайшего срока через timing.wait_until, поэтому между кадрами процессор
+не занят, а темп кадров не зависит от гранулярности time.sleep().
+"""
+
+import math
+from collections import deque
+
+from utils import timing
+
+
+class ScheduledTask:
+    """Периодическая задача планировщика со статистикой запусков"""
+
+    def __init__(self, name, interval, callback, history=300):
+        """
+        Args:
+            name: Имя задачи
+            interval: Период запуска (сек)
+            callback: Функция без аргументов
+            history: Число последних запусков для статистики
+        """
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+        self.next_deadline = None
+        self.last_start = None
+        self.runs = 0
+        self.overruns = 0  # Запуски, пропустившие хотя бы один следующий срок
+        self.lateness = deque(maxlen=history)  # Опоздание запуска относительно срока (сек)
+        self.intervals = deque(maxlen=history)  # Фактические интервалы между запусками (сек)
+        self.durations = deque(maxlen=history)  # Длительность выполнения (сек)
+
+    def stats(self):
+        """
+        Статистика запусков задачи.
+
+        Returns:
+            dict: rate (Hz), jitter_ms (стандартное отклонение интервала), lateness_ms,
+                  duration_ms (средние значения), overruns и runs
+        """
+        intervals = list(self.intervals)
+        rate, jitter = 0.0, 0.0
+        if intervals:
+            mean_interval = sum(intervals) / len(intervals)
+            rate = 1.0 / mean_interval if mean_interval > 0 else 0.0
+            jitter = math.sqrt(sum((value - mean_interval) ** 2 for value in intervals) / len(intervals))
+        lateness = list(self.lateness)
+        durations = list(self.durations)
+        return {
+            'rate': rate,
+            'jitter_ms': jitter * 1000,
+            'lateness_ms': sum(lateness) / len(lateness) * 1000 if lateness else 0.0,
+            'duration_ms': sum(durations) / len(durations) * 1000 if durations else 0.0,
+            'overruns': self.overruns,
+            'runs': self.runs,
+        }
+
+
+class DeadlineScheduler:
+    """
+    Планировщик периодических задач по срокам.
+
+    run() ждет ближайшего срока, выполняет все задачи, срок которых наступил
+    (в порядке сроков), и переносит их сроки на период вперед. Если задача
+    опоздала больше чем на период, пропущенные запуски не догоняются, а
+    учитываются как перерасход (overrun).
+    """
+
+    def __init__(self, spin_window=0.0):
+        """
+        Args:
+            spin_window: Окно активного ожидания перед сроком (сек, 0 - только sleep,
+                         None - окно общих часов)
+        """
+        self.spin_window = spin_window
+        self.tasks = {}
+        self.running = False
+
+    def add(self, name, interval, callback, delay=0.0):
+        """
+        Добавляет периодическую задачу.
+
+        Args:
+            name: Имя задачи
+            interval: Период запуска (сек)
+            callback: Функция без аргументов
+            delay: Задержка первого запуска (сек)
+
+        Returns:
+            ScheduledTask: Добавленная задача
+        """
+        task = ScheduledTask(name, interval, callback)
+        task.next_deadline = timing.now() + delay
+        self.tasks[name] = task
+        return task
+
+    def remove(self, name):
+        """Удаляет задачу"""
+        self.tasks.pop(name, None)
+
+    def next_deadline(self):
+        """Ближайший срок среди задач (None - задач нет)"""
+        if not self.tasks:
+            return None
+        return min(task.next_deadline for task in self.tasks.values())
+
+    def run_pending(self):
+        """
+        Выполняет задачи, срок которых наступил.
+
+        Returns:
+            int: Число выполненных задач
+        """
+        current_time = timing.now()
+        due = sorted((task for task in self.tasks.values() if task.next_deadline <= current_time),
+                     key=lambda task: task.next_deadline)
+        for task in due:
+            start = timing.now()
+            task.lateness.append(start - task.next_deadline)
+            if task.last_start is not None:
+                task.intervals.append(start - task.last_start)
+            task.last_start = start
+            try:
+                task.callback()
+            except Exception as e:
+                print(f"Error in scheduled task '{task.name}': {str(e)}")
+                import traceback
+                traceback.print_exc()
+            finish = timing.now()
+            task.durations.append(finish - start)
+            task.runs += 1
+
+            # Следующий срок - ровно через период; пропущенные сроки не догоняются
+            task.next_deadline += task.interval
+            if task.next_deadline <= finish:
+                task.overruns += 1
+                missed = math.floor((finish - task.next_deadline) / task.interval) + 1
+                task.next_deadline += missed * task.interval
+        return len(due)
+
+    def run(self):
+        """Цикл планировщика до вызова stop()"""
+        self.running = True
+        while self.running:
+            deadline = self.next_deadline()
+            if deadline is None:
+                break
+            timing.wait_until(deadline, self.spin_window)
+            self.run_pending()
+
+    def stop(self):
+        """Останавливает цикл после текущих задач"""
+        self.running = False
+
+    def stats(self):
+        """Статистика всех задач: имя -> ScheduledTask.stats()"""
+        return {name: task.stats() for name, task in self.tasks.items()}
@@ -0,0 +1,150 @@
+"""
+Модуль отсчета времени и точного ожидания.
+Все циклы берут время у общих часов: монотонных часов высокого разрешения
+(Clock) или моделируемых часов (SimulatedClock) для тестов и повтора записи
+быстрее реального времени.
+
+wait_until() спит до начала окна ожидания, а последние миллисекунды
+досчитывает активным опросом: time.sleep() на Windows просыпается с
+опозданием до целого кванта планировщика.
+"""
+
+import threading
+import time
+from collections import deque
+
+# Окно активного ожидания перед сроком по умолчанию (сек)
+DEFAULT_SPIN_WINDOW = 0.002
+
+
+class Clock:
+    """
+    Монотонные часы высокого разрешения (time.perf_counter) с точным ожиданием.
+    Запоминает ошибку пробуждения (опоздание относительно срока) каждого ожидания.
+    """
+
+    def __init__(self, spin_window=DEFAULT_SPIN_WINDOW, history=1000):
+        """
+        Args:
+            spin_window: Длительность активного ожидания перед сроком (сек, 0 - только sleep)
+            history: Число последних ошибок пробуждения для статистики
+        """
+        self.spin_window = spin_window
+        self.wake_errors = deque(maxlen=history)
+
+    def now(self):
+        """Текущее время (сек)"""
+        return time.perf_counter()
+
+    def sleep(self, duration):
+        """Точное ожидание в течение duration секунд"""
+        return self.wait_until(self.now() + duration)
+
+    def wait_until(self, deadline, spin_window=None):
+        """
+        Ожидает наступления срока: sleep до начала окна, затем активный опрос.
+
+        Args:
+            deadline: Срок по этим часам (сек)
+            spin_window: Окно активного ожидания (None - окно часов)
+
+        Returns:
+            float: Ошибка пробуждения (сек, > 0 - опоздание)
+        """
+        spin_window = self.spin_window if spin_window is None else spin_window
+        remaining = deadline - self.now()
+        if remaining > spin_window:
+            time.sleep(remaining - spin_window)
+        current = self.now()
+        while current < deadline:
+            current = self.now()
+        error = current - deadline
+        self.wake_errors.append(error)
+        return error
+
+    def wake_stats(self):
+        """
+        Статистика ошибок пробуждения.
+
+        Returns:
+            dict: mean_ms, max_ms и count по последним ожиданиям
+        """
+        errors = list(self.wake_errors)
+        if not errors:
+            return {'mean_ms': 0.0, 'max_ms': 0.0, 'count': 0}
+        return {
+            'mean_ms': sum(errors) / len(errors) * 1000,
+            'max_ms': max(errors) * 1000,
+            'count': len(errors),
+        }
+
+
+class SimulatedClock(Clock):
+    """
+    Моделируемые часы: время идет только через advance() и ожидания.
+    Ожидание мгновенно переводит часы на срок, поэтому циклы с такими часами
+    работают так быстро, как позволяют вычисления.
+    """
+
+    def __init__(self, start=0.0):
+        """
+        Args:
+            start: Начальное время (сек)
+        """
+        super().__init__(spin_window=0.0)
+        self.current = start
+        self.lock = threading.Lock()
+
+    def now(self):
+        return self.current
+
+    def advance(self, duration):
+        """Переводит часы вперед на duration секунд"""
+        with self.lock:
+            self.current += max(0.0, duration)
+        return self.current
+
+    def wait_until(self, deadline, spin_window=None):
+        with self.lock:
+            self.current = max(self.current, deadline)
+        self.wake_errors.append(0.0)
+        return 0.0
+
+
+# Общие часы процесса (заменяются set_clock в тестах и при повторе записи)
+_clock = Clock()
+
+
+def get_clock():
+    """Текущие общие часы"""
+    return _clock
+
+
+def set_clock(clock):
+    """
+    Устанавливает общие часы.
+
+    Args:
+        clock: Экземпляр Clock (None - монотонные часы по умолчанию)
+
+    Returns:
+        Clock: Предыдущие часы
+    """
+    global _clock
+    previous, _clock = _clock, clock if clock is not None else Clock()
+    return previous
+
+
+def now():
+    """Текущее время общих часов (сек)"""
+    return _clock.now()
+
+
+def wait_until(deadline, spin_window=None):
+    """Точное ожидание срока по общим часам; возвращает ошибку пробуждения (сек)"""
+    return _clock.wait_until(deadline, spin_window)
+
+
+def sleep(duration):
+    """Точное ожидание по общим часам"""
+    return _clock.sleep(duration)
@@ -0,0 +1,169 @@
+"""
+Модуль для сопровождения выбранной цели между запусками YOLO.
+Предоставляет легковесный трекер на основе нормированной кросс-корреляции.
+"""
+
+import cv2
+import numpy as np
+
+from utils import timing
+from utils.motion import box_iou
+
+
+class TargetTracker:
+    """
+    Трекер выбранной цели по шаблону внешнего вида.
+
+    При каждом полном проходе YOLO трекер привязывается к рамке цели
+    (anchor) и запоминает уменьшенный шаблон в оттенках серого. На
+    промежуточных кадрах шаблон ищется в небольшой области вокруг
+    предыдущей позиции с помощью cv2.matchTemplate (TM_CCOEFF_NORMED).
+    """
+
+    def __init__(self, max_template_size=32, search_margin=0.75, min_score=0.5, max_age=0.5, match_iou=0.5):
+        """
+        Инициализирует трекер.
+
+        Args:
+            max_template_size: Максимальный размер стороны шаблона в пикселях (после уменьшения)
+            search_margin: Размер области поиска вокруг рамки в долях от ее размера
+            min_score: Минимальное значение корреляции, при котором цель считается найденной
+            max_age: Максимальное время (сек) сопровождения без повторной привязки
+            match_iou: Минимальное IoU, при котором выбранная рамка считается сопровождаемой целью
+        """
+        self.max_template_size = max_template_size
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.max_age = max_age
+        self.match_iou = match_iou
+
+        self.template = None
+        self.scale = 1.0
+        self.box = None
+        self.anchor_box = None  # Рамка, к которой трекер привязан
+        self.score = 0.0
+        self.anchor_time = 0.0
+
+    @property
+    def active(self):
+        """Есть ли у трекера цель для сопровождения"""
+        return self.template is not None
+
+    def anchor(self, frame, box):
+        """
+        Привязывает трекер к рамке цели из очередного прохода детектора.
+
+        Args:
+            frame: Кадр, на котором получена рамка (BGR)
+            box: Рамка цели (x_min, y_min, x_max, y_max)
+        """
+        if frame is None or box is None:
+            self.reset()
+            return
+
+        x1, y1, x2, y2 = self._clip_box(box, frame.shape)
+        width, height = x2 - x1, y2 - y1
+        if width < 4 or height < 4:
+            self.reset()
+            return
+
+        # Масштаб выбираем так, чтобы шаблон оставался маленьким независимо от размера цели
+        self.scale = min(1.0, self.max_template_size / max(width, height))
+        self.template = self._prepare(frame[y1:y2, x1:x2])
+        self.box = (x1, y1, x2, y2)
+        self.anchor_box = self.box
+        self.score = 1.0
+        self.anchor_time = timing.now()
+
+    def matches(self, box):
+        """
+        Относится ли рамка к сопровождаемой цели.
+
+        Рамка сравнивается и с рамкой привязки (кешированные рамки сдвигаются
+        только вслед за камерой), и с текущей рамкой трекера.
+
+        Args:
+            box: Рамка (x_min, y_min, x_max, y_max)
+
+        Returns:
+            bool: True, если IoU с одной из рамок не меньше match_iou
+        """
+        if not self.active or box is None:
+            return False
+        return (box_iou(box, self.anchor_box) >= self.match_iou or
+                box_iou(box, self.box) >= self.match_iou)
+
+    def update(self, frame):
+        """
+        Ищет цель на новом кадре.
+
+        Args:
+            frame: Текущий кадр (BGR)
+
+        Returns:
+            tuple: Новая рамка цели (x_min, y_min, x_max, y_max) или None, если цель потеряна
+        """
+        if not self.active or frame is None:
+            return None
+
+        if timing.now() - self.anchor_time > self.max_age:
+            self.reset()
+            return None
+
+        x1, y1, x2, y2 = self.box
+        width, height = x2 - x1, y2 - y1
+        frame_height, frame_width = frame.shape[:2]
+
+        # Область поиска вокруг последней известной позиции
+        margin_x = int(width * self.search_margin) + 2
+        margin_y = int(height * self.search_margin) + 2
+        sx1 = max(0, x1 - margin_x)
+        sy1 = max(0, y1 - margin_y)
+        sx2 = min(frame_width, x2 + margin_x)
+        sy2 = min(frame_height, y2 + margin_y)
+
+        search = self._prepare(frame[sy1:sy2, sx1:sx2])
+        template_height, template_width = self.template.shape[:2]
+        if search.shape[0] < template_height or search.shape[1] < template_width:
+            self.reset()
+            return None
+
+        scores = cv2.matchTemplate(search, self.template, cv2.TM_CCOEFF_NORMED)
+        _, max_score, _, max_loc = cv2.minMaxLoc(scores)
+        self.score = float(max_score)
+
+        if self.score < self.min_score:
+            self.reset()
+            return None
+
+        # Переводим найденную позицию обратно в координаты полного кадра
+        new_x1 = sx1 + int(round(max_loc[0] / self.scale))
+        new_y1 = sy1 + int(round(max_loc[1] / self.scale))
+        self.box = self._clip_box((new_x1, new_y1, new_x1 + width, new_y1 + height), frame.shape)
+
+        return self.box
+
+    def reset(self):
+        """Сбрасывает сопровождаемую цель"""
+        self.template = None
+        self.box = None
+        self.anchor_box = None
+        self.score = 0.0
+
+    def _prepare(self, region):
+        """Переводит область кадра в уменьшенное изображение в оттенках серого"""
+        gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY) if region.ndim == 3 else region
+        if self.scale < 1.0:
+            gray = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return np.ascontiguousarray(gray)
+
+    @staticmethod
+    def _clip_box(box, shape):
+        """Ограничивает рамку размерами кадра"""
+        frame_height, frame_width = shape[:2]
+        x1, y1, x2, y2 = (int(v) for v in box)
+        x1 = max(0, min(x1, frame_width - 1))
+        y1 = max(0, min(y1, frame_height - 1))
+        x2 = max(x1 + 1, min(x2, frame_width))
+        y2 = max(y1 + 1, min(y2, frame_height))
+        return x1, y1, x2, y2
@@ -3,6 +3,8 @@ import cv2
 import numpy as np
 from ultralytics import YOLO
 
+from utils.pyramid import get_pyramid
+
 class YOLOTrainer:
     def __init__(self, model=None, model_path=None):
         self.model = model
@@ -11,6 +13,7 @@ class YOLOTrainer:
         self.frames_to_save = 0
         self.collected_frames = []
         self.collected_boxes = []
+        self.sample_width = 640  # Width of stored samples (boxes are saved normalized)
         
     def start_collection(self, frames_to_collect=100):
         """Start collecting training data"""
@@ -25,17 +28,24 @@ class YOLOTrainer:
         self.collection_active = False
         print(f"Stopped collecting frames. Collected {len(self.collected_frames)} frames")
         
-    def process_frame(self, frame, results, cursor_pos):
-        """Process a frame for training data collection"""
+    def process_frame(self, frame, objects, cursor_pos):
+        """Process a frame for training data collection
+
+        objects are detections with 'box' in frame pixels (x1, y1, x2, y2)
+        """
         if not self.collection_active or self.frames_to_save <= 0:
             return
             
-        if frame is None or results is None:
+        if frame is None or objects is None:
             return
             
-        # Save frame and annotation
-        self.collected_frames.append(frame.copy())
-        self.collected_boxes.append(results)
+        # Save frame and annotation. The downscaled level comes from the shared
+        # frame pyramid (usually already built for detection), so no full-size copy is kept.
+        # Boxes are normalized by the real frame size, so they fit the stored level as well
+        frame_height, frame_width = frame.shape[:2]
+        self.collected_frames.append(get_pyramid(frame).level(self.sample_width))
+        self.collected_boxes.append([(x1 / frame_width, y1 / frame_height, x2 / frame_width, y2 / frame_height)
+                                     for x1, y1, x2, y2 in (obj['box'] for obj in objects)])
         self.frames_to_save -= 1
         
         if self.frames_to_save <= 0:
@@ -61,16 +71,14 @@ class YOLOTrainer:
                 # Save annotation (simplified for this example)
                 # In a real implementation, you would save proper YOLO format annotations
                 with open(frame_path.replace('.jpg', '.txt'), 'w') as f:
-                    for box in boxes.boxes:
-                        if hasattr(box, 'xyxyn'):
-                            x1, y1, x2, y2 = box.xyxyn[0].tolist()
-                            # Convert to YOLO format (x_center, y_center, width, height)
-                            x_center = (x1 + x2) / 2
-                            y_center = (y1 + y2) / 2
-                            width = x2 - x1
-                            height = y2 - y1
-                            # Write annotation (class 80 for 'bag')
-                            f.write(f"80 {x_center} {y_center} {width} {height}\n")
+                    for x1, y1, x2, y2 in boxes:
+                        # Convert to YOLO format (x_center, y_center, width, height)
+                        x_center = (x1 + x2) / 2
+                        y_center = (y1 + y2) / 2
+                        width = x2 - x1
+                        height = y2 - y1
+                        # Write annotation (class 80 for 'bag')
+                        f.write(f"80 {x_center} {y_center} {width} {height}\n")
             
             print(f"Saved {len(self.collected_frames)} training samples")
             